@@ -1,290 +1,2692 @@
-from fastapi import FastAPI, File, UploadFile, HTTPException
-from fastapi.responses import HTMLResponse, FileResponse, JSONResponse
+from fastapi import FastAPI, File, UploadFile, HTTPException, Request, Response, Query
+from fastapi.responses import HTMLResponse, FileResponse, JSONResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
+from starlette.concurrency import run_in_threadpool
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from pathlib import Path
-import tempfile
+from email.utils import formatdate, parsedate_to_datetime
+import asyncio
+import bisect
+import collections
+import functools
+import multiprocessing
 import shutil
+import tempfile
+import threading
 import json
+import os
+import hashlib
+import importlib.util
+import uuid
+import time
+import zipfile
 from typing import Optional
-import pypdf
-# import fitz  # PyMuPDF - 웹앱에서는 사용하지 않음
+from urllib.parse import quote
+from multipart.multipart import MultipartParser, parse_options_header
+import pdf_worker
+from metrics import registry, MetricsMiddleware
+from session_store import create_store
 
 app = FastAPI(title="서울자가김부장용PDF편집기 Ver 1.3")
 
+# 요청 수, 라우트별 지연 시간, 주고받은 바이트 수 기록 (GET /metrics)
+app.add_middleware(MetricsMiddleware)
+
 # 임시 파일 저장 디렉토리
 TEMP_DIR = Path("temp")
 TEMP_DIR.mkdir(exist_ok=True)
 
+# 업로드 원본 저장 디렉토리 (내용 해시로 이름을 붙이며 저장 후에는 절대 수정하지 않음)
+SOURCE_DIR = TEMP_DIR / "sources"
+SOURCE_DIR.mkdir(exist_ok=True)
+
+# 가상 문서를 실제 PDF로 만든 결과 저장 디렉토리
+MATERIALIZED_DIR = TEMP_DIR / "materialized"
+MATERIALIZED_DIR.mkdir(exist_ok=True)
+
+# 페이지 썸네일 캐시 디렉토리
+THUMBNAIL_DIR = TEMP_DIR / "thumbnails"
+THUMBNAIL_DIR.mkdir(exist_ok=True)
+
+# 페이지 범위 추출 결과 캐시 디렉토리
+EXTRACT_DIR = TEMP_DIR / "extracts"
+EXTRACT_DIR.mkdir(exist_ok=True)
+
+# 크기를 줄인 PDF 캐시 디렉토리
+OPTIMIZED_DIR = TEMP_DIR / "optimized"
+OPTIMIZED_DIR.mkdir(exist_ok=True)
+
+# 원본별 검색 색인 디렉토리 (원본 내용이 바뀌지 않으므로 한 번 만들면 계속 사용)
+TEXT_DIR = TEMP_DIR / "text"
+TEXT_DIR.mkdir(exist_ok=True)
+
+# 백그라운드 작업 상태 디렉토리 ({job_id}.json 상태, .progress 진행률, .cancel 취소 요청)
+JOBS_DIR = TEMP_DIR / "jobs"
+JOBS_DIR.mkdir(exist_ok=True)
+
 # 정적 파일 서빙
 app.mount("/static", StaticFiles(directory="static"), name="static")
+INDEX_HTML = Path("templates") / "index.html"
 
-# 업로드된 PDF 파일 저장
-uploaded_files = {}
+# 문서 세션 상태 저장소 (여러 uvicorn 워커가 함께 사용)
+# SESSION_STORE: "sqlite"(기본, WAL 모드) 또는 "memory"(워커 하나로 실행하거나 테스트할 때)
+#
+# 문서 {file_id: 가상 문서}
+#   가상 문서는 실제 파일 대신 [원본 해시, 페이지 인덱스, 회전 각도] 참조 목록으로 페이지 순서를 표현한다.
+#   편집은 이 목록만 바꾸고, 실제 PDF는 다운로드 요청이 올 때 한 번만 만든다.
+#   Undo/Redo 기록도 파일 복사본이 아니라 적용한 작업과 전후 페이지 참조 목록으로 문서 안에 둔다.
+# 원본 {sha256 해시: {"size", "page_count", "refcount"}}
+#   같은 내용의 파일은 한 번만 저장하고, refcount는 그 원본을 참조하는 문서 수다.
+SESSION_STORE = os.environ.get("SESSION_STORE", "sqlite")
+SESSION_DB = os.environ.get("SESSION_DB", str(TEMP_DIR / "state" / "sessions.db"))
+store = create_store(SESSION_STORE, SESSION_DB)
 
-# Undo 스택 저장 {file_id: [undo_states]}
-undo_stacks = {}
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+# 페이지 요약 배열의 항목 순서
+MANIFEST_FIELDS = ["width", "height", "rotation", "has_images", "has_text"]
 MAX_UNDO = 10
 
+# 검색 설정
+# TEXT_INDEX_ON_UPLOAD: 업로드할 때 백그라운드로 검색 색인을 미리 만듦 ("0"이면 첫 검색 때 만듦)
+TEXT_INDEX_ON_UPLOAD = os.environ.get("TEXT_INDEX_ON_UPLOAD", "1") != "0"
+SEARCH_MAX_HITS = 200
+SEARCH_SNIPPET_CHARS = 60
+# 만들고 있는 검색 색인 {원본 해시: asyncio.Task}
+text_index_tasks = {}
+
+# 합치기 요청 한 번에 받을 수 있는 파일 수와 일반 필드 크기
+MERGE_MAX_FILES = int(os.environ.get("MERGE_MAX_FILES", "100"))
+MERGE_MAX_FIELD_BYTES = 64 * 1024
+
+# 증분 저장 설정
+# 편집 결과를 만들 때 이전 버전 PDF 끝에 바뀐 객체와 새 xref만 덧붙인다 (PyMuPDF 필요).
+# 이전 버전이 없으면 원본 파일의 복사본에 덧붙이므로 파일 전체를 쓴다 (mode="copy").
+# 이전 버전이 INCREMENTAL_MIN_BYTES보다 작거나 수정 기록이 INCREMENTAL_MAX_REVISIONS개 이상이면 전체를 다시 쓴다.
+INCREMENTAL_SAVE = os.environ.get("INCREMENTAL_SAVE", "1") != "0"
+INCREMENTAL_MIN_BYTES = int(os.environ.get("INCREMENTAL_MIN_BYTES", 256 * 1024))
+INCREMENTAL_MAX_REVISIONS = int(os.environ.get("INCREMENTAL_MAX_REVISIONS", 20))
+
+# 문서별 편집 직렬화 {file_id: asyncio.Lock}와 대기 중인 편집 {file_id: [(편집 함수, Future)]}
+# 같은 문서의 편집은 한 번에 하나씩 처리하고, 처리하는 동안 쌓인 편집은 모아서 한 번에 저장한다.
+document_locks = {}
+pending_edits = {}
+# 다른 워커가 먼저 저장해 충돌했을 때 최신 문서에 다시 적용하는 횟수
+EDIT_RETRIES = 3
+
+# 문서 변경 알림 구독 {file_id: {asyncio.Queue}}
+# 이 프로세스에서 저장한 변경은 바로 보내고, 다른 워커가 저장한 변경은 DOCUMENT_POLL_INTERVAL마다 확인한다.
+document_listeners = {}
+DOCUMENT_POLL_INTERVAL = 2.0
+
+# PDF 작업 실행기 설정
+# PDF_EXECUTOR: "process"(기본, 작업 프로세스 풀) 또는 "thread"(스레드 풀)
+PDF_EXECUTOR = os.environ.get("PDF_EXECUTOR", "process")
+PDF_WORKERS = int(os.environ.get("PDF_WORKERS", min(4, os.cpu_count() or 1)))
+PDF_JOB_TIMEOUT = float(os.environ.get("PDF_JOB_TIMEOUT", 120))
+# 실행 중 + 대기 중인 작업 최대 개수 (넘으면 503 응답)
+PDF_MAX_QUEUE = int(os.environ.get("PDF_MAX_QUEUE", 32))
+# 서버 시작 직후 작업 프로세스를 미리 띄우고 pypdf를 불러옴 ("0"이면 첫 작업 때 띄움)
+PDF_WARMUP = os.environ.get("PDF_WARMUP", "1") != "0"
+
+pdf_executor = None
+pending_jobs = 0
+
+# 나누기 설정
+# 한 번에 만드는 조각 수 (작업 프로세스 수만큼 미리 만들어 두고 앞 조각부터 ZIP으로 보냄)
+SPLIT_MAX_PARTS = int(os.environ.get("SPLIT_MAX_PARTS", "500"))
+SPLIT_CONCURRENCY = max(1, PDF_WORKERS)
+
+# PDF 작업 지표
+pdf_job_latency = registry.histogram(
+    "pdf_job_duration_seconds", "PDF job latency including queue wait", ("job",))
+stage_latency = registry.histogram(
+    "pdf_stage_duration_seconds", "Time spent per PDF processing stage (upload/read/write/move/render)", ("stage",))
+cache_requests = registry.counter(
+    "cache_requests_total", "Cache lookups by cache and result (hit/miss)", ("cache", "result"))
+save_requests = registry.counter(
+    "pdf_saves_total", "Materialized document saves by path (incremental/copy/full)", ("mode",))
+save_bytes = registry.counter(
+    "pdf_save_bytes_total", "Bytes written by materialized document saves", ("mode",))
+engine_jobs = registry.counter(
+    "pdf_engine_jobs_total", "PDF jobs by page engine (pypdf/pymupdf, see PDF_ENGINE)", ("engine",))
+
+def create_executor():
+    """설정에 맞는 실행기 생성 (프로세스 풀을 만들 수 없으면 스레드 풀 사용)"""
+    if PDF_EXECUTOR == "process":
+        try:
+            # fork는 이벤트 루프와 스레드 상태까지 복사하므로 spawn 사용
+            return ProcessPoolExecutor(
+                max_workers=PDF_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=pdf_worker.warm_up,
+                initargs=(PDF_WORKERS,),
+            )
+        except (OSError, NotImplementedError, ImportError) as e:
+            print(f"Process pool unavailable, falling back to threads: {e}")
+    return ThreadPoolExecutor(max_workers=PDF_WORKERS, thread_name_prefix="pdf-worker",
+                              initializer=pdf_worker.warm_up, initargs=(PDF_WORKERS,))
+
+async def warm_up_executor():
+    """작업 프로세스를 모두 띄워 둠 (각 프로세스는 시작할 때 pypdf를 불러옴)
+
+    프로세스 풀은 쉬는 프로세스가 없을 때만 새 프로세스를 만들므로 PDF_WORKERS개를 한꺼번에 제출한다.
+    """
+    loop = asyncio.get_running_loop()
+    start = time.perf_counter()
+    try:
+        executor = get_executor()
+        await asyncio.gather(*(loop.run_in_executor(executor, time.sleep, 0) for _ in range(PDF_WORKERS)))
+    except Exception as e:
+        print(f"PDF worker warm-up failed: {e}")
+        return
+    print(f"PDF workers ready in {time.perf_counter() - start:.2f}s")
+
+def get_executor():
+    """PDF 작업 실행기 (처음 사용할 때 생성)"""
+    global pdf_executor
+    if pdf_executor is None:
+        pdf_executor = create_executor()
+    return pdf_executor
+
+def retire_executor(executor):
+    """제한 시간을 넘기고도 실행 중인 작업이 있는 실행기를 새 작업에서 빼냄
+
+    이미 맡은 작업은 끝까지 실행한 뒤 정리되고, 새 작업은 다음 get_executor()가 만드는 실행기로 간다.
+    멈춘 작업이 작업 프로세스를 붙잡고 있어도 뒤에 온 요청이 그 프로세스를 기다리지 않게 한다.
+    """
+    global pdf_executor
+    if pdf_executor is executor:
+        pdf_executor = None
+        executor.shutdown(wait=False)
+
+def release_job_slot():
+    """실행기에서 작업이 실제로 끝났을 때 대기열 자리 반환"""
+    global pending_jobs
+    pending_jobs -= 1
+
+async def run_pdf_job(func, *args, job: Optional[str] = None):
+    """PDF 작업을 이벤트 루프 밖의 실행기에서 실행
+
+    대기열이 가득 차면 503, PDF_JOB_TIMEOUT 초 안에 끝나지 않으면 504를 반환한다.
+    job은 백그라운드 작업에서 실행할 때 주는 작업 파일 경로로, 진행률을 기록하고 제한 시간은 JOB_TIMEOUT을 쓴다.
+    제한 시간이 지나도 이미 시작한 작업은 멈출 수 없으므로 그 작업이 끝날 때까지 대기열 자리를 차지한다.
+    """
+    global pdf_executor, pending_jobs
+    if pending_jobs >= PDF_MAX_QUEUE:
+        raise HTTPException(status_code=503, detail="Server is busy, please retry")
+
+    loop = asyncio.get_running_loop()
+    call = functools.partial(pdf_worker.run_job, func, *args, job=job)
+    executor = get_executor()
+    try:
+        future = executor.submit(call)
+    except BrokenProcessPool:
+        # 작업 프로세스가 죽었으면 풀을 새로 만든다
+        pdf_executor = None
+        executor = get_executor()
+        future = executor.submit(call)
+
+    pending_jobs += 1
+
+    def job_done(_):
+        try:
+            loop.call_soon_threadsafe(release_job_slot)
+        except RuntimeError:
+            # 이벤트 루프가 이미 닫힘 (서버 종료 중)
+            pass
+
+    future.add_done_callback(job_done)
+
+    try:
+        with pdf_job_latency.time(job=func.__name__):
+            result, stats = await asyncio.wait_for(asyncio.wrap_future(future),
+                                                   PDF_JOB_TIMEOUT if job is None else JOB_TIMEOUT)
+
+        # 작업 프로세스에서 잰 단계별 시간과 캐시 사용 기록
+        for name, seconds in stats["stages"]:
+            stage_latency.observe(seconds, stage=name)
+        cache_requests.inc(stats["reader_hits"], cache="reader", result="hit")
+        cache_requests.inc(stats["reader_misses"], cache="reader", result="miss")
+        if stats["engine"]:
+            engine_jobs.inc(engine=stats["engine"])
+        return result
+    except asyncio.TimeoutError:
+        # 아직 대기 중이던 작업은 취소되고, 실행 중인 작업은 실행기째 새 작업에서 뺀다
+        if not future.cancel() and not future.done():
+            retire_executor(executor)
+        raise HTTPException(status_code=504, detail="PDF operation timed out")
+
+# 썸네일 캐시 설정
+THUMBNAIL_CACHE_BYTES = int(os.environ.get("THUMBNAIL_CACHE_BYTES", 128 * 1024 * 1024))
+THUMBNAIL_DEFAULT_WIDTH = 200
+THUMBNAIL_MAX_WIDTH = 2000
+THUMBNAIL_FORMATS = {"png": "image/png", "jpeg": "image/jpeg"}
+
+# 썸네일 렌더링에는 PyMuPDF가 필요 (설치되지 않았으면 썸네일 API만 비활성화)
+HAS_PYMUPDF = importlib.util.find_spec("fitz") is not None
+
+# 세션(문서) 정리 설정
+# 마지막 접근 후 SESSION_TTL초가 지난 문서는 자동으로 닫는다.
+SESSION_TTL = float(os.environ.get("SESSION_TTL", 2 * 60 * 60))
+# 마지막 접근 시각은 저장된 값이 이 시간(초)보다 오래되었을 때만 갱신 (요청마다 저장소에 쓰지 않도록)
+SESSION_TOUCH_INTERVAL = float(os.environ.get("SESSION_TOUCH_INTERVAL", 60))
+JANITOR_INTERVAL = float(os.environ.get("JANITOR_INTERVAL", 60))
+# 임시 디렉토리 전체와 문서 하나가 쓸 수 있는 디스크 용량
+DISK_QUOTA_BYTES = int(os.environ.get("DISK_QUOTA_BYTES", 2 * 1024 * 1024 * 1024))
+SESSION_QUOTA_BYTES = int(os.environ.get("SESSION_QUOTA_BYTES", 512 * 1024 * 1024))
+# 어느 문서에도 속하지 않은 파일을 지우기 전 기다리는 시간 (작성 중인 파일 보호)
+ORPHAN_GRACE_SECONDS = 10 * 60
+
+janitor_task = None
+warmup_task = None
+
+# 페이지 범위 추출 캐시 설정
+EXTRACT_CACHE_BYTES = int(os.environ.get("EXTRACT_CACHE_BYTES", 256 * 1024 * 1024))
+# 크기를 줄인 PDF 캐시 설정
+OPTIMIZED_CACHE_BYTES = int(os.environ.get("OPTIMIZED_CACHE_BYTES", 256 * 1024 * 1024))
+
+# 백그라운드 작업 설정
+# 동시에 실행하는 작업 수를 JOB_WORKERS로 제한해 일반 요청이 쓸 작업 프로세스를 남겨 둔다.
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", max(1, PDF_WORKERS // 2)))
+JOB_TIMEOUT = float(os.environ.get("JOB_TIMEOUT", 60 * 60))
+# 끝난 작업의 상태와 결과를 보관하는 시간
+JOB_TTL = float(os.environ.get("JOB_TTL", 60 * 60))
+# 진행률 이벤트 확인 간격과 연결 유지용 주석을 보내는 간격 (프록시의 유휴 연결 종료 방지)
+JOB_POLL_INTERVAL = 0.5
+SSE_KEEPALIVE_INTERVAL = 15
+JOB_FINISHED = ("done", "failed", "cancelled")
+
+job_slots = asyncio.Semaphore(JOB_WORKERS)
+# 이 프로세스에서 실행 중이거나 대기 중인 작업 {job_id: asyncio.Task}
+job_tasks = {}
+
+background_jobs = registry.counter(
+    "pdf_background_jobs_total", "Finished background jobs by kind and status", ("kind", "status"))
+
+class DiskCache:
+    """크기 제한이 있는 디렉토리 캐시 (파일 수정 시각 기준 LRU 삭제)"""
+
+    def __init__(self, name: str, directory: Path, max_bytes: int):
+        self.name = name
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.total_bytes = sum(p.stat().st_size for p in directory.iterdir() if p.is_file())
+
+    def lookup(self, name: str) -> Optional[Path]:
+        """캐시된 파일 경로 반환 (없으면 None)"""
+        path = self.directory / name
+        try:
+            # 최근 사용 시각 갱신 (LRU 삭제 기준)
+            os.utime(path)
+        except FileNotFoundError:
+            cache_requests.inc(cache=self.name, result="miss")
+            return None
+        cache_requests.inc(cache=self.name, result="hit")
+        return path
+
+    def added(self, size: int):
+        """새 파일이 추가되었음을 기록하고 필요하면 오래된 파일 삭제"""
+        self.total_bytes += size
+        if self.total_bytes > self.max_bytes:
+            self.shrink(self.max_bytes)
+
+    def shrink(self, target_bytes: int) -> int:
+        """전체 크기가 target_bytes 이하가 될 때까지 오래된 파일 삭제, 지운 바이트 수 반환"""
+        entries = []
+        for path in self.directory.iterdir():
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort()
+
+        self.total_bytes = sum(size for _, size, _ in entries)
+        freed = 0
+        for _, size, path in entries:
+            if self.total_bytes <= target_bytes:
+                break
+            path.unlink(missing_ok=True)
+            self.total_bytes -= size
+            freed += size
+        return freed
+
+thumbnail_cache = DiskCache("thumbnail", THUMBNAIL_DIR, THUMBNAIL_CACHE_BYTES)
+extract_cache = DiskCache("extract", EXTRACT_DIR, EXTRACT_CACHE_BYTES)
+optimized_cache = DiskCache("optimized", OPTIMIZED_DIR, OPTIMIZED_CACHE_BYTES)
+
+class DiskUsage:
+    """캐시가 아닌 임시 디렉토리(원본, 실체화 결과, 검색 색인)의 종류별 사용량 누계
+
+    파일을 만들고 지울 때 크기를 더하고 빼서 업로드마다 디렉토리를 훑지 않게 한다.
+    다른 워커의 변경이나 놓친 파일은 정리 작업이 JANITOR_INTERVAL마다 다시 훑어 맞춘다.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._bytes = {}
+
+    def add(self, kind: str, size: int):
+        """kind 사용량에 size 바이트를 더함 (지웠으면 음수)"""
+        with self._lock:
+            self._bytes[kind] = self._bytes.get(kind, 0) + size
+
+    def reset(self, usage: dict):
+        """디렉토리를 훑어 얻은 종류별 사용량으로 교체"""
+        with self._lock:
+            self._bytes = dict(usage)
+
+    def total(self) -> int:
+        with self._lock:
+            return sum(self._bytes.values())
+
+disk_totals = DiskUsage()
+
+def blob_path(digest: str) -> Path:
+    """원본 해시에 해당하는 파일 경로"""
+    return SOURCE_DIR / f"{digest}.pdf"
+
+def manifest_path(digest: str) -> Path:
+    """원본의 페이지 요약(크기, 회전, 이미지/글자 여부) 파일 경로"""
+    return SOURCE_DIR / f"{digest}.json"
+
+def write_manifest(digest: str, manifest: dict):
+    """원본의 페이지 요약 저장 (다른 요청이 쓰다 만 파일을 읽지 않도록 임시 파일에 쓴 뒤 교체)"""
+    path = manifest_path(digest)
+    temp_path = path.with_suffix(".json.part")
+    temp_path.write_text(json.dumps(manifest["pages"], separators=(",", ":")))
+    os.replace(temp_path, path)
+
+@functools.lru_cache(maxsize=256)
+def load_manifest(digest: str) -> list:
+    """저장된 원본의 페이지 요약 (원본 내용이 바뀌지 않으므로 메모리에 캐시, 없으면 FileNotFoundError)"""
+    return json.loads(manifest_path(digest).read_text())
+
+async def blob_manifest(digest: str) -> list:
+    """원본의 페이지 요약 [[폭, 높이, 회전 각도, 이미지 있음, 글자 있음]] (요약 파일이 없던 원본은 지금 만듦)"""
+    try:
+        return load_manifest(digest)
+    except FileNotFoundError:
+        manifest = await run_pdf_job(pdf_worker.read_page_manifest, str(blob_path(digest)))
+        write_manifest(digest, manifest)
+        return manifest["pages"]
+
+async def document_manifest(document: dict) -> list:
+    """가상 문서의 페이지 요약 (원본 요약에 페이지 참조의 회전 각도를 더함, PDF는 다시 읽지 않음)"""
+    manifests = {}
+    pages = []
+    for digest, page_idx, rotation in document["pages"]:
+        if digest not in manifests:
+            manifests[digest] = await blob_manifest(digest)
+        width, height, base_rotation, has_images, has_text = manifests[digest][page_idx]
+        pages.append([width, height, (base_rotation + rotation) % 360, has_images, has_text])
+    return pages
+
+def text_index_path(digest: str) -> Path:
+    """원본의 검색 색인 파일 경로"""
+    return TEXT_DIR / f"{digest}.json"
+
+async def build_text_index(digest: str):
+    """작업 프로세스에서 원본의 검색 색인 생성"""
+    try:
+        result = await run_pdf_job(pdf_worker.build_text_index, str(blob_path(digest)), str(text_index_path(digest)))
+        disk_totals.add("text", result["size"])
+        print(f"Indexed {digest[:12]}: {result['page_count']} pages, {result['tokens']} tokens, {result['size']} bytes")
+    finally:
+        text_index_tasks.pop(digest, None)
+
+def log_index_failure(task: asyncio.Task):
+    """업로드 때 시작한 색인 생성이 실패하면 기록 (검색할 때 다시 시도)"""
+    if not task.cancelled() and task.exception() is not None:
+        print(f"Error building text index: {task.exception()}")
+
+def schedule_text_index(digest: str):
+    """검색 색인이 없으면 백그라운드로 만들기 시작"""
+    if TEXT_INDEX_ON_UPLOAD and digest not in text_index_tasks and not text_index_path(digest).exists():
+        task = text_index_tasks[digest] = asyncio.create_task(build_text_index(digest))
+        task.add_done_callback(log_index_failure)
+
+async def ensure_text_index(digest: str):
+    """원본의 검색 색인이 준비될 때까지 대기 (만들고 있으면 그 작업을 기다리고, 없으면 새로 만듦)"""
+    if text_index_path(digest).exists():
+        return
+    task = text_index_tasks.get(digest)
+    if task is None:
+        task = text_index_tasks[digest] = asyncio.create_task(build_text_index(digest))
+    # 검색 요청이 끊겨도 색인 생성은 계속
+    await asyncio.shield(task)
+
+@functools.lru_cache(maxsize=8)
+def load_text_index(digest: str) -> dict:
+    """저장된 검색 색인 (원본 내용이 바뀌지 않으므로 최근 것 몇 개를 메모리에 캐시)"""
+    return json.loads(text_index_path(digest).read_text(encoding="utf-8"))
+
+def search_text_index(index: dict, terms: list) -> dict:
+    """모든 검색어가 나오는 페이지 {페이지 인덱스: (첫 검색어의 첫 위치, 일치 수)}
+
+    검색어는 단어의 앞부분과 비교하므로 "계약"으로 "계약서", "계약을"도 찾는다.
+    """
+    tokens = index["tokens"]
+    found = None
+    for term in terms:
+        pages = {}
+        # 정렬된 단어 목록에서 term으로 시작하는 구간만 확인
+        start = bisect.bisect_left(tokens, term)
+        for i in range(start, len(tokens)):
+            if not tokens[i].startswith(term):
+                break
+            postings = index["postings"][i]
+            for j in range(0, len(postings), 2):
+                page_idx, offset = postings[j], postings[j + 1]
+                first, count = pages.get(page_idx, (offset, 0))
+                pages[page_idx] = (min(first, offset), count + 1)
+        if found is None:
+            found = pages
+        else:
+            found = {
+                page_idx: (first, count + pages[page_idx][1])
+                for page_idx, (first, count) in found.items() if page_idx in pages
+            }
+        if not found:
+            break
+    return found or {}
+
+def make_snippet(text: str, offset: int) -> str:
+    """검색어 위치 앞뒤 글자로 미리보기 문자열 생성 (공백은 하나로)"""
+    start = max(0, offset - SEARCH_SNIPPET_CHARS)
+    end = min(len(text), offset + SEARCH_SNIPPET_CHARS)
+    snippet = " ".join(text[start:end].split())
+    return ("…" if start > 0 else "") + snippet + ("…" if end < len(text) else "")
+
+def hash_upload(stream) -> str:
+    """받아 둔 업로드 스트림을 끝까지 읽어 SHA-256 해시 반환"""
+    sha256 = hashlib.sha256()
+    stream.seek(0)
+    while True:
+        chunk = stream.read(UPLOAD_CHUNK_SIZE)
+        if not chunk:
+            break
+        sha256.update(chunk)
+    return sha256.hexdigest()
+
+def copy_upload(stream) -> str:
+    """받아 둔 업로드 스트림을 원본 디렉토리의 임시 파일로 복사하고 경로 반환"""
+    temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.part', dir=SOURCE_DIR)
+    try:
+        stream.seek(0)
+        shutil.copyfileobj(stream, temp_file, UPLOAD_CHUNK_SIZE)
+        temp_file.close()
+    except Exception:
+        temp_file.close()
+        Path(temp_file.name).unlink(missing_ok=True)
+        raise
+    return temp_file.name
+
+async def store_blob(stream) -> str:
+    """업로드 스트림의 원본 해시 반환 (같은 내용이 이미 있으면 재사용, 참조는 register_blob과 같음)
+
+    UploadFile은 이미 임시 파일에 받아 두었으므로 먼저 해시만 계산하고,
+    처음 보는 내용일 때만 원본 디렉토리로 복사한다.
+    """
+    with stage_latency.time(stage="upload"):
+        digest = await run_in_threadpool(hash_upload, stream)
+    if await run_in_threadpool(store.adjust_refcount, digest, 1) is not None:
+        return digest
+    with stage_latency.time(stage="upload"):
+        temp_path = await run_in_threadpool(copy_upload, stream)
+    return await register_blob(temp_path, digest)
+
+async def register_blob(temp_path: str, digest: str) -> str:
+    """해시까지 계산한 임시 파일을 원본 저장소에 등록하고 원본 해시 반환
+
+    돌려주는 원본에는 임시 참조가 하나 잡혀 있어 문서에 넣기 전에 다른 요청이 지우지 못한다.
+    호출한 쪽은 문서를 만든 뒤(실패했어도) release_blob으로 이 참조를 놓아야 한다.
+    """
+    if await run_in_threadpool(store.adjust_refcount, digest, 1) is not None:
+        # 이미 저장된 내용이므로 방금 쓴 파일은 버림
+        Path(temp_path).unlink()
+        return digest
+
+    path = blob_path(digest)
+    with stage_latency.time(stage="move"):
+        os.replace(temp_path, path)
+
+    # 페이지 수와 페이지 요약 만들기 (읽을 수 없는 파일은 저장소에 넣지 않음)
+    try:
+        manifest = await run_pdf_job(pdf_worker.read_page_manifest, str(path))
+        write_manifest(digest, manifest)
+    except Exception:
+        if await run_in_threadpool(store.get_blob, digest) is None:
+            path.unlink(missing_ok=True)
+            manifest_path(digest).unlink(missing_ok=True)
+        raise
+
+    # 기다리는 동안 같은 내용이 먼저 등록되었으면 그 원본의 참조를 잡음
+    info = {"size": path.stat().st_size, "page_count": manifest["page_count"]}
+    while True:
+        if await run_in_threadpool(store.add_blob, digest, info, 1):
+            disk_totals.add("sources", info["size"] + file_size(manifest_path(digest)))
+            break
+        if await run_in_threadpool(store.adjust_refcount, digest, 1) is not None:
+            break
+    schedule_text_index(digest)
+    return digest
+
+def write_parts(temp_file, chunks: list):
+    """받은 데이터 조각을 임시 파일에 이어 쓰기"""
+    for chunk in chunks:
+        temp_file.write(chunk)
+
+async def receive_multipart(request: Request) -> tuple[dict, list]:
+    """multipart 요청을 받는 대로 처리해 ({필드 이름: 값}, [(파일 이름, 임시 파일 경로, 해시)]) 반환
+
+    파일 파트는 요청 전체를 기다리거나 메모리에 모으지 않고, 도착하는 대로 해시를 계산하며
+    원본 디렉토리의 임시 파일에 쓴다.
+    """
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    boundary = params.get(b"boundary")
+    if content_type != b"multipart/form-data" or not boundary:
+        raise HTTPException(status_code=400, detail="multipart/form-data request required")
+
+    # 파서 콜백은 동기 함수라 이벤트만 모아 두고, 조각마다 한 번에 처리
+    events = []
+    header = {"field": bytearray(), "value": bytearray(), "headers": {}}
+
+    def on_part_begin():
+        header["headers"] = {}
+
+    def on_header_field(data, start, end):
+        header["field"] += data[start:end]
+
+    def on_header_value(data, start, end):
+        header["value"] += data[start:end]
+
+    def on_header_end():
+        header["headers"][bytes(header["field"]).lower()] = bytes(header["value"])
+        header["field"] = bytearray()
+        header["value"] = bytearray()
+
+    def on_headers_finished():
+        events.append(("begin", header["headers"]))
+
+    def on_part_data(data, start, end):
+        events.append(("data", bytes(data[start:end])))
+
+    def on_part_end():
+        events.append(("end", None))
+
+    parser = MultipartParser(boundary, callbacks={
+        "on_part_begin": on_part_begin,
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_headers_finished": on_headers_finished,
+        "on_part_data": on_part_data,
+        "on_part_end": on_part_end,
+    })
+
+    fields = {}
+    files = []
+    part = None
+    try:
+        async for chunk in request.stream():
+            parser.write(chunk)
+            for kind, value in events:
+                if kind == "begin":
+                    _, options = parse_options_header(value.get(b"content-disposition", b""))
+                    name = options.get(b"name", b"").decode("utf-8")
+                    if b"filename" not in options:
+                        part = {"name": name, "value": bytearray()}
+                        continue
+                    if len(files) >= MERGE_MAX_FILES:
+                        raise HTTPException(status_code=413, detail=f"Too many files (max {MERGE_MAX_FILES})")
+                    part = {
+                        "filename": options[b"filename"].decode("utf-8"),
+                        "file": tempfile.NamedTemporaryFile(delete=False, suffix='.part', dir=SOURCE_DIR),
+                        "sha256": hashlib.sha256(),
+                        "chunks": [],
+                    }
+                    files.append(part)
+                elif kind == "data" and "file" in part:
+                    part["sha256"].update(value)
+                    part["chunks"].append(value)
+                elif kind == "data":
+                    part["value"] += value
+                    if len(part["value"]) > MERGE_MAX_FIELD_BYTES:
+                        raise HTTPException(status_code=413, detail=f"Field too large: {part['name']}")
+                elif "file" in part:
+                    await run_in_threadpool(write_parts, part["file"], part["chunks"])
+                    part["chunks"] = []
+                    part["file"].close()
+                else:
+                    fields[part["name"]] = part["value"].decode("utf-8")
+            events.clear()
+
+            # 아직 끝나지 않은 파일 파트도 받은 만큼 디스크로
+            if part is not None and part.get("chunks"):
+                await run_in_threadpool(write_parts, part["file"], part["chunks"])
+                part["chunks"] = []
+        parser.finalize()
+    except Exception:
+        for file_part in files:
+            file_part["file"].close()
+            Path(file_part["file"].name).unlink(missing_ok=True)
+        raise
+
+    return fields, [(f["filename"], f["file"].name, f["sha256"].hexdigest()) for f in files]
+
+def release_blob(digest: str) -> int:
+    """원본 참조 하나 해제 (더 이상 참조하는 문서가 없으면 삭제), 지운 바이트 수 반환"""
+    refcount = store.adjust_refcount(digest, -1)
+    if refcount is None or refcount > 0:
+        return 0
+    return delete_blob(digest)
+
+def delete_blob(digest: str) -> int:
+    """참조하는 문서가 없는 원본 파일 삭제, 지운 바이트 수 반환"""
+    blob = store.delete_blob(digest)
+    if blob is None:
+        return 0
+    manifest_size = file_size(manifest_path(digest))
+    index_size = file_size(text_index_path(digest))
+    blob_path(digest).unlink(missing_ok=True)
+    manifest_path(digest).unlink(missing_ok=True)
+    text_index_path(digest).unlink(missing_ok=True)
+    disk_totals.add("sources", -blob["size"] - manifest_size)
+    disk_totals.add("text", -index_size)
+    return blob["size"]
+
+def referenced_blobs(document: dict) -> set:
+    """문서가 현재 페이지와 Undo/Redo 기록에서 참조하는 원본 해시 집합"""
+    digests = {ref[0] for ref in document["pages"]}
+    for entry in document["undo"] + document["redo"]:
+        digests.update(ref[0] for ref in entry["removed"])
+        digests.update(ref[0] for ref in entry["added"] if not isinstance(ref, int))
+    return digests
+
+def acquire_blob_refs(document: dict) -> tuple[list, list]:
+    """문서가 새로 참조하게 된 원본의 refcount를 늘리고 (늘린 원본, 더 이상 쓰지 않는 원본) 반환
+
+    새로 참조하는 원본을 먼저 늘려야 잠깐이라도 0이 되어 삭제되는 일이 없다.
+    쓰지 않게 된 원본은 문서를 저장한 뒤 release_blob으로 해제한다.
+    """
+    held = set(document["blobs"])
+    current = referenced_blobs(document)
+
+    acquired = []
+    for digest in sorted(current - held):
+        if store.adjust_refcount(digest, 1) is None:
+            # 다른 요청이 방금 지운 원본
+            for acquired_digest in acquired:
+                release_blob(acquired_digest)
+            raise HTTPException(status_code=409, detail="Source file was removed, please retry")
+        acquired.append(digest)
+
+    document["blobs"] = sorted(current)
+    return acquired, sorted(held - current)
+
+def source_pages(digest: str) -> list:
+    """원본 파일 전체 페이지의 참조 목록"""
+    page_count = store.get_blob(digest)["page_count"]
+    return [[digest, i, 0] for i in range(page_count)]
+
+def create_document(filename: str, pages: list) -> dict:
+    """페이지 참조 목록으로 새 가상 문서 생성"""
+    now = time.time()
+    return {
+        "filename": filename,
+        "pages": pages,
+        "version": 0,
+        "modified": now,
+        "accessed": now,
+        "blobs": [],
+        "undo": [],
+        "redo": [],
+    }
+
+def load_document(file_id: str, history: bool = False) -> dict:
+    """문서 반환 (없으면 404), 마지막 접근 시각이 SESSION_TOUCH_INTERVAL보다 오래되었으면 갱신
+
+    history면 Undo/Redo 기록까지 읽는다 (편집할 때만 필요).
+    돌려받은 문서를 고쳐도 update_document로 저장하기 전에는 저장소에 반영되지 않는다.
+    """
+    document = store.get_document(file_id, history=history)
+    if document is None:
+        raise HTTPException(status_code=404, detail="File not found")
+    now = time.time()
+    if now - document["accessed"] > SESSION_TOUCH_INTERVAL:
+        document["accessed"] = now
+        store.touch_document(file_id, now)
+    return document
+
+async def require_document(file_id: str, history: bool = False) -> dict:
+    """이벤트 루프 밖에서 load_document 실행"""
+    return await run_in_threadpool(load_document, file_id, history)
+
+def open_document(file_id: str, document: dict):
+    """새 가상 문서를 저장하고 참조하는 원본의 refcount를 늘림"""
+    acquire_blob_refs(document)
+    store.create_document(file_id, document)
+
+def materialized_path(file_id: str, document: dict) -> Path:
+    """현재 버전의 가상 문서를 실제 PDF로 만든 결과 경로"""
+    return MATERIALIZED_DIR / f"{file_id}-v{document['version']}.pdf"
+
+def materialized_versions(file_id: str) -> list:
+    """디스크에 남아 있는 문서의 실체화 결과 [(버전, 경로)] (버전 오름차순)"""
+    versions = []
+    for path in MATERIALIZED_DIR.glob(f"{file_id}-v*.pdf"):
+        version = path.stem.rpartition("-v")[2]
+        if version.isdigit():
+            versions.append((int(version), path))
+    return sorted(versions)
+
+def incremental_base(file_id: str, document: dict) -> Optional[tuple]:
+    """증분 저장의 기준 파일과 그 페이지 구성 (base_path, [원본 경로, 페이지 인덱스, 회전 각도] 목록)
+
+    이전 버전 실체화 결과가 남아 있으면 그것을, 없으면 가장 많은 페이지를 가진 원본을 기준으로 한다.
+    """
+    for version, path in reversed(materialized_versions(file_id)):
+        if version >= document["version"]:
+            continue
+        try:
+            base_pages = json.loads(path.with_suffix(".json").read_text())
+        except (OSError, ValueError):
+            continue
+        return str(path), base_pages
+
+    digests = collections.Counter(ref[0] for ref in document["pages"])
+    if not digests:
+        return None
+    digest = digests.most_common(1)[0][0]
+    base_path = str(blob_path(digest))
+    return base_path, [[base_path, page_idx, 0] for page_idx in range(store.get_blob(digest)["page_count"])]
+
+def is_whole_source(pages: list) -> Optional[str]:
+    """페이지 목록이 원본 파일 하나를 순서 그대로 담고 있으면 그 해시 반환"""
+    if not pages:
+        return None
+    digest = pages[0][0]
+    blob = store.get_blob(digest)
+    if blob is None or len(pages) != blob["page_count"]:
+        return None
+    for i, (ref_digest, page_idx, rotation) in enumerate(pages):
+        if ref_digest != digest or page_idx != i or rotation != 0:
+            return None
+    return digest
+
+async def materialize_document(file_id: str, document: dict, job: Optional[str] = None) -> str:
+    """가상 문서를 실제 PDF 파일로 만들어 경로 반환 (다음 편집 전까지 캐시)"""
+    # 편집되지 않은 문서는 원본을 그대로 사용
+    digest = await run_in_threadpool(is_whole_source, document["pages"])
+    if digest is not None:
+        return str(blob_path(digest))
+
+    output_path = materialized_path(file_id, document)
+    if output_path.exists():
+        cache_requests.inc(cache="materialized", result="hit")
+        return str(output_path)
+    cache_requests.inc(cache="materialized", result="miss")
+
+    pages = [[str(blob_path(digest)), page_idx, rotation] for digest, page_idx, rotation in document["pages"]]
+    base = await run_in_threadpool(incremental_base, file_id, document) if INCREMENTAL_SAVE and HAS_PYMUPDF else None
+    base_size = file_size(Path(base[0])) if base is not None else 0
+    if base is None:
+        reason = "incremental save disabled"
+    elif base_size < INCREMENTAL_MIN_BYTES:
+        reason = "base file too small"
+    else:
+        reason = None
+
+    # 이전 버전 결과는 새 버전이 생기면 지우므로 그 파일 끝에 바로 덧붙이고, 원본 파일은 복사해서 덧붙인다
+    in_place = reason is None and Path(base[0]).parent == MATERIALIZED_DIR
+    if reason is None:
+        result = await run_pdf_job(
+            pdf_worker.save_incremental, base[0], base[1], pages, str(output_path), INCREMENTAL_MAX_REVISIONS,
+            in_place, job=job)
+    else:
+        start = time.perf_counter()
+        size = await run_pdf_job(pdf_worker.write_document, pages, str(output_path), job=job)
+        result = {
+            "mode": "full",
+            "reason": reason,
+            "bytes_written": size,
+            "size": size,
+            "revisions": 1,
+            "seconds": round(time.perf_counter() - start, 4),
+        }
+    # 다음 버전의 증분 저장 기준으로 쓸 페이지 구성
+    output_path.with_suffix(".json").write_text(json.dumps(pages))
+    written = result["size"] + file_size(output_path.with_suffix(".json"))
+    # 제자리에 덧붙였으면 이전 버전 파일은 새 버전 파일이 됨
+    disk_totals.add("materialized", written - (base_size if in_place and result["mode"] == "incremental" else 0))
+
+    save_requests.inc(mode=result["mode"])
+    save_bytes.inc(result["bytes_written"], mode=result["mode"])
+    print(
+        f"Saved {file_id} v{document['version']}: {result['mode']}"
+        f"{' (' + result['reason'] + ')' if result['reason'] else ''}, "
+        f"{result['bytes_written']} bytes written, {result['size']} bytes total, "
+        f"{result['revisions']} revisions, {result['seconds']}s"
+    )
+
+    # 만드는 동안 문서가 편집되었으면 이전 버전 결과는 버림
+    if await run_in_threadpool(store.get_version, file_id) != document["version"]:
+        output_path.unlink(missing_ok=True)
+        output_path.with_suffix(".json").unlink(missing_ok=True)
+        disk_totals.add("materialized", -written)
+        raise HTTPException(status_code=409, detail="Document changed during export, please retry")
+
+    # 새 버전이 다음 기준이 되므로 더 오래된 결과는 삭제 (제자리에 덧붙인 이전 버전은 페이지 구성 파일만 남음)
+    for path in MATERIALIZED_DIR.glob(f"{file_id}-v*"):
+        version = path.stem.rpartition("-v")[2]
+        if version.isdigit() and int(version) < document["version"]:
+            disk_totals.add("materialized", -file_size(path))
+            path.unlink(missing_ok=True)
+
+    return str(output_path)
+
+def update_document(file_id: str, document: dict):
+    """편집한 가상 문서를 새 버전으로 저장
+
+    이전 실체화 결과는 다음 버전의 증분 저장 기준으로 쓰기 위해 남겨 두고, 새 버전을 만들 때 지운다.
+    읽은 뒤 다른 요청이 먼저 문서를 바꿨으면 덮어쓰지 않고 409를 반환한다.
+    """
+    expected_version = document["version"]
+
+    document["version"] += 1
+    document["modified"] = time.time()
+    acquired, dropped = acquire_blob_refs(document)
+
+    if not store.save_document(file_id, document, expected_version):
+        for digest in acquired:
+            release_blob(digest)
+        raise HTTPException(status_code=409, detail="Document was modified by another request, please retry")
+
+    for digest in dropped:
+        release_blob(digest)
+
+def thumbnail_key(ref: list, width: int, image_format: str) -> str:
+    """썸네일 캐시 키 (원본 내용 해시 + 페이지 + 회전 + 폭 + 형식)
+
+    페이지 순서가 아니라 페이지 내용에 대한 키이므로 페이지를 옮겨도 캐시가 유지된다.
+    """
+    digest, page_idx, rotation = ref
+    return hashlib.sha256(f"{digest}:{page_idx}:{rotation}:{width}:{image_format}".encode()).hexdigest()
+
+async def get_thumbnail(ref: list, width: int, image_format: str) -> tuple[Path, str]:
+    """페이지 썸네일 파일 경로와 캐시 키 반환 (없으면 렌더링)"""
+    key = thumbnail_key(ref, width, image_format)
+    name = f"{key}.{image_format}"
+
+    path = thumbnail_cache.lookup(name)
+    if path is not None:
+        return path, key
+
+    path = THUMBNAIL_DIR / name
+    digest, page_idx, rotation = ref
+    size = await run_pdf_job(
+        pdf_worker.render_thumbnail,
+        str(blob_path(digest)), page_idx, rotation, width, image_format, str(path),
+    )
+    thumbnail_cache.added(size)
+    return path, key
+
+def pages_key(pages: list) -> str:
+    """페이지 참조 목록의 내용 해시 (같은 페이지 구성이면 같은 키)"""
+    return hashlib.sha256(json.dumps(pages).encode()).hexdigest()
+
+async def extract_pages(pages: list) -> tuple[Path, str]:
+    """페이지 참조 목록만 담은 PDF 파일 경로와 캐시 키 반환 (없으면 생성)"""
+    key = pages_key(pages)
+    name = f"{key}.pdf"
+
+    path = extract_cache.lookup(name)
+    if path is not None:
+        return path, key
+
+    path = EXTRACT_DIR / name
+    refs = [[str(blob_path(digest)), page_idx, rotation] for digest, page_idx, rotation in pages]
+    size = await run_pdf_job(pdf_worker.write_document, refs, str(path))
+    extract_cache.added(size)
+    return path, key
+
+def parse_split_ranges(ranges: str, page_count: int) -> list:
+    """"0-4,5,6-9" 형식(0-based, 끝 포함)의 범위 목록을 [(시작, 끝)]으로 변환"""
+    result = []
+    for part in ranges.split(","):
+        start, _, end = part.strip().partition("-")
+        try:
+            start = int(start)
+            end = int(end) if end else start
+        except ValueError:
+            raise ValueError(f"Invalid range: {part.strip()}")
+        if not (0 <= start <= end < page_count):
+            raise ValueError(f"Invalid range: {part.strip()}")
+        result.append((start, end))
+    return result
+
+async def outline_ranges(document: dict, max_level: int) -> list:
+    """책갈피 위치로 나눈 범위 [(시작, 끝, 제목)]
+
+    원본 파일마다 책갈피를 읽어 그 페이지가 현재 문서의 어디에 있는지로 바꾸며,
+    max_level 단계 이하의 책갈피에서 새 조각을 시작한다. 첫 책갈피 앞의 페이지는 제목 없는 조각이 된다.
+    """
+    positions = {}
+    for position, (digest, page_idx, _) in enumerate(document["pages"]):
+        positions.setdefault((digest, page_idx), position)
+
+    starts = {}
+    for digest in dict.fromkeys(ref[0] for ref in document["pages"]):
+        for level, title, page_idx in await run_pdf_job(pdf_worker.read_outline, str(blob_path(digest))):
+            position = positions.get((digest, page_idx))
+            if level <= max_level and position is not None:
+                # 같은 페이지의 책갈피가 여러 개면 첫 번째 제목 사용
+                starts.setdefault(position, title)
+    if not starts:
+        raise ValueError("Document has no bookmarks to split at")
+
+    if 0 not in starts:
+        starts[0] = ""
+    boundaries = sorted(starts)
+    ends = boundaries[1:] + [len(document["pages"])]
+    return [(start, end - 1, starts[start]) for start, end in zip(boundaries, ends)]
+
+def part_filename(stem: str, start: int, end: int, title: Optional[str], index: int) -> str:
+    """ZIP 안의 조각 파일 이름 (책갈피 제목이 있으면 제목 사용, 페이지 번호는 1부터)"""
+    if title:
+        # 경로 구분자나 제어 문자가 들어간 제목 정리
+        safe = "".join("_" if ch in '\\/:*?"<>|' or ord(ch) < 32 else ch for ch in title).strip() or "untitled"
+        return f"{index + 1:03d}_{safe[:80]}.pdf"
+    return f"{stem}_{index + 1:03d}_p{start + 1}-{end + 1}.pdf"
+
+class ZipStream:
+    """ZipFile이 쓴 데이터를 모아 두었다가 응답 조각으로 꺼내는 쓰기 전용 스트림
+
+    seek/tell이 없으므로 ZipFile이 데이터 디스크립터 방식으로 써서 앞부분을 다시 고치지 않는다.
+    """
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self) -> bytes:
+        """지금까지 쓴 데이터를 꺼내고 비움"""
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+async def optimize_document(file_id: str, document: dict, job: Optional[str] = None) -> tuple[Path, dict]:
+    """문서를 크기를 줄인 PDF로 만들어 (경로, 최적화 결과) 반환
+
+    결과는 페이지 구성 내용으로 캐시하므로 같은 구성이면 다시 최적화하지 않는다.
+    캐시에서 찾으면 최적화 결과는 {"after", "cached": True}만 담는다.
+    """
+    name = f"{pages_key(document['pages'])}.pdf"
+    path = optimized_cache.lookup(name)
+    if path is not None:
+        return path, {"after": path.stat().st_size, "cached": True}
+
+    source = await materialize_document(file_id, document, job=job)
+    path = OPTIMIZED_DIR / name
+    result = await run_pdf_job(pdf_worker.optimize_pdf, source, str(path), job=job)
+    optimized_cache.added(result["after"])
+    return path, {**result, "cached": False}
+
+def optimize_headers(result: dict) -> dict:
+    """최적화 전후 크기와 걸린 시간을 알려주는 응답 헤더"""
+    headers = {"X-Optimized-Size": str(result["after"])}
+    if not result["cached"]:
+        headers.update({
+            "X-Original-Size": str(result["before"]),
+            "X-Optimize-Seconds": str(result["seconds"]),
+        })
+    return headers
+
+def document_etag(file_id: str, document: dict) -> str:
+    """문서 버전에 대한 ETag (편집할 때마다 바뀜)"""
+    return f'"{file_id}-v{document["version"]}"'
+
+def is_not_modified(request: Request, etag: str, last_modified: Optional[float]) -> bool:
+    """조건부 요청 헤더로 보아 클라이언트가 가진 내용이 최신인지 확인"""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+    # If-None-Match가 없을 때만 If-Modified-Since 사용 (초 단위 비교)
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified is not None:
+        try:
+            return int(last_modified) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+def parse_range(range_header: str, size: int) -> Optional[tuple[int, int]]:
+    """단일 바이트 범위 헤더를 (시작, 끝) 포함 범위로 변환
+
+    범위 요청으로 처리할 수 없으면 None, 만족할 수 없는 범위면 ValueError.
+    """
+    unit, _, ranges = range_header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in ranges:
+        # 여러 범위 요청은 전체 응답으로 처리
+        return None
+    start_text, _, end_text = ranges.strip().partition("-")
+    try:
+        if start_text == "":
+            # 마지막 N 바이트
+            length = int(end_text)
+            if length <= 0:
+                raise ValueError("Empty suffix range")
+            start, end = max(size - length, 0), size - 1
+        else:
+            start = int(start_text)
+            end = int(end_text) if end_text else size - 1
+            end = min(end, size - 1)
+    except ValueError:
+        raise ValueError("Invalid range")
+    if start < 0 or start > end or start >= size:
+        raise ValueError("Range not satisfiable")
+    return start, end
+
+def iter_file_range(f, start: int, end: int, chunk_size: int = UPLOAD_CHUNK_SIZE):
+    """열린 파일의 [start, end] 구간을 조금씩 읽어 반환 (다 읽으면 파일을 닫음)"""
+    with f:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = f.read(min(chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+async def send_pdf(request: Request, etag: str, last_modified: Optional[float], produce,
+                   filename: Optional[str] = None, extra_headers: Optional[dict] = None) -> Response:
+    """ETag/Last-Modified 검증과 바이트 범위 요청을 지원하는 PDF 응답
+
+    produce는 PDF 파일 경로를 돌려주는 코루틴 함수이며, 304로 응답할 때는 호출하지 않는다.
+    extra_headers는 produce가 끝난 뒤 응답 헤더에 더하므로 produce 안에서 채워도 된다.
+    """
+    headers = {
+        "ETag": etag,
+        "Accept-Ranges": "bytes",
+        "Cache-Control": "no-cache",
+    }
+    if last_modified is not None:
+        headers["Last-Modified"] = formatdate(last_modified, usegmt=True)
+
+    # 바뀌지 않은 내용은 PDF를 만들지 않고 304로 응답
+    if is_not_modified(request, etag, last_modified):
+        return Response(status_code=304, headers=headers)
+
+    # 이전 버전 파일은 다음 버전을 저장할 때 이름이 바뀌고 끝에 내용이 덧붙을 수 있으므로
+    # 바로 열어 둔 뒤 연 시점의 크기만큼만 보냄
+    file_path = str(await produce())
+    try:
+        f = open(file_path, "rb")
+    except FileNotFoundError:
+        # 경로를 얻은 뒤 다음 버전 저장이 파일을 가져갔으면 한 번 더 만듦
+        file_path = str(await produce())
+        f = open(file_path, "rb")
+    if extra_headers:
+        headers.update(extra_headers)
+
+    size = os.fstat(f.fileno()).st_size
+    start, end = 0, size - 1
+    status_code = 200
+
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    # If-Range가 현재 버전과 다르면 범위를 무시하고 전체 전송
+    if range_header and (if_range is None or if_range.strip() == etag
+                         or if_range.strip() == headers.get("Last-Modified")):
+        try:
+            byte_range = parse_range(range_header, size)
+        except ValueError:
+            f.close()
+            return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+        if byte_range is not None:
+            start, end = byte_range
+            status_code = 206
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+
+    headers["Content-Length"] = str(end - start + 1)
+    if filename:
+        headers["Content-Disposition"] = f"attachment; filename*=utf-8''{quote(filename)}"
+    return StreamingResponse(
+        iter_file_range(f, start, end),
+        status_code=status_code,
+        media_type="application/pdf",
+        headers=headers,
+    )
+
+async def pdf_response(request: Request, file_id: str, document: dict,
+                       filename: Optional[str] = None) -> Response:
+    """현재 버전 문서 전체의 PDF 응답"""
+    return await send_pdf(
+        request,
+        document_etag(file_id, document),
+        document["modified"],
+        lambda: materialize_document(file_id, document),
+        filename=filename,
+    )
+
+def close_document(file_id: str) -> int:
+    """문서와 편집 기록을 정리하고 원본 참조 해제, 지운 바이트 수 반환"""
+    document = store.delete_document(file_id)
+    if document is None:
+        return 0
+    freed = 0
+    for path in MATERIALIZED_DIR.glob(f"{file_id}-v*"):
+        freed += file_size(path)
+        path.unlink(missing_ok=True)
+    disk_totals.add("materialized", -freed)
+    for digest in document["blobs"]:
+        freed += release_blob(digest)
+    return freed
+
+def file_size(path: Path) -> int:
+    """파일 크기 (없으면 0)"""
+    try:
+        return path.stat().st_size
+    except FileNotFoundError:
+        return 0
+
+def directory_bytes(directory: Path) -> int:
+    """디렉토리 바로 아래 파일들의 크기 합계"""
+    return sum(file_size(path) for path in directory.iterdir() if path.is_file())
+
+def disk_usage() -> dict:
+    """임시 디렉토리 사용량 (종류별 바이트)"""
+    usage = {
+        "sources": directory_bytes(SOURCE_DIR),
+        "materialized": directory_bytes(MATERIALIZED_DIR),
+        "thumbnails": directory_bytes(THUMBNAIL_DIR),
+        "extracts": directory_bytes(EXTRACT_DIR),
+        "optimized": directory_bytes(OPTIMIZED_DIR),
+        "text": directory_bytes(TEXT_DIR),
+        "jobs": sum(file_size(path) for path in JOBS_DIR.glob("*.pdf")),
+        "other": directory_bytes(TEMP_DIR),
+    }
+    usage["total"] = sum(usage.values())
+    return usage
+
+def session_bytes(file_id: str, document: dict, pages: Optional[list] = None) -> int:
+    """문서 하나가 차지하는 디스크 용량 (참조하는 원본 + 실체화 결과)
+
+    pages를 주면 그 페이지 목록이 추가로 참조하는 원본까지 포함해 계산한다.
+    """
+    digests = set(document["blobs"])
+    if pages is not None:
+        digests.update(ref[0] for ref in pages)
+    total = file_size(materialized_path(file_id, document))
+    for digest in digests:
+        blob = store.get_blob(digest)
+        if blob is not None:
+            total += blob["size"]
+    return total
+
+def check_session_quota(file_id: str, document: dict, pages: list):
+    """편집 결과가 문서당 디스크 용량을 넘으면 413"""
+    if session_bytes(file_id, document, pages) > SESSION_QUOTA_BYTES:
+        raise HTTPException(status_code=413, detail="Session disk quota exceeded")
+
+def expire_idle_sessions(now: float) -> list:
+    """SESSION_TTL 동안 접근하지 않은 문서를 닫고 닫은 file_id 목록 반환"""
+    expired = [
+        file_id for file_id, accessed in store.list_documents()
+        if now - accessed > SESSION_TTL
+    ]
+    for file_id in expired:
+        close_document(file_id)
+    return expired
+
+def remove_orphan_files(now: float) -> int:
+    """어느 문서에도 속하지 않은 임시 파일 삭제, 지운 파일 수 반환"""
+    removed = 0
+
+    def is_stale(path: Path) -> bool:
+        try:
+            return now - path.stat().st_mtime > ORPHAN_GRACE_SECONDS
+        except FileNotFoundError:
+            return False
+
+    for path in SOURCE_DIR.iterdir():
+        # 등록되지 않은 원본과 중단된 업로드
+        if is_stale(path) and store.get_blob(path.stem) is None:
+            path.unlink(missing_ok=True)
+            removed += 1
+
+    for path in TEXT_DIR.iterdir():
+        # 지워진 원본의 검색 색인과 중단된 쓰기
+        if is_stale(path) and store.get_blob(path.stem) is None:
+            path.unlink(missing_ok=True)
+            removed += 1
+
+    for path in MATERIALIZED_DIR.iterdir():
+        # 닫힌 문서나 이전 버전의 실체화 결과, 중단된 쓰기
+        if not is_stale(path):
+            continue
+        file_id, _, version = path.stem.rpartition("-v")
+        current_version = store.get_version(file_id) if file_id else None
+        if current_version is not None and version == str(current_version):
+            continue
+        path.unlink(missing_ok=True)
+        removed += 1
+
+    for directory in (THUMBNAIL_DIR, EXTRACT_DIR, OPTIMIZED_DIR):
+        for path in directory.glob("*.part"):
+            if is_stale(path):
+                path.unlink(missing_ok=True)
+                removed += 1
+
+    # 이전 버전이 임시 디렉토리에 바로 저장하던 파일
+    for path in TEMP_DIR.iterdir():
+        if path.is_file() and is_stale(path):
+            path.unlink(missing_ok=True)
+            removed += 1
+
+    return removed
+
+def sync_disk_usage() -> dict:
+    """임시 디렉토리를 훑어 사용량 누계를 실제 값으로 맞추고 종류별 사용량 반환"""
+    usage = disk_usage()
+    disk_totals.reset({kind: usage[kind] for kind in ("sources", "materialized", "text", "jobs", "other")})
+    thumbnail_cache.total_bytes = usage["thumbnails"]
+    extract_cache.total_bytes = usage["extracts"]
+    optimized_cache.total_bytes = usage["optimized"]
+    return usage
+
+def estimated_disk_bytes() -> int:
+    """디렉토리를 훑지 않고 누계로 추정한 임시 디렉토리 전체 사용량"""
+    caches = thumbnail_cache.total_bytes + extract_cache.total_bytes + optimized_cache.total_bytes
+    return disk_totals.total() + caches
+
+def enforce_disk_quota(keep: Optional[str] = None) -> list:
+    """임시 디렉토리가 DISK_QUOTA_BYTES를 넘으면 공간 확보, 닫은 file_id 목록 반환
+
+    다시 만들 수 있는 캐시부터 비우고, 그래도 넘으면 가장 오래 쓰지 않은 문서부터 닫는다.
+    사용량은 누계로 추정하므로 넘지 않았으면 파일 시스템을 건드리지 않는다.
+    """
+    overflow = estimated_disk_bytes() - DISK_QUOTA_BYTES
+    if overflow <= 0:
+        return []
+
+    for cache in (optimized_cache, extract_cache, thumbnail_cache):
+        overflow -= cache.shrink(max(cache.total_bytes - overflow, 0))
+        if overflow <= 0:
+            return []
+
+    closed = []
+    for file_id, _ in sorted(store.list_documents(), key=lambda item: item[1]):
+        if overflow <= 0:
+            break
+        if file_id == keep:
+            continue
+        overflow -= close_document(file_id)
+        closed.append(file_id)
+    return closed
+
+def run_janitor(now: Optional[float] = None) -> dict:
+    """만료된 문서, 남은 임시 파일, 용량 초과를 한 번 정리"""
+    now = time.time() if now is None else now
+    expired = expire_idle_sessions(now)
+    removed = remove_orphan_files(now)
+    sync_disk_usage()
+    evicted = enforce_disk_quota()
+    jobs = expire_jobs(now)
+    return {"expired": len(expired), "removed_files": removed, "evicted": len(evicted), "jobs": jobs}
+
+async def janitor_loop():
+    """주기적으로 임시 파일과 오래된 문서 정리 (파일 시스템을 훑으므로 이벤트 루프 밖에서 실행)"""
+    try:
+        # 이전 실행이 남긴 파일까지 사용량 누계에 반영
+        await run_in_threadpool(sync_disk_usage)
+    except Exception as e:
+        print(f"Error in janitor: {e}")
+    while True:
+        await asyncio.sleep(JANITOR_INTERVAL)
+        try:
+            result = await run_in_threadpool(run_janitor)
+            if any(result.values()):
+                print(f"Janitor: {result}")
+        except Exception as e:
+            print(f"Error in janitor: {e}")
+
+def job_file(job_id: str, suffix: str) -> Path:
+    """작업 파일 경로 (.json 상태, .progress 진행률, .cancel 취소 요청)"""
+    return JOBS_DIR / f"{job_id}{suffix}"
+
+def write_job(job: dict):
+    """작업 상태 저장 (다른 워커가 쓰다 만 파일을 읽지 않도록 임시 파일에 쓴 뒤 교체)"""
+    path = job_file(job["job_id"], ".json")
+    temp_path = path.with_suffix(".json.part")
+    temp_path.write_text(json.dumps(job))
+    os.replace(temp_path, path)
+
+def read_job(job_id: str) -> Optional[dict]:
+    """작업 상태 (없으면 None), 실행 중이면 작업 프로세스가 기록한 진행률 반영"""
+    if not job_id.isalnum():
+        return None
+    try:
+        job = json.loads(job_file(job_id, ".json").read_text())
+    except (OSError, ValueError):
+        return None
+    if job["status"] == "running":
+        try:
+            job.update(json.loads(job_file(job_id, ".progress").read_text()))
+        except (OSError, ValueError):
+            pass
+    return job
+
+def require_job(job_id: str) -> dict:
+    """작업 상태 반환 (없으면 404)"""
+    job = read_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+def public_job(job: dict) -> dict:
+    """응답으로 보낼 작업 상태 (서버 안의 파일 경로는 뺌)"""
+    result = job.get("result")
+    if result is not None:
+        result = {key: value for key, value in result.items() if key != "path"}
+    return {**job, "result": result}
+
+async def merge_documents(file_ids: list, filename: str) -> tuple[str, dict]:
+    """열려 있는 문서들을 순서대로 이어 붙인 새 문서 생성, (file_id, 문서) 반환"""
+    refs = []
+    for source_id in file_ids:
+        refs.extend((await require_document(source_id))["pages"])
+    file_id = uuid.uuid4().hex
+    document = create_document(filename, refs)
+    if await run_in_threadpool(session_bytes, file_id, document, refs) > SESSION_QUOTA_BYTES:
+        raise HTTPException(status_code=413, detail="Session disk quota exceeded")
+    await run_in_threadpool(open_document, file_id, document)
+    return file_id, document
+
+async def execute_job(job: dict) -> dict:
+    """작업 종류에 따라 PDF를 만들고 결과 반환 ({"path", "file_id", "version", "size", ...})"""
+    params = job["params"]
+    if job["kind"] == "merge":
+        file_id, document = await merge_documents(params["file_ids"], params["filename"])
+    else:
+        file_id = params["file_id"]
+        document = await require_document(file_id)
+
+    # 작업 프로세스가 진행률을 보고하기 전에도 전체 페이지 수는 보이도록 기록
+    job["total"] = len(document["pages"])
+    write_job(job)
+
+    prefix = str(job_file(job["job_id"], ""))
+    result = {"file_id": file_id, "version": document["version"], "filename": document["filename"]}
+    if params["optimize"]:
+        path, optimized = await optimize_document(file_id, document, job=prefix)
+        result["optimize"] = {
+            "before_bytes": optimized.get("before"),
+            "after_bytes": optimized["after"],
+            "seconds": optimized.get("seconds"),
+        }
+    else:
+        path = await materialize_document(file_id, document, job=prefix)
+    path = await run_in_threadpool(keep_job_result, job["job_id"], path)
+    result.update({"path": str(path), "size": file_size(path)})
+    return result
+
+def keep_job_result(job_id: str, path) -> Path:
+    """결과 PDF를 작업 디렉토리에 하드 링크로 남겨 경로 반환
+
+    실체화 결과는 다음 버전을 저장할 때 지우거나 끝에 덧붙이고, 최적화 결과는 캐시에서 밀려날 수 있으므로
+    작업이 만료될 때까지 받을 수 있도록 따로 둔다. 링크가 걸린 실체화 파일에는 덧붙이지 않는다.
+    """
+    target = job_file(job_id, ".pdf")
+    try:
+        os.link(path, target)
+    except FileNotFoundError:
+        # 결과를 만든 뒤 다음 버전 저장이 파일을 가져감
+        raise HTTPException(status_code=409, detail="Document changed during export, please retry")
+    except OSError:
+        # 하드 링크를 지원하지 않는 파일 시스템
+        shutil.copyfile(path, target)
+    disk_totals.add("jobs", file_size(target))
+    return target
+
+async def run_background_job(job: dict):
+    """대기 순서가 되면 작업을 실행하고 상태 파일에 결과나 오류 기록"""
+    job_id = job["job_id"]
+    try:
+        async with job_slots:
+            if job_file(job_id, ".cancel").exists():
+                job["status"] = "cancelled"
+                return
+            job.update({"status": "running", "started": time.time()})
+            write_job(job)
+            try:
+                job["result"] = await execute_job(job)
+                job.update({"status": "done", "done": job["total"]})
+            except pdf_worker.JobCancelled:
+                job["status"] = "cancelled"
+            except HTTPException as e:
+                job.update({"status": "failed", "error": e.detail})
+            except Exception as e:
+                job.update({"status": "failed", "error": str(e)})
+    except asyncio.CancelledError:
+        job["status"] = "cancelled"
+    finally:
+        # 작업 프로세스가 마지막으로 기록한 진행률 반영
+        latest = read_job(job_id)
+        if job["status"] != "done" and latest is not None:
+            job.update({"step": latest["step"], "done": latest["done"], "total": latest["total"]})
+        job["finished"] = time.time()
+        write_job(job)
+        job_file(job_id, ".progress").unlink(missing_ok=True)
+        job_tasks.pop(job_id, None)
+        background_jobs.inc(kind=job["kind"], status=job["status"])
+        print(f"Job {job_id} ({job['kind']}): {job['status']}"
+              f"{', ' + job['error'] if job.get('error') else ''}")
+
+def expire_jobs(now: float) -> int:
+    """끝난 지 JOB_TTL이 지난 작업 파일 삭제, 지운 작업 수 반환
+
+    이 프로세스에서 실행 중인 작업은 건드리지 않고, 끝나지 않은 채 남은 작업(서버 재시작 등)은
+    만든 지 JOB_TIMEOUT + JOB_TTL이 지나면 삭제한다.
+    """
+    removed = 0
+    for path in JOBS_DIR.glob("*.json"):
+        job_id = path.stem
+        if job_id in job_tasks:
+            continue
+        job = read_job(job_id)
+        if job is not None:
+            finished = job.get("finished") or job["created"] + JOB_TIMEOUT
+            if now - finished <= JOB_TTL:
+                continue
+        disk_totals.add("jobs", -file_size(job_file(job_id, ".pdf")))
+        for suffix in (".json", ".progress", ".cancel", ".pdf"):
+            job_file(job_id, suffix).unlink(missing_ok=True)
+        removed += 1
+    return removed
+
+def check_page_index(pages: list, index, name: str):
+    """페이지 인덱스 검증"""
+    if not isinstance(index, int) or isinstance(index, bool) or not (0 <= index < len(pages)):
+        raise ValueError(f"Invalid page index for '{name}': {index}")
+
+def check_insert_position(pages: list, position):
+    """끼워 넣을 위치 검증 (페이지 수와 같으면 끝에 추가)"""
+    if not isinstance(position, int) or isinstance(position, bool) or not (0 <= position <= len(pages)):
+        raise ValueError(f"Invalid insert position: {position}")
+
+def check_permutation(pages: list, order):
+    """order가 모든 페이지 인덱스를 정확히 한 번씩 담은 목록인지 검증 (O(n))"""
+    if not isinstance(order, list) or len(order) != len(pages):
+        raise ValueError(f"'order' must list each of the {len(pages)} page indices exactly once")
+    seen = [False] * len(pages)
+    for index in order:
+        check_page_index(pages, index, "order")
+        if seen[index]:
+            raise ValueError(f"Duplicate page index in 'order': {index}")
+        seen[index] = True
+
+def selection_order(pages: list, selection, before) -> list:
+    """selection 페이지들을 before 인덱스의 페이지 앞으로 옮긴 새 순서 (O(n))
+
+    before는 옮기기 전 인덱스 기준이며 페이지 수와 같으면 맨 끝으로 옮긴다.
+    옮긴 페이지끼리는 원래 순서를 유지한다.
+    """
+    if not isinstance(selection, list) or not selection:
+        raise ValueError("'pages' must be a non-empty list of page indices")
+    if not isinstance(before, int) or isinstance(before, bool) or not (0 <= before <= len(pages)):
+        raise ValueError(f"Invalid page index for 'before': {before}")
+    selected = [False] * len(pages)
+    for index in selection:
+        check_page_index(pages, index, "pages")
+        if selected[index]:
+            raise ValueError(f"Duplicate page index in 'pages': {index}")
+        selected[index] = True
+    moved = [i for i in range(len(pages)) if selected[i]]
+    head = [i for i in range(before) if not selected[i]]
+    tail = [i for i in range(before, len(pages)) if not selected[i]]
+    return head + moved + tail
+
+def apply_operations(pages: list, operations: list) -> tuple[list, list]:
+    """페이지 참조 목록에 작업 목록을 순서대로 적용
+
+    반환값은 (새 페이지 목록, 이전 인덱스 → 새 인덱스 매핑)이며,
+    삭제된 페이지는 매핑 값이 None이다.
+    """
+    pages = [list(ref) for ref in pages]
+    original_count = len(pages)
+    # 각 페이지가 원래 몇 번째 페이지였는지 추적 (삽입된 페이지는 None)
+    origins = list(range(len(pages)))
+
+    for operation in operations:
+        op = operation.get("op")
+
+        if op == "move":
+            from_idx, to_idx = operation.get("from"), operation.get("to")
+            check_page_index(pages, from_idx, "from")
+            check_page_index(pages, to_idx, "to")
+            pages.insert(to_idx, pages.pop(from_idx))
+            origins.insert(to_idx, origins.pop(from_idx))
+
+        elif op == "swap":
+            from_idx, to_idx = operation.get("from"), operation.get("to")
+            check_page_index(pages, from_idx, "from")
+            check_page_index(pages, to_idx, "to")
+            pages[from_idx], pages[to_idx] = pages[to_idx], pages[from_idx]
+            origins[from_idx], origins[to_idx] = origins[to_idx], origins[from_idx]
+
+        elif op in ("permute", "move_pages"):
+            if op == "permute":
+                order = operation.get("order")
+                check_permutation(pages, order)
+            else:
+                order = selection_order(pages, operation.get("pages"), operation.get("before"))
+            pages = [pages[i] for i in order]
+            origins = [origins[i] for i in order]
+
+        elif op == "delete":
+            page_idx = operation.get("page")
+            check_page_index(pages, page_idx, "page")
+            del pages[page_idx]
+            del origins[page_idx]
+
+        elif op == "insert":
+            source_file_id = operation.get("source_file_id")
+            source = store.get_document(source_file_id) if isinstance(source_file_id, str) else None
+            if source is None:
+                raise ValueError(f"Source file not found: {source_file_id}")
+            source_pages = source["pages"]
+            position = operation.get("position", len(pages))
+            check_insert_position(pages, position)
+            if not isinstance(operation.get("pages", []), list):
+                raise ValueError("'pages' must be a list of page indices")
+            new_pages = []
+            for page_idx in operation.get("pages", []):
+                check_page_index(source_pages, page_idx, "pages")
+                new_pages.append(list(source_pages[page_idx]))
+            pages[position:position] = new_pages
+            origins[position:position] = [None] * len(new_pages)
+
+        elif op == "rotate":
+            page_idx, angle = operation.get("page"), operation.get("angle", 90)
+            check_page_index(pages, page_idx, "page")
+            if not isinstance(angle, int) or angle % 90 != 0:
+                raise ValueError(f"Rotation angle must be a multiple of 90: {angle}")
+            pages[page_idx][2] = (pages[page_idx][2] + angle) % 360
+
+        else:
+            raise ValueError(f"Unknown operation: {op}")
+
+    index_map = [None] * original_count
+    for new_idx, old_idx in enumerate(origins):
+        if old_idx is not None:
+            index_map[old_idx] = new_idx
+    return pages, index_map
+
+def edit_document(file_id: str, document: dict, operations: list) -> dict:
+    """작업 목록을 문서에 적용하고 Undo 기록을 남김 (저장은 apply_edits에서)"""
+    before = document["pages"]
+    pages, index_map = apply_operations(before, operations)
+    check_session_quota(file_id, document, pages)
+
+    # Undo 기록 저장
+    save_undo_state(document, before, pages)
+    document["pages"] = pages
+
+    return {"page_count": len(pages), "index_map": index_map}
+
+def undo_document(document: dict) -> dict:
+    """마지막 편집 이전의 페이지 참조 목록으로 복원"""
+    if len(document["undo"]) == 0:
+        raise HTTPException(status_code=400, detail="No undo history available")
+    entry = document["undo"].pop()
+    document["redo"].append(entry)
+    start = entry["start"]
+    document["pages"][start:start + len(entry["added"])] = [list(ref) for ref in entry["removed"]]
+    return {"page_count": len(document["pages"])}
+
+def redo_document(document: dict) -> dict:
+    """되돌렸던 편집 이후의 페이지 참조 목록으로 복원"""
+    if len(document["redo"]) == 0:
+        raise HTTPException(status_code=400, detail="No redo history available")
+    entry = document["redo"].pop()
+    document["undo"].append(entry)
+    start = entry["start"]
+    document["pages"][start:start + len(entry["removed"])] = [
+        list(entry["removed"][ref] if isinstance(ref, int) else ref) for ref in entry["added"]
+    ]
+    return {"page_count": len(document["pages"])}
+
+def insert_document_pages(file_id: str, document: dict, refs: list, position: Optional[int]) -> dict:
+    """페이지 참조 목록을 position(0-based) 앞에 끼워 넣고 Undo 기록을 남김 (None이면 끝에 추가)"""
+    before = document["pages"]
+    if position is None:
+        position = len(before)
+    check_insert_position(before, position)
+    pages = before[:position] + refs + before[position:]
+    check_session_quota(file_id, document, pages)
+
+    save_undo_state(document, before, pages)
+    document["pages"] = pages
+
+    index_map = [i if i < position else i + len(refs) for i in range(len(before))]
+    return {"page_count": len(pages), "index_map": index_map}
+
+def run_edits(document: dict, edits: list) -> list:
+    """편집 함수들을 순서대로 문서에 적용하고 [(결과, 오류)] 반환"""
+    outcomes = []
+    for edit in edits:
+        try:
+            outcomes.append((edit(document), None))
+        except Exception as e:
+            outcomes.append((None, e))
+    return outcomes
+
+async def apply_edits(file_id: str, edits: list):
+    """대기 중이던 편집을 순서대로 적용하고 문서는 한 번만 저장
+
+    각 편집 함수는 실패하면 문서를 바꾸지 않고 예외를 던져야 한다. 실패한 편집만
+    그 요청에 오류로 돌려주고 나머지는 그대로 저장한다.
+    """
+    for attempt in range(EDIT_RETRIES):
+        try:
+            document = await require_document(file_id, history=True)
+        except HTTPException as e:
+            outcomes = [(None, e)] * len(edits)
+            break
+
+        # 편집 함수는 원본 정보와 다른 문서를 저장소에서 읽으므로 이벤트 루프 밖에서 실행
+        outcomes = await run_in_threadpool(run_edits, document, [edit for edit, _ in edits])
+
+        if all(error is not None for _, error in outcomes):
+            break
+        try:
+            await run_in_threadpool(update_document, file_id, document)
+        except Exception as e:
+            # 다른 워커가 먼저 저장했으면 최신 문서에 같은 편집을 다시 적용
+            if isinstance(e, HTTPException) and e.status_code == 409 and attempt < EDIT_RETRIES - 1:
+                continue
+            outcomes = [(None, e)] * len(edits)
+        break
+
+    for (_, future), (result, error) in zip(edits, outcomes):
+        if future.done():
+            continue
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result({**result, "version": document["version"]})
+
+    results = [result for result, error in outcomes if error is None]
+    if results:
+        publish_change(file_id, document, results)
+
+def compose_index_maps(results: list) -> Optional[list]:
+    """편집 결과들의 이전 인덱스 → 새 인덱스 매핑을 하나로 합침 (매핑이 없는 편집이 있으면 None)"""
+    combined = None
+    for result in results:
+        index_map = result.get("index_map")
+        if index_map is None:
+            return None
+        if combined is None:
+            combined = list(index_map)
+        else:
+            combined = [None if i is None else index_map[i] for i in combined]
+    return combined
+
+def change_event(document: dict, index_map: Optional[list] = None) -> dict:
+    """문서 변경 알림 내용 (버전, 페이지 수, 페이지 위치 매핑, Undo/Redo 단계 수)"""
+    return {
+        "version": document["version"],
+        "page_count": len(document["pages"]),
+        "index_map": index_map,
+        "undo_count": len(document["undo"]),
+        "redo_count": len(document["redo"]),
+    }
+
+def publish_change(file_id: str, document: dict, results: list):
+    """저장한 변경을 이 프로세스의 구독자에게 알림"""
+    listeners = document_listeners.get(file_id)
+    if not listeners:
+        return
+    event = change_event(document, compose_index_maps(results))
+    for queue in listeners:
+        queue.put_nowait(event)
+
+async def submit_edit(file_id: str, edit) -> dict:
+    """편집 함수를 문서 대기열에 넣고 적용 결과 반환 (결과에 새 문서 버전 포함)"""
+    future = asyncio.get_running_loop().create_future()
+    pending_edits.setdefault(file_id, []).append((edit, future))
+    lock = document_locks.setdefault(file_id, asyncio.Lock())
+
+    async with lock:
+        # 앞선 요청이 이미 함께 처리했으면 비어 있음
+        edits = pending_edits.pop(file_id, [])
+        try:
+            if edits:
+                await apply_edits(file_id, edits)
+        finally:
+            for _, pending in edits:
+                if not pending.done():
+                    pending.set_exception(HTTPException(status_code=503, detail="Edit was interrupted, please retry"))
+
+    if file_id not in pending_edits and document_locks.get(file_id) is lock:
+        del document_locks[file_id]
+
+    return await future
+
+def history_entry_size(entry: dict) -> int:
+    """편집 기록 하나가 차지하는 대략적인 바이트 수"""
+    return len(json.dumps(entry, ensure_ascii=False).encode("utf-8"))
+
+def history_bytes(document: dict) -> int:
+    """Undo/Redo 기록 전체가 차지하는 바이트 수"""
+    entries = document["undo"] + document["redo"]
+    return sum(history_entry_size(entry) for entry in entries)
+
+def cache_hit_ratios() -> dict:
+    """캐시별 적중률 (조회가 없었던 캐시는 제외)"""
+    ratios = {}
+    for cache in ("reader", "materialized", "thumbnail", "extract", "optimized"):
+        hits = cache_requests.value(cache=cache, result="hit")
+        total = hits + cache_requests.value(cache=cache, result="miss")
+        if total:
+            ratios[(cache,)] = hits / total
+    return ratios
+
+# 수집할 때 계산하는 현재 상태 지표
+registry.gauge("pdf_sessions", "Open documents", lambda: store.count()["documents"])
+registry.gauge("pdf_blobs", "Stored source files", lambda: store.count()["blobs"])
+registry.gauge("pdf_jobs_pending", "PDF jobs running or waiting in this process", lambda: pending_jobs)
+registry.gauge(
+    "temp_dir_bytes", "Temp directory usage by kind",
+    lambda: {(kind,): size for kind, size in disk_usage().items() if kind != "total"}, ("kind",))
+registry.gauge("cache_hit_ratio", "Cache hit ratio since start", cache_hit_ratios, ("cache",))
+
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus 텍스트 형식 지표"""
+    # 임시 디렉토리 크기 계산에 파일 시스템을 훑으므로 이벤트 루프 밖에서 실행
+    body = await run_in_threadpool(registry.render)
+    return Response(body, media_type="text/plain; version=0.0.4")
+
+@functools.lru_cache(maxsize=1)
+def load_index_html(mtime_ns: int) -> str:
+    """메인 페이지 HTML (파일 수정 시각이 같으면 다시 읽지 않음)"""
+    with open(INDEX_HTML, "r", encoding="utf-8") as f:
+        return f.read()
+
 @app.get("/", response_class=HTMLResponse)
 async def read_root():
     """메인 페이지"""
-    with open("templates/index.html", "r", encoding="utf-8") as f:
-        return f.read()
+    return load_index_html(os.stat(INDEX_HTML).st_mtime_ns)
 
 @app.post("/api/upload")
 async def upload_pdf(file: UploadFile = File(...)):
     """PDF 파일 업로드"""
     try:
-        # 임시 파일에 저장
-        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.pdf', dir=TEMP_DIR)
-        shutil.copyfileobj(file.file, temp_file)
-        temp_file.close()
-        
-        file_id = Path(temp_file.name).stem
-        uploaded_files[file_id] = temp_file.name
-        
-        # Undo 스택 초기화
-        undo_stacks[file_id] = []
+        # 해시를 먼저 계산해 같은 파일을 다시 올리면 디스크에 쓰지 않고 기존 원본 재사용
+        try:
+            digest = await store_blob(file.file)
+        except HTTPException:
+            raise
+        except Exception as e:
+            # 합치기와 같이 읽을 수 없는 파일은 400
+            raise HTTPException(status_code=400, detail=f"Invalid PDF '{file.filename}': {e}")
+        try:
+            blob = await run_in_threadpool(store.get_blob, digest)
+            page_count = blob["page_count"]
+            
+            if blob["size"] > SESSION_QUOTA_BYTES:
+                raise HTTPException(status_code=413, detail="Session disk quota exceeded")
+            
+            file_id = uuid.uuid4().hex
+            document = create_document(file.filename, source_pages(digest))
+            await run_in_threadpool(open_document, file_id, document)
+        finally:
+            # 등록할 때 잡은 임시 참조를 놓음 (아무 문서도 쓰지 않으면 원본 정리)
+            await run_in_threadpool(release_blob, digest)
         
-        # PDF 정보 가져오기
-        pdf_reader = pypdf.PdfReader(temp_file.name)
-        page_count = len(pdf_reader.pages)
+        # 전체 용량을 넘었으면 오래된 문서부터 정리
+        await run_in_threadpool(enforce_disk_quota, file_id)
         
         return JSONResponse({
             "file_id": file_id,
             "filename": file.filename,
-            "page_count": page_count
+            "page_count": page_count,
+            "version": document["version"],
+            "manifest": {"fields": MANIFEST_FIELDS, "pages": await document_manifest(document)}
         })
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/api/merge")
+async def merge_pdfs(request: Request):
+    """여러 PDF를 한 요청으로 받아 하나의 문서로 합치기
+
+    multipart 필드:
+        files: PDF 파일 (여러 개, 보낸 순서대로 합침)
+        filename: 새 문서 이름 (기본 merged.pdf)
+        file_id, insert_position: file_id를 주면 새 문서 대신 열려 있는 문서의 insert_position(0-based) 앞에 삽입
+                                  (insert_position이 없으면 끝에 추가)
+        optimize: "true"면 합친 결과를 바로 최적화하고 전후 크기를 응답에 포함
+                  (이후 /download?optimize=true는 캐시된 결과를 보냄)
+    """
+    fields, parts = await receive_multipart(request)
+    if not parts:
+        raise HTTPException(status_code=400, detail="No files to merge")
+    
+    target_file_id = fields.get("file_id")
+    if target_file_id:
+        await require_document(target_file_id)
+    
+    digests = []
+    try:
+        # 받은 파일을 원본으로 등록 (같은 내용은 한 번만 저장)
+        for filename, temp_path, digest in parts:
+            try:
+                digests.append(await register_blob(temp_path, digest))
+            except HTTPException:
+                raise
+            except Exception as e:
+                raise HTTPException(status_code=400, detail=f"Invalid PDF '{filename}': {e}")
+        
+        start = None
+        if target_file_id and fields.get("insert_position"):
+            try:
+                start = int(fields["insert_position"])
+            except ValueError:
+                raise HTTPException(status_code=400, detail="insert_position must be an integer")
+        # 파일마다 합친 페이지 목록에서 시작하는 위치 (삽입 위치는 아래에서 더함)
+        refs = []
+        sources = []
+        for (filename, _, _), digest in zip(parts, digests):
+            pages = source_pages(digest)
+            sources.append({"filename": filename, "offset": len(refs), "page_count": len(pages)})
+            refs.extend(pages)
+        
+        if target_file_id:
+            # 열려 있는 문서에 한 번의 편집으로 삽입
+            file_id = target_file_id
+            result = await submit_edit(
+                file_id, lambda document: insert_document_pages(file_id, document, refs, start)
+            )
+            filename = (await require_document(file_id))["filename"]
+            page_count = result["page_count"]
+            version = result["version"]
+            # 끝에 추가했으면 편집할 때의 페이지 수 뒤
+            if start is None:
+                start = page_count - len(refs)
+            for source in sources:
+                source["offset"] += start
+        else:
+            file_id = uuid.uuid4().hex
+            filename = fields.get("filename") or "merged.pdf"
+            document = create_document(filename, refs)
+            if await run_in_threadpool(session_bytes, file_id, document, refs) > SESSION_QUOTA_BYTES:
+                raise HTTPException(status_code=413, detail="Session disk quota exceeded")
+            await run_in_threadpool(open_document, file_id, document)
+            page_count = len(refs)
+            version = document["version"]
+        
+        response = {
+            "file_id": file_id,
+            "filename": filename,
+            "page_count": page_count,
+            "version": version,
+            "sources": sources
+        }
+        
+        if fields.get("optimize", "").lower() in ("1", "true", "yes"):
+            _, result = await optimize_document(file_id, await require_document(file_id))
+            response["optimize"] = {
+                "before_bytes": result.get("before"),
+                "after_bytes": result["after"],
+                "seconds": result.get("seconds"),
+            }
+        
+        # 전체 용량을 넘었으면 오래된 문서부터 정리
+        await run_in_threadpool(enforce_disk_quota, file_id)
+        
+        return JSONResponse(response)
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        # 등록하지 못한 임시 파일 정리, 등록할 때 잡은 임시 참조를 놓음 (아무 문서도 쓰지 않으면 원본 정리)
+        for _, temp_path, _ in parts:
+            Path(temp_path).unlink(missing_ok=True)
+        for digest in digests:
+            await run_in_threadpool(release_blob, digest)
+
 @app.get("/api/pdf/{file_id}")
-async def get_pdf(file_id: str):
-    """PDF 파일 다운로드"""
-    if file_id not in uploaded_files:
-        raise HTTPException(status_code=404, detail="File not found")
+async def get_pdf(request: Request, file_id: str):
+    """PDF 파일 다운로드 (조건부 요청과 범위 요청 지원)"""
+    document = await require_document(file_id)
     
-    file_path = uploaded_files[file_id]
-    return FileResponse(file_path, media_type="application/pdf")
+    return await pdf_response(request, file_id, document)
+
+@app.delete("/api/pdf/{file_id}")
+async def delete_pdf(file_id: str):
+    """문서 닫기 (더 이상 쓰지 않는 원본 파일 정리)"""
+    await require_document(file_id)
+    
+    await run_in_threadpool(close_document, file_id)
+    return JSONResponse({"status": "success"})
+
+@app.get("/api/pdf/{file_id}/events")
+async def get_document_events(file_id: str):
+    """문서 변경 알림을 Server-Sent Events로 전송
+
+    연결하면 현재 상태를 state 이벤트로 보내고, 편집할 때마다 change 이벤트로
+    {"version", "page_count", "index_map", "undo_count", "redo_count"}를 보낸다.
+    index_map은 이전 페이지 인덱스 → 새 인덱스이며, Undo/Redo나 다른 워커가 저장한 변경처럼
+    매핑을 알 수 없으면 null이다. 문서가 닫히면 closed 이벤트를 보내고 연결을 닫는다.
+    """
+    document = await require_document(file_id, history=True)
+    queue = asyncio.Queue()
+    document_listeners.setdefault(file_id, set()).add(queue)
+
+    async def events():
+        version = document["version"]
+        last_sent = time.monotonic()
+        try:
+            yield f"event: state\ndata: {json.dumps(change_event(document))}\n\n"
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), DOCUMENT_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    # 다른 워커에서 저장했거나 문서가 닫혔는지 확인 (버전만 읽고, 바뀌었을 때만 문서 전체를 읽음)
+                    current_version = await run_in_threadpool(store.get_version, file_id)
+                    if current_version == version:
+                        if time.monotonic() - last_sent > SSE_KEEPALIVE_INTERVAL:
+                            yield ": keepalive\n\n"
+                            last_sent = time.monotonic()
+                        continue
+                    current = None
+                    if current_version is not None:
+                        current = await run_in_threadpool(store.get_document, file_id, True)
+                    if current is None:
+                        yield f"event: closed\ndata: {json.dumps({'file_id': file_id})}\n\n"
+                        return
+                    event = change_event(current)
+                if event["version"] <= version:
+                    continue
+                if event["version"] != version + 1:
+                    # 그 사이 다른 워커의 변경이 있었으면 매핑을 이어 붙일 수 없음
+                    event = {**event, "index_map": None}
+                version = event["version"]
+                yield f"event: change\ndata: {json.dumps(event)}\n\n"
+                last_sent = time.monotonic()
+        finally:
+            listeners = document_listeners.get(file_id)
+            if listeners is not None:
+                listeners.discard(queue)
+                if not listeners:
+                    del document_listeners[file_id]
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 @app.get("/api/pdf/{file_id}/info")
 async def get_pdf_info(file_id: str):
     """PDF 정보 가져오기"""
-    if file_id not in uploaded_files:
-        raise HTTPException(status_code=404, detail="File not found")
-    
-    file_path = uploaded_files[file_id]
-    pdf_reader = pypdf.PdfReader(file_path)
+    document = await require_document(file_id)
     
     return JSONResponse({
-        "page_count": len(pdf_reader.pages),
-        "filename": Path(file_path).name
+        "page_count": len(document["pages"]),
+        "filename": document["filename"],
+        "version": document["version"]
     })
 
-@app.get("/api/pdf/{file_id}/download")
-async def download_pdf(file_id: str):
-    """PDF 파일 다운로드"""
-    if file_id not in uploaded_files:
-        raise HTTPException(status_code=404, detail="File not found")
+@app.get("/api/pdf/{file_id}/manifest")
+async def get_pdf_manifest(request: Request, file_id: str):
+    """페이지별 크기, 회전, 이미지/글자 포함 여부 (뷰어가 PDF를 받기 전에 자리를 잡는 데 사용)
+
+    pages의 각 항목은 fields 순서의 값 배열이며, 폭과 높이는 회전 전 크기(pt)다.
+    편집할 때마다 버전이 바뀌므로 ETag로 바뀌지 않았는지 확인할 수 있다.
+    """
+    document = await require_document(file_id)
+    etag = f'"{file_id}-v{document["version"]}-manifest"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if is_not_modified(request, etag, None):
+        return Response(status_code=304, headers=headers)
     
-    file_path = uploaded_files[file_id]
-    return FileResponse(file_path, media_type="application/pdf", filename=Path(file_path).name)
+    try:
+        return JSONResponse({
+            "version": document["version"],
+            "page_count": len(document["pages"]),
+            "fields": MANIFEST_FIELDS,
+            "pages": await document_manifest(document)
+        }, headers=headers)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
-def save_undo_state(file_id: str):
-    """현재 상태를 Undo 스택에 저장"""
-    if file_id not in uploaded_files:
-        return
+@app.get("/api/pdf/{file_id}/search")
+async def search_pdf(file_id: str, q: str = Query(..., min_length=1), limit: int = Query(50, ge=1)):
+    """문서에서 모든 검색어가 나오는 페이지 찾기
+
+    색인은 원본 파일마다 한 번 만들고 페이지 참조로 현재 페이지 위치를 계산하므로,
+    페이지를 옮기거나 지워도 글자를 다시 뽑지 않는다.
+    hits의 page는 0-based 페이지 인덱스이며 문서 순서로 최대 limit개를 보낸다.
+    """
+    start_time = time.perf_counter()
+    document = await require_document(file_id)
     
-    if file_id not in undo_stacks:
-        undo_stacks[file_id] = []
+    terms = [pdf_worker.normalize_text(match.group()) for match in pdf_worker.TOKEN_PATTERN.finditer(q)]
+    if not terms:
+        raise HTTPException(status_code=400, detail="Query has no searchable words")
     
     try:
-        file_path = uploaded_files[file_id]
-        # 현재 파일을 복사하여 Undo 상태로 저장
-        undo_file = tempfile.NamedTemporaryFile(delete=False, suffix='.pdf', dir=TEMP_DIR)
-        shutil.copy2(file_path, undo_file.name)
-        undo_file.close()
+        found = {}
+        for digest in dict.fromkeys(ref[0] for ref in document["pages"]):
+            await ensure_text_index(digest)
+            found[digest] = search_text_index(load_text_index(digest), terms)
         
-        undo_stacks[file_id].append(undo_file.name)
+        # 같은 원본 페이지가 여러 번 들어 있으면 모든 위치에서 찾음
+        hits = []
+        for position, (digest, page_idx, _) in enumerate(document["pages"]):
+            if page_idx in found[digest]:
+                hits.append((position, digest, page_idx))
         
-        # 최대 개수 제한
-        if len(undo_stacks[file_id]) > MAX_UNDO:
-            old_file = undo_stacks[file_id].pop(0)
-            try:
-                Path(old_file).unlink()
-            except:
-                pass
+        results = []
+        for position, digest, page_idx in hits[:min(limit, SEARCH_MAX_HITS)]:
+            offset, count = found[digest][page_idx]
+            results.append({
+                "page": position,
+                "matches": count,
+                "snippet": make_snippet(load_text_index(digest)["pages"][page_idx], offset)
+            })
+        
+        return JSONResponse({
+            "query": q,
+            "total": len(hits),
+            "hits": results,
+            "version": document["version"],
+            "took_ms": round((time.perf_counter() - start_time) * 1000, 2)
+        })
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"Error saving undo state: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/pdf/{file_id}/download")
+async def download_pdf(request: Request, file_id: str, optimize: bool = False):
+    """PDF 파일 다운로드 (조건부 요청과 범위 요청 지원)
+
+    optimize=true면 중복 객체와 쓰지 않는 객체를 정리하고 객체 스트림으로 압축한 PDF를 보낸다.
+    최적화 전후 크기는 X-Original-Size / X-Optimized-Size 헤더로 알려준다.
+    """
+    document = await require_document(file_id)
+    
+    if not optimize:
+        return await pdf_response(request, file_id, document, filename=document["filename"])
+    
+    optimize_info = {}
+    
+    async def produce():
+        path, result = await optimize_document(file_id, document)
+        optimize_info.update(optimize_headers(result))
+        return path
+    
+    try:
+        return await send_pdf(
+            request,
+            f'"{file_id}-v{document["version"]}-optimized"',
+            document["modified"],
+            produce,
+            filename=document["filename"],
+            extra_headers=optimize_info,
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/pdf/{file_id}/pages")
+async def get_page_range(request: Request, file_id: str, from_page: int = Query(..., alias="from"),
+                         to_page: Optional[int] = Query(None, alias="to")):
+    """지정한 페이지 범위만 담은 PDF (0-based, to 포함, 생략하면 한 페이지)"""
+    pages = (await require_document(file_id))["pages"]
+    if to_page is None:
+        to_page = from_page
+    if not (0 <= from_page <= to_page < len(pages)):
+        raise HTTPException(status_code=400, detail="Invalid page range")
+    
+    # 내용이 같은 범위는 편집 후에도 같은 캐시와 ETag를 사용
+    selected = pages[from_page:to_page + 1]
+
+    async def produce():
+        path, _ = await extract_pages(selected)
+        return path
+
+    try:
+        return await send_pdf(request, f'"{pages_key(selected)}"', None, produce)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/pdf/{file_id}/split")
+async def split_pdf(file_id: str, every: Optional[int] = Query(None, ge=1),
+                    bookmarks: Optional[int] = Query(None, ge=1), ranges: Optional[str] = None):
+    """문서를 여러 PDF로 나눠 ZIP으로 다운로드
+
+    나누는 방법은 하나만 지정한다 (페이지 인덱스는 0-based):
+        every=10: 10페이지씩
+        bookmarks=1: 1단계 책갈피마다 (2면 2단계 책갈피까지)
+        ranges=0-4,5-9: 지정한 범위마다 (끝 포함)
+    조각은 작업 프로세스에서 SPLIT_CONCURRENCY개씩 미리 만들고, 만들어진 순서가 아니라 문서 순서대로
+    ZIP에 넣어 보낸다. 앞 조각은 뒤 조각이 만들어지기 전에 전송되고, 메모리에는 읽고 있는 조각 한 덩어리만 둔다.
+    """
+    document = await require_document(file_id)
+    pages = document["pages"]
+    if [every, bookmarks, ranges].count(None) != 2:
+        raise HTTPException(status_code=400, detail="Specify exactly one of every, bookmarks or ranges")
+    
+    try:
+        if every is not None:
+            parts = [(start, min(start + every, len(pages)) - 1, None) for start in range(0, len(pages), every)]
+        elif bookmarks is not None:
+            parts = await outline_ranges(document, bookmarks)
+        else:
+            parts = [(start, end, None) for start, end in parse_split_ranges(ranges, len(pages))]
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    if len(parts) > SPLIT_MAX_PARTS:
+        raise HTTPException(status_code=413, detail=f"Too many parts (max {SPLIT_MAX_PARTS})")
+    
+    stem = Path(document["filename"]).stem or "document"
+    selections = [pages[start:end + 1] for start, end, _ in parts]
+    names = [part_filename(stem, start, end, title, i) for i, (start, end, title) in enumerate(parts)]
+
+    async def stream():
+        output = ZipStream()
+        tasks = {}
+
+        def schedule(index: int):
+            if index < len(selections):
+                tasks[index] = asyncio.create_task(extract_pages(selections[index]))
+
+        try:
+            for index in range(SPLIT_CONCURRENCY):
+                schedule(index)
+            # PDF는 이미 압축되어 있으므로 다시 압축하지 않고 저장
+            with zipfile.ZipFile(output, "w", zipfile.ZIP_STORED) as archive:
+                for index, name in enumerate(names):
+                    path, _ = await tasks.pop(index)
+                    schedule(index + SPLIT_CONCURRENCY)
+                    try:
+                        part_file = open(path, "rb")
+                    except FileNotFoundError:
+                        # 기다리는 동안 캐시에서 밀려났으면 다시 만듦
+                        path, _ = await extract_pages(selections[index])
+                        part_file = open(path, "rb")
+                    with part_file:
+                        size = os.fstat(part_file.fileno()).st_size
+                        info = zipfile.ZipInfo(name, time.localtime()[:6])
+                        with archive.open(info, "w", force_zip64=size >= zipfile.ZIP64_LIMIT) as entry:
+                            while chunk := await run_in_threadpool(part_file.read, UPLOAD_CHUNK_SIZE):
+                                entry.write(chunk)
+                                yield output.take()
+            # 중앙 디렉토리
+            yield output.take()
+        finally:
+            # 클라이언트가 연결을 끊었으면 남은 조각 작업 취소
+            for task in tasks.values():
+                task.cancel()
+
+    return StreamingResponse(
+        stream(),
+        media_type="application/zip",
+        headers={"Content-Disposition": f"attachment; filename*=utf-8''{quote(stem + '.zip')}"},
+    )
+
+def history_delta(before: list, after: list) -> dict:
+    """before → after 변경을 가운데 바뀐 구간 하나로 표현한 편집 기록
+
+    {"start": 바뀐 구간의 시작 위치, "removed": before에서 빠진 참조 목록,
+     "added": after에 들어간 참조 목록 (removed에 있던 참조면 removed의 인덱스)}
+    앞뒤로 같은 페이지는 저장하지 않으므로 삭제, 회전, 삽입, 가까운 이동은 문서 크기와 무관하게 작고,
+    순서만 바꾼 구간은 참조 대신 정수 인덱스만 남는다.
+    """
+    limit = min(len(before), len(after))
+    start = 0
+    while start < limit and before[start] == after[start]:
+        start += 1
+    end = 0
+    while end < limit - start and before[-1 - end] == after[-1 - end]:
+        end += 1
+
+    removed = before[start:len(before) - end]
+    positions = {}
+    for index, ref in enumerate(removed):
+        positions.setdefault(tuple(ref), index)
+    added = [positions.get(tuple(ref), ref) for ref in after[start:len(after) - end]]
+    return {"start": start, "removed": removed, "added": added}
+
+def save_undo_state(document: dict, before: list, after: list):
+    """편집 기록을 Undo 스택에 저장 (새 편집이 생기면 Redo 기록은 폐기)"""
+    # 전후 참조 목록 대신 바뀐 구간만 저장하므로 파일 크기와도, 대부분은 페이지 수와도 무관하게 가볍다
+    document["undo"].append(history_delta(before, after))
+    document["redo"] = []
+    
+    # 최대 개수 제한
+    if len(document["undo"]) > MAX_UNDO:
+        document["undo"].pop(0)
+
+@app.get("/api/pdf/{file_id}/pages/{page_num}/thumbnail")
+async def get_page_thumbnail(request: Request, file_id: str, page_num: int,
+                             width: int = THUMBNAIL_DEFAULT_WIDTH, format: str = "png"):
+    """페이지 썸네일 이미지 (0-based 페이지 번호)"""
+    pages = (await require_document(file_id))["pages"]
+    
+    if not HAS_PYMUPDF:
+        raise HTTPException(status_code=501, detail="Thumbnail rendering requires PyMuPDF")
+    
+    if not (0 <= page_num < len(pages)):
+        raise HTTPException(status_code=404, detail="Page not found")
+    if not (1 <= width <= THUMBNAIL_MAX_WIDTH):
+        raise HTTPException(status_code=400, detail=f"width must be between 1 and {THUMBNAIL_MAX_WIDTH}")
+    if format not in THUMBNAIL_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(THUMBNAIL_FORMATS)}")
+    
+    ref = pages[page_num]
+    etag = f'"{thumbnail_key(ref, width, format)}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    
+    # 같은 내용이면 이미지를 다시 보내지 않음
+    if etag in [tag.strip() for tag in request.headers.get("if-none-match", "").split(",")]:
+        return Response(status_code=304, headers=headers)
+    
+    try:
+        path, _ = await get_thumbnail(ref, width, format)
+        return FileResponse(path, media_type=THUMBNAIL_FORMATS[format], headers=headers)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/api/pdf/{file_id}/pages/reorder")
 async def reorder_pages(file_id: str, reorder_data: dict):
-    """페이지 순서 변경"""
-    if file_id not in uploaded_files:
-        raise HTTPException(status_code=404, detail="File not found")
+    """페이지 순서 변경 (한 번의 편집으로 적용하고 이전 인덱스 → 새 인덱스 매핑 반환)
+
+    요청 형식 (인덱스는 모두 0-based):
+        {"from": 0, "to": 5}: 두 페이지 맞바꾸기
+        {"order": [2, 0, 1, ...]}: 새 순서의 각 위치에 올 이전 페이지 인덱스 (전체 순열)
+        {"pages": [3, 7, 8], "before": 1}: 선택한 페이지들을 1번 페이지 앞으로 옮기기 (페이지 수면 맨 끝)
+    """
+    await require_document(file_id)
+    
+    if "order" in reorder_data:
+        operation = {"op": "permute", "order": reorder_data["order"]}
+    elif "pages" in reorder_data:
+        operation = {"op": "move_pages", "pages": reorder_data["pages"], "before": reorder_data.get("before")}
+    else:
+        operation = {"op": "swap", "from": reorder_data.get("from"), "to": reorder_data.get("to")}
     
     try:
-        # Undo 상태 저장
-        save_undo_state(file_id)
-        
-        file_path = uploaded_files[file_id]
-        pdf_reader = pypdf.PdfReader(file_path)
-        pdf_writer = pypdf.PdfWriter()
-        
-        from_idx = reorder_data.get("from")
-        to_idx = reorder_data.get("to")
+        # 페이지 참조 순서만 변경
+        result = await submit_edit(file_id, lambda document: edit_document(file_id, document, [operation]))
         
-        # 페이지 순서 배열 생성
-        pages = list(range(len(pdf_reader.pages)))
-        pages[from_idx], pages[to_idx] = pages[to_idx], pages[from_idx]
-        
-        # 새로운 순서로 페이지 추가
-        for page_num in pages:
-            pdf_writer.add_page(pdf_reader.pages[page_num])
-        
-        # 임시 파일에 저장
-        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.pdf', dir=TEMP_DIR)
-        pdf_writer.write(temp_file)
-        temp_file.close()
-        
-        # 원본 파일 교체
-        shutil.move(temp_file.name, file_path)
-        
-        return JSONResponse({"status": "success"})
+        return JSONResponse({
+            "status": "success",
+            "page_count": result["page_count"],
+            "index_map": result["index_map"],
+            "version": result["version"]
+        })
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/api/pdf/{file_id}/pages/add-range")
 async def add_pages_range(file_id: str, add_data: dict):
     """다른 PDF에서 특정 페이지 범위 추가"""
-    if file_id not in uploaded_files:
-        raise HTTPException(status_code=404, detail="File not found")
+    await require_document(file_id)
     
     source_file_id = add_data.get("source_file_id")
-    if source_file_id not in uploaded_files:
+    source = await run_in_threadpool(store.get_document, source_file_id) if isinstance(source_file_id, str) else None
+    if source is None:
         raise HTTPException(status_code=404, detail="Source file not found")
     
     pages = add_data.get("pages", [])  # 0-based index list
     insert_position = add_data.get("insert_position", 0)
     
     try:
-        # Undo 상태 저장
-        save_undo_state(file_id)
-        
-        file_path = uploaded_files[file_id]
-        source_path = uploaded_files[source_file_id]
-        
-        pdf_reader = pypdf.PdfReader(file_path)
-        source_reader = pypdf.PdfReader(source_path)
-        pdf_writer = pypdf.PdfWriter()
-        
-        # 기존 페이지 추가 (insert_position 전까지)
-        for i in range(insert_position):
-            pdf_writer.add_page(pdf_reader.pages[i])
-        
-        # 새 페이지 추가
+        if not isinstance(pages, list):
+            raise ValueError("'pages' must be a list of page indices")
+        # 범위를 벗어난 페이지는 건너뜀 (정수가 아닌 값은 400)
+        source_pages = source["pages"]
+        valid_pages = []
         for page_idx in pages:
-            if 0 <= page_idx < len(source_reader.pages):
-                pdf_writer.add_page(source_reader.pages[page_idx])
-        
-        # 나머지 기존 페이지 추가
-        for i in range(insert_position, len(pdf_reader.pages)):
-            pdf_writer.add_page(pdf_reader.pages[i])
+            if not isinstance(page_idx, int) or isinstance(page_idx, bool):
+                raise ValueError(f"Invalid page index for 'pages': {page_idx!r}")
+            if 0 <= page_idx < len(source_pages):
+                valid_pages.append(page_idx)
+        operation = {
+            "op": "insert",
+            "source_file_id": source_file_id,
+            "pages": valid_pages,
+            "position": insert_position,
+        }
         
-        # 임시 파일에 저장
-        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.pdf', dir=TEMP_DIR)
-        pdf_writer.write(temp_file)
-        temp_file.close()
+        result = await submit_edit(file_id, lambda document: edit_document(file_id, document, [operation]))
         
-        # 원본 파일 교체
-        shutil.move(temp_file.name, file_path)
+        return JSONResponse({
+            "status": "success",
+            "page_count": result["page_count"],
+            "version": result["version"]
+        })
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/api/pdf/{file_id}/batch")
+async def batch_edit(file_id: str, batch_data: dict):
+    """여러 페이지 작업을 한 번에 적용
+
+    operations 예시:
+        {"op": "move", "from": 0, "to": 5}
+        {"op": "swap", "from": 1, "to": 2}
+        {"op": "permute", "order": [2, 0, 1, ...]}
+        {"op": "move_pages", "pages": [3, 7, 8], "before": 1}
+        {"op": "delete", "page": 3}
+        {"op": "insert", "source_file_id": "...", "pages": [0, 1], "position": 0}
+        {"op": "rotate", "page": 0, "angle": 90}
+    """
+    await require_document(file_id)
+    
+    operations = batch_data.get("operations")
+    if not isinstance(operations, list) or not all(isinstance(op, dict) for op in operations):
+        raise HTTPException(status_code=400, detail="operations must be a list of objects")
+    
+    try:
+        # 전체 작업을 참조 목록에 적용한 뒤 Undo 상태는 한 번만 저장
+        result = await submit_edit(file_id, lambda document: edit_document(file_id, document, operations))
         
         return JSONResponse({
             "status": "success",
-            "page_count": len(pdf_writer.pages)
+            "page_count": result["page_count"],
+            "index_map": result["index_map"],
+            "version": result["version"]
         })
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/api/pdf/{file_id}/undo")
 async def undo_last_action(file_id: str):
     """마지막 작업 되돌리기"""
-    if file_id not in uploaded_files:
-        raise HTTPException(status_code=404, detail="File not found")
-    
-    if file_id not in undo_stacks or len(undo_stacks[file_id]) == 0:
-        raise HTTPException(status_code=400, detail="No undo history available")
+    await require_document(file_id)
     
     try:
-        # 마지막 Undo 상태 가져오기
-        undo_file = undo_stacks[file_id].pop()
-        file_path = uploaded_files[file_id]
-        
-        # 현재 파일을 Undo 상태로 복원
-        shutil.copy2(undo_file, file_path)
+        # 마지막 편집 이전의 페이지 참조 목록으로 복원
+        result = await submit_edit(file_id, undo_document)
         
-        # Undo 파일 삭제
-        try:
-            Path(undo_file).unlink()
-        except:
-            pass
-        
-        # PDF 정보 가져오기
-        pdf_reader = pypdf.PdfReader(file_path)
-        page_count = len(pdf_reader.pages)
+        return JSONResponse({
+            "status": "success",
+            "page_count": result["page_count"],
+            "version": result["version"]
+        })
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/api/pdf/{file_id}/redo")
+async def redo_last_action(file_id: str):
+    """되돌린 작업 다시 실행"""
+    await require_document(file_id)
+    
+    try:
+        # 되돌렸던 편집 이후의 페이지 참조 목록으로 복원
+        result = await submit_edit(file_id, redo_document)
         
         return JSONResponse({
             "status": "success",
-            "page_count": page_count
+            "page_count": result["page_count"],
+            "version": result["version"]
         })
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/pdf/{file_id}/undo/status")
 async def get_undo_status(file_id: str):
-    """Undo 가능 여부 확인"""
-    if file_id not in uploaded_files:
-        raise HTTPException(status_code=404, detail="File not found")
+    """Undo/Redo 가능 여부 확인"""
+    document = await require_document(file_id, history=True)
     
-    can_undo = file_id in undo_stacks and len(undo_stacks[file_id]) > 0
+    undo_count = len(document["undo"])
+    redo_count = len(document["redo"])
     
     return JSONResponse({
-        "can_undo": can_undo,
-        "undo_count": len(undo_stacks.get(file_id, []))
+        "can_undo": undo_count > 0,
+        "undo_count": undo_count,
+        "can_redo": redo_count > 0,
+        "redo_count": redo_count,
+        "history_bytes": history_bytes(document),
+        "version": document["version"]
     })
 
 @app.delete("/api/pdf/{file_id}/pages/{page_num}")
 async def delete_page(file_id: str, page_num: int):
     """페이지 삭제"""
-    if file_id not in uploaded_files:
-        raise HTTPException(status_code=404, detail="File not found")
+    await require_document(file_id)
+    
+    operation = {"op": "delete", "page": page_num}
     
     try:
-        # Undo 상태 저장
-        save_undo_state(file_id)
+        # 해당 페이지 참조만 제외
+        result = await submit_edit(file_id, lambda document: edit_document(file_id, document, [operation]))
         
-        file_path = uploaded_files[file_id]
-        pdf_reader = pypdf.PdfReader(file_path)
-        pdf_writer = pypdf.PdfWriter()
-        
-        # 해당 페이지 제외하고 추가
-        for i, page in enumerate(pdf_reader.pages):
-            if i != page_num:
-                pdf_writer.add_page(page)
-        
-        # 임시 파일에 저장
-        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.pdf', dir=TEMP_DIR)
-        pdf_writer.write(temp_file)
-        temp_file.close()
-        
-        # 원본 파일 교체
-        shutil.move(temp_file.name, file_path)
-        
-        return JSONResponse({"status": "success", "page_count": len(pdf_writer.pages)})
+        return JSONResponse({
+            "status": "success",
+            "page_count": result["page_count"],
+            "version": result["version"]
+        })
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/api/jobs", status_code=202)
+async def create_job(job_data: dict):
+    """오래 걸리는 작업을 백그라운드 작업으로 등록하고 작업 ID 반환
+
+    종류:
+        {"kind": "export", "file_id": "...", "optimize": false}
+            문서를 PDF로 만듦 (optimize면 크기를 줄인 PDF)
+        {"kind": "merge", "file_ids": ["...", "..."], "filename": "merged.pdf", "optimize": false}
+            열려 있는 문서들을 순서대로 이어 붙인 새 문서를 만들고 PDF로 만듦
+    진행률은 /api/jobs/{job_id}/events(Server-Sent Events), 결과 PDF는 /api/jobs/{job_id}/result로 받는다.
+    """
+    kind = job_data.get("kind")
+    optimize = bool(job_data.get("optimize", False))
+    if kind == "export":
+        file_id = job_data.get("file_id")
+        if not isinstance(file_id, str):
+            raise HTTPException(status_code=400, detail="file_id is required")
+        await require_document(file_id)
+        params = {"file_id": file_id, "optimize": optimize}
+    elif kind == "merge":
+        file_ids = job_data.get("file_ids")
+        if not isinstance(file_ids, list) or not file_ids or not all(isinstance(i, str) for i in file_ids):
+            raise HTTPException(status_code=400, detail="file_ids must be a non-empty list")
+        for source_id in file_ids:
+            await require_document(source_id)
+        filename = job_data.get("filename") or "merged.pdf"
+        params = {"file_ids": file_ids, "filename": str(filename), "optimize": optimize}
+    else:
+        raise HTTPException(status_code=400, detail=f"Unknown job kind: {kind}")
+
+    job = {
+        "job_id": uuid.uuid4().hex,
+        "kind": kind,
+        "params": params,
+        "status": "queued",
+        "step": None,
+        "done": 0,
+        "total": None,
+        "created": time.time(),
+        "started": None,
+        "finished": None,
+        "error": None,
+        "result": None,
+    }
+    write_job(job)
+    job_tasks[job["job_id"]] = asyncio.create_task(run_background_job(job))
+    return JSONResponse({"job_id": job["job_id"], "status": job["status"]}, status_code=202)
+
+@app.get("/api/jobs/{job_id}")
+async def get_job(job_id: str):
+    """작업 상태와 진행률 (현재 단계 step에서 처리한 페이지 수 done / 전체 total)"""
+    return JSONResponse(public_job(require_job(job_id)))
+
+@app.get("/api/jobs/{job_id}/events")
+async def get_job_events(job_id: str):
+    """작업 진행률을 Server-Sent Events로 전송
+
+    상태가 바뀔 때마다 progress 이벤트를 보내고, 끝나면 done / failed / cancelled 이벤트를 보낸 뒤 연결을 닫는다.
+    """
+    require_job(job_id)
+
+    async def events():
+        last = None
+        last_sent = time.monotonic()
+        while True:
+            job = read_job(job_id)
+            if job is None:
+                yield f"event: failed\ndata: {json.dumps({'job_id': job_id, 'error': 'Job not found'})}\n\n"
+                return
+            payload = public_job(job)
+            finished = job["status"] in JOB_FINISHED
+            if payload != last:
+                event = job["status"] if finished else "progress"
+                yield f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+                last = payload
+                last_sent = time.monotonic()
+            elif time.monotonic() - last_sent > SSE_KEEPALIVE_INTERVAL:
+                yield ": keepalive\n\n"
+                last_sent = time.monotonic()
+            if finished:
+                return
+            await asyncio.sleep(JOB_POLL_INTERVAL)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.get("/api/jobs/{job_id}/result")
+async def get_job_result(job_id: str):
+    """끝난 작업의 결과 PDF 다운로드 (아직 끝나지 않았으면 409, 결과가 정리되었으면 410)"""
+    job = require_job(job_id)
+    if job["status"] != "done":
+        raise HTTPException(status_code=409, detail=f"Job is {job['status']}")
+
+    # 결과가 문서의 이전 버전 파일이면 다음 버전을 저장할 때 끝에 덧붙을 수 있으므로 연 시점의 크기만큼만 보냄
+    try:
+        f = open(job["result"]["path"], "rb")
+    except FileNotFoundError:
+        raise HTTPException(status_code=410, detail="Job result expired, please resubmit")
+    size = os.fstat(f.fileno()).st_size
+    return StreamingResponse(
+        iter_file_range(f, 0, size - 1),
+        media_type="application/pdf",
+        headers={
+            "Content-Length": str(size),
+            "Content-Disposition": f"attachment; filename*=utf-8''{quote(job['result']['filename'])}",
+        },
+    )
+
+@app.delete("/api/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    """작업 취소
+
+    실행 중인 작업은 작업 프로세스가 다음 페이지를 처리하기 전에 멈추고, 대기 중인 작업은 바로 취소된다.
+    """
+    job = require_job(job_id)
+    if job["status"] in JOB_FINISHED:
+        return JSONResponse(public_job(job))
+
+    job_file(job_id, ".cancel").touch()
+    task = job_tasks.get(job_id)
+    if task is not None and job["status"] == "queued":
+        task.cancel()
+    return JSONResponse({"job_id": job_id, "status": "cancelling"}, status_code=202)
+
+@app.get("/api/usage")
+async def get_usage():
+    """문서 수와 임시 디렉토리 사용량"""
+    counts = await run_in_threadpool(store.count)
+    return JSONResponse({
+        "sessions": counts["documents"],
+        "blobs": counts["blobs"],
+        "disk": await run_in_threadpool(disk_usage),
+        "disk_quota_bytes": DISK_QUOTA_BYTES,
+        "session_quota_bytes": SESSION_QUOTA_BYTES,
+        "session_ttl": SESSION_TTL
+    })
+
+@app.on_event("startup")
+async def start_janitor():
+    """임시 파일 정리 작업 시작, 작업 프로세스 미리 띄우기"""
+    global janitor_task, warmup_task
+    janitor_task = asyncio.create_task(janitor_loop())
+    if PDF_WARMUP:
+        # 첫 요청을 막지 않도록 백그라운드에서 실행
+        warmup_task = asyncio.create_task(warm_up_executor())
+
+@app.on_event("shutdown")
+def shutdown_executor():
+    """서버 종료 시 정리 작업과 작업 프로세스 정리"""
+    if janitor_task is not None:
+        janitor_task.cancel()
+    if warmup_task is not None:
+        warmup_task.cancel()
+    for task in job_tasks.values():
+        task.cancel()
+    if pdf_executor is not None:
+        pdf_executor.shutdown(wait=False, cancel_futures=True)
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
-
@@ -0,0 +1,448 @@
+"""웹 API 벤치마크
+
+합성 PDF를 만들어 app.py의 ASGI 앱을 같은 프로세스 안에서 직접 호출하고,
+작업별 지연 시간(p50/p95), 최대 RSS, 디스크에 쓴 바이트 수를 JSON으로 출력한다.
+
+    python benchmarks/bench_api.py --output bench.json
+    python benchmarks/bench_api.py --quick --baseline bench.json
+
+--baseline을 주면 같은 작업의 p95를 비교해 --threshold 이상 느려진 항목을 표시하고 종료 코드 1을 반환한다.
+필요한 패키지: requirements-web.txt + httpx
+"""
+from pathlib import Path
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import httpx
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_DIR))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from synthetic import KINDS, make_pdf
+
+# 기본 측정 대상 {종류: [페이지 수]} (이미지 문서는 페이지당 100KB 정도라 작게 잡음)
+DEFAULT_MATRIX = {"text": [1, 100, 1000, 5000], "images": [1, 100, 500], "fonts": [1, 100, 1000]}
+QUICK_MATRIX = {"text": [1, 100], "images": [1, 20], "fonts": [1, 100]}
+
+# ---------------------------------------------------------------------------
+# 프로세스 자원 측정 (Linux /proc, 읽을 수 없으면 0)
+
+def process_ids() -> list:
+    """현재 프로세스와 PDF 작업 프로세스 pid 목록"""
+    return [os.getpid()] + [child.pid for child in multiprocessing.active_children()]
+
+def read_rss(pid: int) -> int:
+    try:
+        with open(f"/proc/{pid}/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return 0
+
+def read_written(pid: int) -> int:
+    """프로세스가 write 계열 호출로 쓴 누적 바이트 수"""
+    try:
+        with open(f"/proc/{pid}/io") as f:
+            for line in f:
+                if line.startswith("wchar:"):
+                    return int(line.split()[1])
+    except (OSError, ValueError):
+        pass
+    return 0
+
+def total_written() -> dict:
+    return {pid: read_written(pid) for pid in process_ids()}
+
+class RssSampler:
+    """작업하는 동안 서버 프로세스 + 작업 프로세스 RSS 합계의 최댓값을 기록"""
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def sample(self):
+        self.peak = max(self.peak, sum(read_rss(pid) for pid in process_ids()))
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+    def __enter__(self):
+        self.peak = 0
+        self.sample()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.sample()
+
+def percentile(samples: list, q: float) -> float:
+    """가장 가까운 순위 방식 백분위수"""
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, round(q / 100 * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+# ---------------------------------------------------------------------------
+# 작업 정의
+#
+# 각 작업은 (이름, 준비 함수, 측정 함수)이며 준비 함수는 시간 측정에서 빠진다.
+# ctx: {"client", "file_id", "pages", "last_page", "source_id", "pdf_bytes", "source_bytes", "uploads", "created"}
+
+def unique_pdf(ctx, pdf_bytes: bytes) -> bytes:
+    """PDF 끝에 매번 다른 주석 한 줄을 붙인 내용
+
+    서버는 같은 내용을 다시 받으면 저장된 원본을 재사용하므로, 그대로 올리면 중복 제거 경로만 측정된다.
+    """
+    ctx["uploads"] += 1
+    return pdf_bytes + f"\n% bench upload {ctx['uploads']}\n".encode()
+
+async def upload_file(ctx, pdf_bytes: bytes):
+    files = {"file": ("bench.pdf", pdf_bytes, "application/pdf")}
+    response = await ctx["client"].post("/api/upload", files=files)
+    # 측정마다 새 문서가 생기므로 측정이 끝나면 닫음
+    ctx["created"].append(response.json()["file_id"])
+    return response
+
+async def upload(ctx):
+    return await upload_file(ctx, unique_pdf(ctx, ctx["pdf_bytes"]))
+
+async def upload_duplicate(ctx):
+    """이미 열려 있는 문서와 같은 내용 업로드 (원본 재사용)"""
+    return await upload_file(ctx, ctx["pdf_bytes"])
+
+async def merge(ctx):
+    files = [("files", (f"part{i}.pdf", unique_pdf(ctx, ctx["pdf_bytes"]), "application/pdf"))
+             for i in range(3)]
+    response = await ctx["client"].post("/api/merge", files=files, data={"filename": "bench-merged.pdf"})
+    ctx["created"].append(response.json()["file_id"])
+    return response
+
+async def insert_unique_page(ctx):
+    """새로 올린 작은 PDF의 첫 페이지를 맨 앞에 끼움 (준비 단계용)
+
+    부분 추출, 최적화 결과는 페이지 구성으로 캐시하므로 매번 처음 보는 구성을 만들어야 캐시에 걸리지 않는다.
+    맨 앞에 끼우면 나머지 페이지의 위치가 모두 밀려 split의 모든 조각도 새 구성이 된다.
+    """
+    response = await upload_file(ctx, unique_pdf(ctx, ctx["source_bytes"]))
+    await ctx["client"].post(
+        f"/api/pdf/{ctx['file_id']}/pages/add-range",
+        json={"source_file_id": response.json()["file_id"], "pages": [0], "insert_position": 0},
+    )
+
+async def edit(ctx):
+    """다운로드할 때 PDF를 새로 만들도록 문서를 편집하고, 측정이 끝나면 되돌림 (준비 단계용)
+
+    split은 조각마다 캐시하므로 앞에 페이지를 끼워도 이전 실행과 같은 조각은 캐시에서 꺼낸다.
+    그래서 부분 추출, 최적화 캐시도 비운다.
+    """
+    import app as web_app
+
+    await insert_unique_page(ctx)
+    web_app.extract_cache.shrink(0)
+    web_app.optimized_cache.shrink(0)
+    ctx["after"] = undo
+
+def get(path: str):
+    async def run(ctx):
+        return await ctx["client"].get(path.format(**ctx))
+    return run
+
+def post(path: str, body):
+    async def run(ctx):
+        data = body(ctx) if callable(body) else body
+        return await ctx["client"].post(path.format(**ctx), json=data)
+    return run
+
+async def undo(ctx):
+    await ctx["client"].post(f"/api/pdf/{ctx['file_id']}/undo")
+
+def then_undo(run):
+    """측정이 끝나면 (측정 밖에서) 되돌려 다음 측정도 같은 페이지 수로 시작"""
+    async def wrapped(ctx):
+        response = await run(ctx)
+        ctx["after"] = undo
+        return response
+    return wrapped
+
+async def delete_last_page(ctx):
+    return await ctx["client"].delete(f"/api/pdf/{ctx['file_id']}/pages/{ctx['last_page']}")
+
+async def export_job(ctx):
+    """내보내기 작업을 등록하고 끝날 때까지 상태를 확인한 뒤 결과 PDF 다운로드"""
+    client = ctx["client"]
+    response = await client.post("/api/jobs", json={"kind": "export", "file_id": ctx["file_id"]})
+    if response.status_code >= 400:
+        return response
+    job_id = response.json()["job_id"]
+    while True:
+        response = await client.get(f"/api/jobs/{job_id}")
+        if response.status_code >= 400 or response.json()["status"] in ("done", "failed", "cancelled"):
+            break
+        await asyncio.sleep(0.005)
+    if response.status_code >= 400 or response.json()["status"] != "done":
+        return httpx.Response(500, request=response.request)
+    return await client.get(f"/api/jobs/{job_id}/result")
+
+OPERATIONS = [
+    ("index", None, get("/")),
+    ("upload", None, upload),
+    ("upload_duplicate", None, upload_duplicate),
+    ("merge_3", None, merge),
+    ("info", None, get("/api/pdf/{file_id}/info")),
+    ("get_pdf_cached", None, get("/api/pdf/{file_id}")),
+    ("download_after_edit", edit, get("/api/pdf/{file_id}/download")),
+    ("download_optimized", edit, get("/api/pdf/{file_id}/download?optimize=true")),
+    ("page_range", edit, get("/api/pdf/{file_id}/pages?from=0&to={last_page}")),
+    ("split", edit, get("/api/pdf/{file_id}/split?every=10")),
+    ("export_job", edit, export_job),
+    ("manifest", None, get("/api/pdf/{file_id}/manifest")),
+    ("search", None, get("/api/pdf/{file_id}/search?q=page")),
+    # 끼운 페이지 바로 뒤의 원래 첫 페이지
+    ("thumbnail_cold", edit, get("/api/pdf/{file_id}/pages/1/thumbnail?width={thumb_width}")),
+    ("thumbnail_cached", None, get("/api/pdf/{file_id}/pages/0/thumbnail?width=120")),
+    ("reorder", None, post("/api/pdf/{file_id}/pages/reorder", lambda ctx: {"from": 0, "to": ctx["last_page"]})),
+    ("reorder_order", None, then_undo(post(
+        "/api/pdf/{file_id}/pages/reorder", lambda ctx: {"order": list(reversed(range(ctx["pages"])))},
+    ))),
+    ("reorder_pages", None, then_undo(post(
+        "/api/pdf/{file_id}/pages/reorder",
+        lambda ctx: {"pages": list(range(ctx["pages"] // 2, ctx["pages"])), "before": 0},
+    ))),
+    ("batch_rotate", None, post("/api/pdf/{file_id}/batch", {"operations": [{"op": "rotate", "page": 0, "angle": 90}]})),
+    ("add_range", None, then_undo(post(
+        "/api/pdf/{file_id}/pages/add-range",
+        lambda ctx: {"source_file_id": ctx["source_id"], "pages": [0], "insert_position": 0},
+    ))),
+    ("delete_page", None, then_undo(delete_last_page)),
+    ("undo", insert_unique_page, post("/api/pdf/{file_id}/undo", None)),
+    ("redo", undo, post("/api/pdf/{file_id}/redo", None)),
+    ("undo_status", None, get("/api/pdf/{file_id}/undo/status")),
+    ("usage", None, get("/api/usage")),
+    ("metrics", None, get("/metrics")),
+]
+
+# ---------------------------------------------------------------------------
+# 실행
+
+def cache_hits() -> int:
+    """서버 결과 캐시(실체화, 썸네일, 부분 추출, 최적화)의 적중 수 합계"""
+    import app as web_app
+
+    return sum(web_app.cache_requests.value(cache=name, result="hit")
+               for name in ("materialized", "thumbnail", "extract", "optimized"))
+
+async def measure(ctx, setup, run, repeat: int) -> dict:
+    """작업을 repeat번 실행해 지연 시간 백분위수, 최대 RSS, 실행당 쓴 바이트 수, 캐시 적중 수 집계
+
+    캐시를 거치지 않는다고 가정한 작업의 cache_hits가 0이 아니면 캐시 조회 시간을 잰 것이다.
+    """
+    latencies = []
+    written = 0
+    hits = 0
+    peak_rss = 0
+    errors = 0
+    for i in range(repeat):
+        if setup is not None:
+            await setup(ctx)
+        ctx["thumb_width"] = 200 + i  # 같은 크기 썸네일은 캐시되므로 매번 다른 폭
+        before = total_written()
+        hits_before = cache_hits()
+        with RssSampler() as sampler:
+            start = time.perf_counter()
+            response = await run(ctx)
+            elapsed = time.perf_counter() - start
+        hits += cache_hits() - hits_before
+        after = total_written()
+        written += sum(after[pid] - before.get(pid, 0) for pid in after)
+        peak_rss = max(peak_rss, sampler.peak)
+        if response.status_code >= 400:
+            errors += 1
+        latencies.append(elapsed)
+
+        if ctx.get("after"):
+            await ctx.pop("after")(ctx)
+        for file_id in ctx["created"]:
+            await ctx["client"].delete(f"/api/pdf/{file_id}")
+        ctx["created"].clear()
+
+    return {
+        "runs": repeat,
+        "errors": errors,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 3),
+        "peak_rss_bytes": peak_rss,
+        "bytes_written": written // repeat,
+        "cache_hits": int(hits),
+    }
+
+async def bench_document(client, pdf_path: Path, pages: int, source_bytes: bytes, repeat: int,
+                         only: set) -> dict:
+    pdf_bytes = pdf_path.read_bytes()
+    response = await client.post("/api/upload", files={"file": ("bench.pdf", pdf_bytes, "application/pdf")})
+    response.raise_for_status()
+    file_id = response.json()["file_id"]
+    response = await client.post("/api/upload", files={"file": ("source.pdf", source_bytes, "application/pdf")})
+    source_id = response.json()["file_id"]
+
+    ctx = {
+        "client": client,
+        "file_id": file_id,
+        "pages": pages,
+        "last_page": pages - 1,
+        "source_id": source_id,
+        "pdf_bytes": pdf_bytes,
+        "source_bytes": source_bytes,
+        "uploads": 0,
+        "created": [],
+    }
+    results = {}
+    for name, setup, run in OPERATIONS:
+        if only and name not in only:
+            continue
+        results[name] = await measure(ctx, setup, run, repeat)
+
+    await client.delete(f"/api/pdf/{file_id}")
+    await client.delete(f"/api/pdf/{source_id}")
+    return results
+
+async def run_benchmarks(matrix: dict, repeat: int, only: set, pdf_dir: Path) -> dict:
+    import app as web_app
+
+    results = {}
+    transport = httpx.ASGITransport(app=web_app.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        source_path = pdf_dir / "source-text-3.pdf"
+        make_pdf(source_path, "text", 3)
+        source_bytes = source_path.read_bytes()
+
+        for kind, page_counts in matrix.items():
+            for pages in page_counts:
+                pdf_path = pdf_dir / f"{kind}-{pages}.pdf"
+                start = time.perf_counter()
+                size = make_pdf(pdf_path, kind, pages)
+                print(f"[{kind}-{pages}] generated {size:,} bytes in {time.perf_counter() - start:.1f}s",
+                      file=sys.stderr)
+                document_results = await bench_document(client, pdf_path, pages, source_bytes, repeat, only)
+                for name, result in document_results.items():
+                    results[f"{kind}-{pages}/{name}"] = {**result, "pdf_bytes": size}
+                    print(f"  {name:22s} p50 {result['p50_ms']:9.2f} ms  p95 {result['p95_ms']:9.2f} ms  "
+                          f"cache hits {result['cache_hits']}", file=sys.stderr)
+                pdf_path.unlink()
+
+    web_app.shutdown_executor()
+    return results
+
+def compare(results: dict, baseline: dict, threshold: float, min_ms: float) -> list:
+    """기준 결과보다 p95가 threshold 비율 이상 (그리고 min_ms 이상) 느려진 항목 목록"""
+    regressions = []
+    for key, result in sorted(results.items()):
+        base = baseline.get(key)
+        if base is None:
+            continue
+        ratio = result["p95_ms"] / base["p95_ms"] if base["p95_ms"] else float("inf")
+        if ratio > 1 + threshold and result["p95_ms"] - base["p95_ms"] > min_ms:
+            regressions.append({"name": key, "baseline_p95_ms": base["p95_ms"],
+                                "p95_ms": result["p95_ms"], "ratio": round(ratio, 3)})
+    return regressions
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def parse_matrix(values: list) -> dict:
+    """["text:1,100", "images:10"] → {"text": [1, 100], "images": [10]}"""
+    matrix = {}
+    for value in values:
+        kind, _, counts = value.partition(":")
+        if kind not in KINDS or not counts:
+            raise argparse.ArgumentTypeError(f"invalid --doc {value!r}, expected KIND:PAGES[,PAGES] with KIND in {KINDS}")
+        matrix[kind] = [int(count) for count in counts.split(",")]
+    return matrix
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="PDF editor web API benchmark")
+    parser.add_argument("--doc", action="append", default=[],
+                        help="document set as KIND:PAGES[,PAGES] (repeatable, default: full matrix)")
+    parser.add_argument("--quick", action="store_true", help="small documents only")
+    parser.add_argument("--repeat", type=int, default=20, help="runs per operation")
+    parser.add_argument("--only", action="append", default=[], help="run only these operations")
+    parser.add_argument("--output", help="write JSON results to this file (default: stdout)")
+    parser.add_argument("--baseline", help="JSON results to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed p95 slowdown ratio (default 0.2 = 20%%)")
+    parser.add_argument("--min-ms", type=float, default=1.0, help="ignore slowdowns smaller than this (ms)")
+    args = parser.parse_args()
+
+    matrix = parse_matrix(args.doc) if args.doc else (QUICK_MATRIX if args.quick else DEFAULT_MATRIX)
+    output = Path(args.output).resolve() if args.output else None
+    baseline_path = Path(args.baseline).resolve() if args.baseline else None
+
+    # 저장소를 건드리지 않도록 임시 작업 디렉토리에서 실행 (정적 파일과 템플릿은 링크)
+    work_dir = Path(tempfile.mkdtemp(prefix="pdf-bench-"))
+    for name in ("static", "templates"):
+        (work_dir / name).symlink_to(REPO_DIR / name)
+    os.chdir(work_dir)
+    os.environ.setdefault("JANITOR_INTERVAL", "3600")
+
+    pdf_dir = work_dir / "pdfs"
+    pdf_dir.mkdir()
+    started = time.time()
+    results = asyncio.run(run_benchmarks(matrix, args.repeat, set(args.only), pdf_dir))
+
+    report = {
+        "meta": {
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "started": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(started)),
+            "duration_s": round(time.time() - started, 1),
+            "repeat": args.repeat,
+            "matrix": matrix,
+            "settings": {key: os.environ[key] for key in sorted(os.environ)
+                         if key.startswith(("PDF_", "SESSION_", "THUMBNAIL_", "EXTRACT_", "READER_"))},
+        },
+        "results": results,
+    }
+
+    status = 0
+    if baseline_path:
+        with open(baseline_path, encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.threshold, args.min_ms)
+        report["regressions"] = regressions
+        for item in regressions:
+            print(f"REGRESSION {item['name']}: p95 {item['baseline_p95_ms']} ms -> {item['p95_ms']} ms "
+                  f"(x{item['ratio']})", file=sys.stderr)
+        if regressions:
+            status = 1
+        else:
+            print("No regressions against baseline", file=sys.stderr)
+
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if output:
+        output.write_text(text + "\n", encoding="utf-8")
+    else:
+        print(text)
+    return status
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,174 @@
+"""서버 시작 시간 벤치마크
+
+잠들어 있던 인스턴스가 깨어날 때처럼 uvicorn을 새 프로세스로 띄워 첫 응답까지의 시간을 잰다.
+  import        : 새 인터프리터에서 import app에 걸린 시간
+  first_byte    : 프로세스 실행부터 GET / 응답 헤더를 받을 때까지 (인터프리터 시작 + import + 시작 이벤트 포함)
+  first_static  : 그다음 GET /static/app.js
+  first_upload  : 그다음 첫 PDF 업로드 (작업 프로세스를 아직 띄우지 않았으면 그 시간까지 포함)
+
+    python benchmarks/bench_coldstart.py --output coldstart.json
+    python benchmarks/bench_coldstart.py --baseline coldstart.json
+
+결과는 bench_api.py와 같은 형식이며 --baseline으로 p95를 비교해 느려진 항목이 있으면 종료 코드 1을 반환한다.
+필요한 패키지: requirements-web.txt + httpx
+"""
+from pathlib import Path
+import argparse
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from bench_api import REPO_DIR, compare, git_revision, percentile
+from synthetic import make_pdf
+
+# 서버가 응답하지 않을 때 기다리는 최대 시간 (초)
+READY_TIMEOUT = 60
+
+IMPORT_SCRIPT = "import time; start = time.perf_counter(); import app; print(time.perf_counter() - start)"
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def measure_import(env: dict) -> float:
+    """새 인터프리터에서 import app 시간 (초)"""
+    output = subprocess.run([sys.executable, "-c", IMPORT_SCRIPT], env=env,
+                            capture_output=True, text=True, check=True).stdout
+    return float(output.strip().splitlines()[-1])
+
+def wait_first_byte(client: httpx.Client, url: str, process: subprocess.Popen, start: float) -> float:
+    """GET / 응답 헤더를 받을 때까지 반복 요청하고 프로세스 실행부터 걸린 시간 (초) 반환"""
+    while time.perf_counter() - start < READY_TIMEOUT:
+        if process.poll() is not None:
+            raise RuntimeError(f"server exited with code {process.returncode}")
+        try:
+            with client.stream("GET", url) as response:
+                elapsed = time.perf_counter() - start
+                response.raise_for_status()
+                response.read()
+                return elapsed
+        except httpx.TransportError:
+            time.sleep(0.005)
+    raise RuntimeError("server did not respond in time")
+
+def cold_start(env: dict, pdf_bytes: bytes) -> dict:
+    """서버를 한 번 새로 띄워 첫 요청들의 시간 (초) 측정"""
+    port = free_port()
+    base = f"http://127.0.0.1:{port}"
+    command = [sys.executable, "-m", "uvicorn", "app:app", "--host", "127.0.0.1", "--port", str(port),
+               "--log-level", "warning"]
+    with httpx.Client(timeout=READY_TIMEOUT) as client:
+        start = time.perf_counter()
+        process = subprocess.Popen(command, env=env, stdout=subprocess.DEVNULL)
+        try:
+            timings = {"first_byte": wait_first_byte(client, base + "/", process, start)}
+
+            start = time.perf_counter()
+            client.get(base + "/static/app.js").raise_for_status()
+            timings["first_static"] = time.perf_counter() - start
+
+            start = time.perf_counter()
+            response = client.post(base + "/api/upload",
+                                   files={"file": ("bench.pdf", pdf_bytes, "application/pdf")})
+            timings["first_upload"] = time.perf_counter() - start
+            response.raise_for_status()
+            client.delete(f"{base}/api/pdf/{response.json()['file_id']}")
+        finally:
+            process.terminate()
+            try:
+                process.wait(10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.wait()
+    return timings
+
+def summarize(samples: list) -> dict:
+    return {
+        "runs": len(samples),
+        "p50_ms": round(percentile(samples, 50) * 1000, 3),
+        "p95_ms": round(percentile(samples, 95) * 1000, 3),
+        "mean_ms": round(sum(samples) / len(samples) * 1000, 3),
+    }
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="PDF editor cold start benchmark")
+    parser.add_argument("--repeat", type=int, default=5, help="server starts to measure")
+    parser.add_argument("--pages", type=int, default=10, help="pages in the uploaded PDF")
+    parser.add_argument("--output", help="write JSON results to this file (default: stdout)")
+    parser.add_argument("--baseline", help="JSON results to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed p95 slowdown ratio (default 0.2 = 20%%)")
+    parser.add_argument("--min-ms", type=float, default=20.0, help="ignore slowdowns smaller than this (ms)")
+    args = parser.parse_args()
+
+    output = Path(args.output).resolve() if args.output else None
+    baseline_path = Path(args.baseline).resolve() if args.baseline else None
+
+    # 저장소를 건드리지 않도록 임시 작업 디렉토리에서 실행 (코드와 정적 파일, 템플릿은 링크)
+    work_dir = Path(tempfile.mkdtemp(prefix="pdf-coldstart-"))
+    for name in ("static", "templates"):
+        (work_dir / name).symlink_to(REPO_DIR / name)
+    os.chdir(work_dir)
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join(filter(None, [str(REPO_DIR), os.environ.get("PYTHONPATH")]))}
+    env.setdefault("JANITOR_INTERVAL", "3600")
+
+    pdf_path = work_dir / "bench.pdf"
+    make_pdf(pdf_path, "text", args.pages)
+    pdf_bytes = pdf_path.read_bytes()
+
+    started = time.time()
+    samples = {"import": [], "first_byte": [], "first_static": [], "first_upload": []}
+    for i in range(args.repeat):
+        samples["import"].append(measure_import(env))
+        for name, seconds in cold_start(env, pdf_bytes).items():
+            samples[name].append(seconds)
+        print(f"[{i + 1}/{args.repeat}] " + "  ".join(f"{name} {values[-1] * 1000:.0f} ms"
+                                                     for name, values in samples.items()), file=sys.stderr)
+    results = {name: summarize(values) for name, values in samples.items()}
+
+    report = {
+        "meta": {
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "started": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(started)),
+            "duration_s": round(time.time() - started, 1),
+            "repeat": args.repeat,
+            "pages": args.pages,
+            "settings": {key: env[key] for key in sorted(env)
+                         if key.startswith(("PDF_", "SESSION_", "JANITOR_"))},
+        },
+        "results": results,
+    }
+
+    status = 0
+    if baseline_path:
+        with open(baseline_path, encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.threshold, args.min_ms)
+        report["regressions"] = regressions
+        for item in regressions:
+            print(f"REGRESSION {item['name']}: p95 {item['baseline_p95_ms']} ms -> {item['p95_ms']} ms "
+                  f"(x{item['ratio']})", file=sys.stderr)
+        if regressions:
+            status = 1
+        else:
+            print("No regressions against baseline", file=sys.stderr)
+
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if output:
+        output.write_text(text + "\n", encoding="utf-8")
+    else:
+        print(text)
+    return status
+
+if __name__ == "__main__":
+    sys.exit(main())
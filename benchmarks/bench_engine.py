@@ -0,0 +1,184 @@
+"""PDF 엔진 마이크로 벤치마크
+
+합성 PDF로 pdf_engine의 pypdf, PyMuPDF 엔진을 같은 작업으로 비교한다.
+  open    : 파일 열기 + 페이지 수
+  select  : 페이지 순서 뒤집기 + 저장
+  insert  : 다른 문서 전체를 가운데에 끼우기 + 저장
+  build   : 짝수 페이지, 다른 문서, 홀수 페이지 순서로 새 문서 만들기 (pdf_worker.write_document, 홀수 페이지는 90도 회전)
+  build_cached : build와 같지만 원본을 다시 파싱하지 않음 (pypdf는 PdfReader 캐시 사용)
+
+    python benchmarks/bench_engine.py --quick
+    python benchmarks/bench_engine.py --doc images:100,500 --output engine.json
+
+PDF_ENGINE_AUTO_BYTES 기준을 정할 때 두 엔진의 p50이 역전되는 크기를 참고한다 (역전되지 않으면 0).
+결과는 bench_api.py와 같은 형식이며 --baseline으로 p95를 비교할 수 있다.
+필요한 패키지: requirements-web.txt + PyMuPDF
+"""
+from pathlib import Path
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+
+from bench_api import compare, git_revision, parse_matrix, percentile
+from synthetic import make_pdf
+
+import pdf_engine
+import pdf_worker
+
+DEFAULT_MATRIX = {"text": [10, 100, 1000], "images": [10, 100, 500], "fonts": [10, 100, 1000]}
+QUICK_MATRIX = {"text": [10, 100], "images": [10, 50], "fonts": [10, 100]}
+
+# ---------------------------------------------------------------------------
+# 작업 정의
+# ctx: {"pdf_path", "source_path", "output_path", "pages"}
+
+def op_open(engine, ctx):
+    doc = engine.open(ctx["pdf_path"])
+    engine.page_count(doc)
+    engine.close(doc)
+
+def op_select(engine, ctx):
+    doc = engine.open(ctx["pdf_path"])
+    doc = engine.select(doc, reversed(range(engine.page_count(doc))))
+    engine.write(doc, ctx["output_path"])
+    engine.close(doc)
+
+def op_insert(engine, ctx):
+    doc = engine.open(ctx["pdf_path"])
+    source = engine.open(ctx["source_path"])
+    doc = engine.insert_range(doc, source, 0, engine.page_count(source) - 1, at=engine.page_count(doc) // 2)
+    engine.write(doc, ctx["output_path"])
+    engine.close(doc)
+    engine.close(source)
+
+def build_pages(ctx) -> list:
+    pdf_path, source_path = str(ctx["pdf_path"]), str(ctx["source_path"])
+    pages = [[pdf_path, i, 0] for i in range(0, ctx["pages"], 2)]
+    pages += [[source_path, i, 0] for i in range(10)]
+    pages += [[pdf_path, i, 90] for i in range(1, ctx["pages"], 2)]
+    return pages
+
+def op_build(engine, ctx):
+    # 같은 조건에서 비교하도록 매번 파싱된 PdfReader 캐시를 비움
+    for path in (ctx["pdf_path"], ctx["source_path"]):
+        pdf_worker.reader_cache().invalidate(path)
+    pdf_engine.PDF_ENGINE = engine.name
+    pdf_worker.write_document(build_pages(ctx), str(ctx["output_path"]))
+
+def op_build_cached(engine, ctx):
+    # 작업 프로세스가 같은 원본을 계속 편집할 때처럼 캐시된 PdfReader를 재사용
+    pdf_engine.PDF_ENGINE = engine.name
+    pdf_worker.write_document(build_pages(ctx), str(ctx["output_path"]))
+
+OPERATIONS = [("open", op_open), ("select", op_select), ("insert", op_insert), ("build", op_build),
+              ("build_cached", op_build_cached)]
+
+def measure(engine, run, ctx: dict, repeat: int) -> dict:
+    """작업을 repeat번 실행해 지연 시간 백분위수와 결과 파일 크기 집계"""
+    latencies = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run(engine, ctx)
+        latencies.append(time.perf_counter() - start)
+    output_path = ctx["output_path"]
+    size = output_path.stat().st_size if output_path.exists() else 0
+    if output_path.exists():
+        output_path.unlink()
+    return {
+        "runs": repeat,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 3),
+        "output_bytes": size,
+    }
+
+def run_benchmarks(matrix: dict, engines: list, repeat: int, pdf_dir: Path) -> dict:
+    source_path = pdf_dir / "source-text-10.pdf"
+    make_pdf(source_path, "text", 10)
+
+    results = {}
+    for kind, page_counts in matrix.items():
+        for pages in page_counts:
+            pdf_path = pdf_dir / f"{kind}-{pages}.pdf"
+            size = make_pdf(pdf_path, kind, pages)
+            print(f"[{kind}-{pages}] {size:,} bytes", file=sys.stderr)
+            ctx = {"pdf_path": pdf_path, "source_path": source_path, "output_path": pdf_dir / "output.pdf",
+                   "pages": pages}
+            for name, run in OPERATIONS:
+                line = []
+                for engine_name in engines:
+                    engine = pdf_engine.create_engine(engine_name)
+                    result = measure(engine, run, ctx, repeat)
+                    results[f"{kind}-{pages}/{name}/{engine_name}"] = {**result, "pdf_bytes": size}
+                    line.append(f"{engine_name} {result['p50_ms']:9.2f} ms")
+                print(f"  {name:12s} " + "  ".join(line), file=sys.stderr)
+            pdf_path.unlink()
+    return results
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="PDF engine micro-benchmark")
+    parser.add_argument("--doc", action="append", default=[],
+                        help="document set as KIND:PAGES[,PAGES] (repeatable, default: full matrix)")
+    parser.add_argument("--quick", action="store_true", help="small documents only")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per operation")
+    parser.add_argument("--engine", action="append", default=[], choices=["pypdf", "pymupdf"],
+                        help="engines to compare (default: all available)")
+    parser.add_argument("--output", help="write JSON results to this file (default: stdout)")
+    parser.add_argument("--baseline", help="JSON results to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed p95 slowdown ratio (default 0.2 = 20%%)")
+    parser.add_argument("--min-ms", type=float, default=1.0, help="ignore slowdowns smaller than this (ms)")
+    args = parser.parse_args()
+
+    matrix = parse_matrix(args.doc) if args.doc else (QUICK_MATRIX if args.quick else DEFAULT_MATRIX)
+    engines = args.engine or (["pypdf", "pymupdf"] if pdf_engine.HAS_PYMUPDF else ["pypdf"])
+    output = Path(args.output).resolve() if args.output else None
+    baseline_path = Path(args.baseline).resolve() if args.baseline else None
+
+    pdf_dir = Path(tempfile.mkdtemp(prefix="pdf-engine-bench-"))
+    started = time.time()
+    results = run_benchmarks(matrix, engines, args.repeat, pdf_dir)
+    shutil.rmtree(pdf_dir, ignore_errors=True)
+
+    report = {
+        "meta": {
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "started": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(started)),
+            "duration_s": round(time.time() - started, 1),
+            "repeat": args.repeat,
+            "matrix": matrix,
+            "engines": engines,
+        },
+        "results": results,
+    }
+
+    status = 0
+    if baseline_path:
+        with open(baseline_path, encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.threshold, args.min_ms)
+        report["regressions"] = regressions
+        for item in regressions:
+            print(f"REGRESSION {item['name']}: p95 {item['baseline_p95_ms']} ms -> {item['p95_ms']} ms "
+                  f"(x{item['ratio']})", file=sys.stderr)
+        if regressions:
+            status = 1
+        else:
+            print("No regressions against baseline", file=sys.stderr)
+
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if output:
+        output.write_text(text + "\n", encoding="utf-8")
+    else:
+        print(text)
+    return status
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,66 @@
+"""벤치마크용 합성 PDF 생성
+
+같은 종류, 페이지 수, seed면 항상 같은 내용의 파일을 만든다 (PyMuPDF 필요).
+    text   : 텍스트만 있는 페이지
+    images : 페이지마다 서로 다른 이미지 4장 (압축이 잘 되지 않는 노이즈)
+    fonts  : 모든 페이지가 같은 기본 글꼴 여러 개를 함께 사용
+"""
+from pathlib import Path
+import random
+
+import fitz
+
+KINDS = ("text", "images", "fonts")
+
+PAGE_WIDTH = 595
+PAGE_HEIGHT = 842
+IMAGE_SIZE = 96
+FONTS = ("helv", "hebo", "tiro", "tibo", "cour", "cobo")
+WORDS = (
+    "pdf", "page", "merge", "split", "rotate", "document", "editor", "layout", "stream", "object",
+    "reference", "font", "image", "content", "version", "undo", "redo", "thumbnail", "range", "cache",
+)
+
+def random_text(rng: random.Random, lines: int, words: int) -> str:
+    return "\n".join(" ".join(rng.choice(WORDS) for _ in range(words)) for _ in range(lines))
+
+def add_text_page(doc, rng: random.Random, number: int):
+    page = doc.new_page(width=PAGE_WIDTH, height=PAGE_HEIGHT)
+    page.insert_text((50, 60), f"Page {number}", fontsize=18)
+    page.insert_textbox(fitz.Rect(50, 80, PAGE_WIDTH - 50, PAGE_HEIGHT - 40), random_text(rng, 60, 12), fontsize=9)
+
+def add_image_page(doc, rng: random.Random, number: int):
+    page = doc.new_page(width=PAGE_WIDTH, height=PAGE_HEIGHT)
+    page.insert_text((50, 60), f"Page {number}", fontsize=18)
+    half = (PAGE_WIDTH - 100) / 2
+    for i in range(4):
+        samples = rng.randbytes(IMAGE_SIZE * IMAGE_SIZE * 3)
+        pixmap = fitz.Pixmap(fitz.csRGB, IMAGE_SIZE, IMAGE_SIZE, samples, False)
+        x = 50 + (i % 2) * half
+        y = 100 + (i // 2) * half
+        page.insert_image(fitz.Rect(x, y, x + half - 10, y + half - 10), pixmap=pixmap)
+
+def add_fonts_page(doc, rng: random.Random, number: int):
+    page = doc.new_page(width=PAGE_WIDTH, height=PAGE_HEIGHT)
+    page.insert_text((50, 60), f"Page {number}", fontsize=18)
+    y = 100
+    for fontname in FONTS:
+        rect = fitz.Rect(50, y, PAGE_WIDTH - 50, y + 110)
+        page.insert_textbox(rect, random_text(rng, 8, 10), fontname=fontname, fontsize=9)
+        y += 120
+
+PAGE_BUILDERS = {"text": add_text_page, "images": add_image_page, "fonts": add_fonts_page}
+
+def make_pdf(path, kind: str, pages: int, seed: int = 0) -> int:
+    """합성 PDF를 path에 저장하고 파일 크기 반환"""
+    if kind not in PAGE_BUILDERS:
+        raise ValueError(f"Unknown kind: {kind} (choose from {', '.join(KINDS)})")
+    rng = random.Random(f"{kind}-{pages}-{seed}")
+    doc = fitz.open()
+    for number in range(1, pages + 1):
+        PAGE_BUILDERS[kind](doc, rng, number)
+    # 생성 시각 등이 들어가지 않도록 메타데이터를 비우고 ID 없이 저장
+    doc.set_metadata({})
+    doc.save(str(path), garbage=3, deflate=True, no_new_id=True)
+    doc.close()
+    return Path(path).stat().st_size
@@ -1,4 +1,7 @@
+import os
 import sys
+import tempfile
+import time
 from pathlib import Path
 from typing import Optional
 
@@ -28,9 +31,69 @@ from PySide6.QtWidgets import (
     QSizePolicy,
 )
 
-from pypdf import PdfReader, PdfWriter
 import fitz  # PyMuPDF
 
+import pdf_engine
+
+# 같은 파일에 덧붙여 저장할 수 있는 최대 수정 기록 수 (넘으면 전체를 다시 써서 기록을 정리)
+MAX_INCREMENTAL_REVISIONS = 20
+
+
+def save_document(doc, path: Path) -> dict:
+    """열린 PyMuPDF 문서를 원래 파일에 저장하고 문서를 닫음
+
+    가능하면 바뀐 객체와 새 xref만 파일 끝에 덧붙이고(incremental),
+    암호화된 파일이거나 수정 기록이 MAX_INCREMENTAL_REVISIONS개 이상이면 전체를 다시 쓴다.
+    {"mode", "reason", "bytes_written", "size", "revisions", "seconds"}를 반환한다.
+    """
+    start = time.perf_counter()
+    before = path.stat().st_size
+
+    if doc.is_encrypted or doc.needs_pass:
+        reason = "encrypted"
+    elif doc.version_count >= MAX_INCREMENTAL_REVISIONS:
+        reason = "revision chain too long"
+    elif not doc.can_save_incrementally():
+        reason = "incremental save not supported"
+    else:
+        reason = None
+
+    if reason is None:
+        revisions = doc.version_count + 1
+        doc.save(str(path), incremental=True, encryption=fitz.PDF_ENCRYPT_KEEP)
+        doc.close()
+        size = path.stat().st_size
+        bytes_written = size - before
+    else:
+        # 열려 있는 원본에는 전체를 다시 쓸 수 없으므로 임시 파일에 저장한 뒤 교체
+        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=".pdf", dir=path.parent)
+        temp_file.close()
+        try:
+            doc.save(temp_file.name, garbage=1, deflate=True)
+            doc.close()
+            os.replace(temp_file.name, path)
+        except Exception:
+            if os.path.exists(temp_file.name):
+                os.unlink(temp_file.name)
+            raise
+        revisions = 1
+        size = path.stat().st_size
+        bytes_written = size
+
+    entry = {
+        "mode": "full" if reason else "incremental",
+        "reason": reason,
+        "bytes_written": bytes_written,
+        "size": size,
+        "revisions": revisions,
+        "seconds": round(time.perf_counter() - start, 4),
+    }
+    print(
+        f"Saved {path.name}: {entry['mode']}{' (' + reason + ')' if reason else ''}, "
+        f"{bytes_written} bytes written, {size} bytes total, {revisions} revisions, {entry['seconds']}s"
+    )
+    return entry
+
 
 class TextInputDialog(QDialog):
     """텍스트 입력 다이얼로그 (색상, 크기 선택 가능)"""
@@ -956,6 +1019,7 @@ class PdfEditorTab(QWidget):
         self._current_zoom = 1.0
         self._undo_stack = []  # 최대 10개까지 저장
         self._max_undo = 10
+        self._save_log = []  # 저장할 때마다 저장 방식(incremental/full)과 비용 기록
         
         self._setup_ui()
     
@@ -1252,8 +1316,12 @@ class PdfEditorTab(QWidget):
             return
         
         # 현재 PDF의 페이지 순서 저장
-        reader = PdfReader(str(self._current_path))
-        page_order = list(range(len(reader.pages)))
+        engine = pdf_engine.engine_for([self._current_path])
+        doc = engine.open(self._current_path)
+        try:
+            page_order = list(range(engine.page_count(doc)))
+        finally:
+            engine.close(doc)
         
         # Undo 스택에 추가 (최대 10개)
         self._undo_stack.append({
@@ -1272,27 +1340,27 @@ class PdfEditorTab(QWidget):
         # Undo 스택에 현재 상태 저장
         self._save_state_to_undo()
         
-        reader = PdfReader(str(self._current_path))
-        writer = PdfWriter()
-        
-        for idx in new_order:
-            if 0 <= idx < len(reader.pages):
-                writer.add_page(reader.pages[idx])
+        # 문서 크기에 맞는 엔진 (큰 문서는 PyMuPDF)
+        engine = pdf_engine.engine_for([self._current_path])
+        doc = engine.open(self._current_path)
         
-        if save_to_file:
-            # 실제 파일로 저장
-            edited_path = self._current_path.with_name(self._current_path.stem + "_edited.pdf")
-            with edited_path.open("wb") as f:
-                writer.write(f)
-            self._current_path = edited_path
-        else:
-            # 임시 파일로 저장 (메모리만)
-            import tempfile
-            temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.pdf')
-            temp_file.close()
-            with open(temp_file.name, "wb") as f:
-                writer.write(f)
-            self._current_path = Path(temp_file.name)
+        try:
+            page_count = engine.page_count(doc)
+            doc = engine.select(doc, [idx for idx in new_order if 0 <= idx < page_count])
+            
+            if save_to_file:
+                # 실제 파일로 저장
+                edited_path = self._current_path.with_name(self._current_path.stem + "_edited.pdf")
+                engine.write(doc, edited_path)
+                self._current_path = edited_path
+            else:
+                # 임시 파일로 저장 (메모리만)
+                temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.pdf')
+                temp_file.close()
+                engine.write(doc, temp_file.name)
+                self._current_path = Path(temp_file.name)
+        finally:
+            engine.close(doc)
         
         self._pdf_doc.load(str(self._current_path))
         
@@ -1380,9 +1448,10 @@ class PdfEditorTab(QWidget):
         if not source_file:
             return
         
+        engine = pdf_engine.engine_for([self._current_path, source_file])
         try:
-            source_reader = PdfReader(source_file)
-            source_page_count = len(source_reader.pages)
+            source_doc = engine.open(source_file)
+            source_page_count = engine.page_count(source_doc)
             if source_page_count == 0:
                 QMessageBox.warning(self, "오류", "선택한 PDF에 페이지가 없습니다.")
                 return
@@ -1390,56 +1459,49 @@ class PdfEditorTab(QWidget):
             QMessageBox.critical(self, "오류", f"PDF 파일을 읽는 중 오류가 발생했습니다:\n{str(e)}")
             return
         
-        dialog = InsertPagesDialog(self, source_page_count)
-        if dialog.exec() != QDialog.Accepted:
-            return
-        
-        page_range = dialog.get_page_range()
-        if page_range is None:
-            QMessageBox.warning(self, "오류", "잘못된 페이지 범위입니다.")
-            return
-        
-        start_idx, end_idx = page_range
-        if start_idx < 0 or end_idx >= source_page_count or start_idx > end_idx:
-            QMessageBox.warning(self, "오류", "잘못된 페이지 범위입니다.")
-            return
-        
-        insert_pos = dialog.get_insert_position()
-        current_idx = self.page_list.currentRow()
-        
-        current_reader = PdfReader(str(self._current_path))
-        writer = PdfWriter()
-        
-        if insert_pos == 'end':
-            for page in current_reader.pages:
-                writer.add_page(page)
-            for i in range(start_idx, end_idx + 1):
-                writer.add_page(source_reader.pages[i])
-            new_selection = len(current_reader.pages) + (end_idx - start_idx)
-        elif insert_pos == 'before':
-            for i, page in enumerate(current_reader.pages):
-                if i == current_idx:
-                    for j in range(start_idx, end_idx + 1):
-                        writer.add_page(source_reader.pages[j])
-                writer.add_page(page)
-            new_selection = current_idx + (end_idx - start_idx + 1)
-        else:  # 'after'
-            for i, page in enumerate(current_reader.pages):
-                writer.add_page(page)
-                if i == current_idx:
-                    for j in range(start_idx, end_idx + 1):
-                        writer.add_page(source_reader.pages[j])
-            new_selection = current_idx + 1
-        
-        # Undo 스택에 현재 상태 저장
-        self._save_state_to_undo()
-        
-        # 임시 파일로 저장 (자동 저장하지 않음)
-        import tempfile
-        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.pdf')
-        temp_file.close()
-        with open(temp_file.name, "wb") as f:
-            writer.write(f)
+        try:
+            dialog = InsertPagesDialog(self, source_page_count)
+            if dialog.exec() != QDialog.Accepted:
+                return
+            
+            page_range = dialog.get_page_range()
+            if page_range is None:
+                QMessageBox.warning(self, "오류", "잘못된 페이지 범위입니다.")
+                return
+            
+            start_idx, end_idx = page_range
+            if start_idx < 0 or end_idx >= source_page_count or start_idx > end_idx:
+                QMessageBox.warning(self, "오류", "잘못된 페이지 범위입니다.")
+                return
+            
+            insert_pos = dialog.get_insert_position()
+            current_idx = self.page_list.currentRow()
+            
+            doc = engine.open(self._current_path)
+            page_count = engine.page_count(doc)
+            
+            if insert_pos == 'end' or current_idx < 0:
+                doc = engine.insert_range(doc, source_doc, start_idx, end_idx)
+                new_selection = page_count + (end_idx - start_idx)
+            elif insert_pos == 'before':
+                doc = engine.insert_range(doc, source_doc, start_idx, end_idx, at=current_idx)
+                new_selection = current_idx + (end_idx - start_idx + 1)
+            else:  # 'after'
+                doc = engine.insert_range(doc, source_doc, start_idx, end_idx, at=current_idx + 1)
+                new_selection = current_idx + 1
+            
+            # Undo 스택에 현재 상태 저장
+            self._save_state_to_undo()
+            
+            # 임시 파일로 저장 (자동 저장하지 않음)
+            temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.pdf')
+            temp_file.close()
+            try:
+                engine.write(doc, temp_file.name)
+            finally:
+                engine.close(doc)
+        finally:
+            engine.close(source_doc)
         
         self._current_path = Path(temp_file.name)
         self._pdf_doc.load(str(self._current_path))
@@ -1781,17 +1843,17 @@ class PdfEditorTab(QWidget):
             return
         
         try:
-            reader = PdfReader(str(self._current_path))
-            writer = PdfWriter()
+            engine = pdf_engine.engine_for([self._current_path])
+            doc = engine.open(self._current_path)
             
             start_idx = start_page - 1
             end_idx = end_page - 1
             
-            for i in range(start_idx, end_idx + 1):
-                writer.add_page(reader.pages[i])
-            
-            with open(save_path, "wb") as f:
-                writer.write(f)
+            try:
+                doc = engine.select(doc, range(start_idx, end_idx + 1))
+                engine.write(doc, save_path)
+            finally:
+                engine.close(doc)
             
             QMessageBox.information(
                 self,
@@ -1934,9 +1996,13 @@ class PdfEditorTab(QWidget):
                                     color=fitz_color
                                 )
             
-            # 원본 파일에 저장
-            doc.save(str(self._current_path))
-            doc.close()
+            # 원본 파일에 저장 (가능하면 변경분만 덧붙임)
+            try:
+                entry = save_document(doc, self._current_path)
+            finally:
+                if not doc.is_closed:
+                    doc.close()
+            self._save_log.append(entry)
             
             QMessageBox.information(self, "완료", "파일이 저장되었습니다.")
         
@@ -2230,18 +2296,26 @@ class PdfEditorMainWindow(QMainWindow):
         if not save_path:
             return
         
-        writer = PdfWriter()
         total_pages = 0
         
         try:
-            for file_path in file_paths:
-                reader = PdfReader(file_path)
-                for page in reader.pages:
-                    writer.add_page(page)
-                    total_pages += 1
-            
-            with open(save_path, "wb") as f:
-                writer.write(f)
+            engine = pdf_engine.engine_for(file_paths)
+            doc = engine.new()
+            sources = []
+            try:
+                for file_path in file_paths:
+                    source = engine.open(file_path)
+                    sources.append(source)
+                    page_count = engine.page_count(source)
+                    if page_count:
+                        doc = engine.insert_range(doc, source, 0, page_count - 1)
+                    total_pages += page_count
+                
+                engine.write(doc, save_path)
+            finally:
+                engine.close(doc)
+                for source in sources:
+                    engine.close(source)
             
             QMessageBox.information(
                 self,
@@ -0,0 +1,237 @@
+"""Prometheus 텍스트 형식 지표 수집
+
+외부 라이브러리 없이 카운터, 히스토그램, 게이지만 구현한다.
+값 기록은 잠금 하나와 덧셈 몇 번이 전부라 요청 처리 시간에 거의 영향을 주지 않는다.
+"""
+from contextlib import contextmanager
+import threading
+import time
+from typing import Callable
+
+# 지연 시간 히스토그램 기본 구간 (초)
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    """라벨 이름과 값으로 {a="1",b="2"} 문자열 생성"""
+    pairs = []
+    for name, value in zip(names, values):
+        escaped = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pairs.append(f'{name}="{escaped}"')
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def format_value(value: float) -> str:
+    """지표 값 문자열 (정수는 소수점 없이)"""
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Counter:
+    """계속 증가하는 값 (라벨 조합마다 따로 집계)"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(labels.get(name, "") for name in self.label_names)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        key = tuple(labels.get(name, "") for name in self.label_names)
+        with self._lock:
+            return self._values.get(key, 0)
+
+    def samples(self) -> list:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [(self.name, format_labels(self.label_names, key), value) for key, value in items]
+
+
+class Histogram:
+    """관측값 분포 (구간별 누적 개수, 합계, 개수)"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = labels
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}  # {라벨 값: [구간별 개수..., 합계, 개수]}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels.get(name, "") for name in self.label_names)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+                    break
+            state[-2] += value
+            state[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """with 블록 실행 시간을 기록"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self) -> list:
+        with self._lock:
+            items = sorted((key, list(state)) for key, state in self._values.items())
+        result = []
+        for key, state in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, state):
+                cumulative += count
+                le = f'le="{format_value(bound)}"'
+                result.append((f"{self.name}_bucket", format_labels(self.label_names, key, le), cumulative))
+            # 마지막 구간보다 큰 값까지 포함한 전체 개수
+            inf = 'le="+Inf"'
+            result.append((f"{self.name}_bucket", format_labels(self.label_names, key, inf), state[-1]))
+            result.append((f"{self.name}_sum", format_labels(self.label_names, key), state[-2]))
+            result.append((f"{self.name}_count", format_labels(self.label_names, key), state[-1]))
+        return result
+
+
+class Gauge:
+    """수집할 때마다 함수를 호출해 읽는 현재 값
+
+    함수는 숫자 하나 또는 {라벨 값 튜플: 숫자} dict를 반환한다.
+    """
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, func: Callable, labels: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = labels
+        self.func = func
+
+    def samples(self) -> list:
+        values = self.func()
+        if not isinstance(values, dict):
+            values = {(): values}
+        return [
+            (self.name, format_labels(self.label_names, key), value)
+            for key, value in sorted(values.items())
+        ]
+
+
+class Registry:
+    """지표 목록과 텍스트 출력"""
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, documentation: str, labels: tuple = ()) -> Counter:
+        return self.register(Counter(name, documentation, labels))
+
+    def histogram(self, name: str, documentation: str, labels: tuple = (),
+                  buckets: tuple = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labels, buckets))
+
+    def gauge(self, name: str, documentation: str, func: Callable, labels: tuple = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, func, labels))
+
+    def render(self) -> str:
+        """Prometheus 텍스트 형식 (0.0.4)"""
+        lines = []
+        for metric in self._metrics:
+            try:
+                samples = metric.samples()
+            except Exception:
+                # 게이지 하나가 실패해도 나머지 지표는 내보냄
+                continue
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in samples:
+                lines.append(f"{name}{labels} {format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+# HTTP 요청 지표 (MetricsMiddleware가 기록)
+http_requests = registry.counter(
+    "http_requests_total", "HTTP requests by route and status", ("method", "route", "status"))
+http_latency = registry.histogram(
+    "http_request_duration_seconds", "HTTP request latency by route", ("method", "route"))
+http_bytes = registry.counter(
+    "http_bytes_total", "HTTP body bytes received (in) and sent (out)", ("direction",))
+
+
+class MetricsMiddleware:
+    """요청 수, 라우트별 지연 시간, 주고받은 바이트 수를 기록하는 ASGI 미들웨어
+
+    라우트 라벨은 실제 경로 대신 /api/pdf/{file_id} 같은 경로 템플릿을 사용한다.
+    어느 라우트에도 맞지 않은 요청은 "unmatched"로 묶어 라벨 수가 늘어나지 않게 한다.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._routes = {}  # {엔드포인트: 경로 템플릿}
+
+    def route_label(self, scope) -> str:
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return "unmatched"
+        label = self._routes.get(endpoint)
+        if label is None:
+            label = "unmatched"
+            for route in getattr(scope.get("app"), "routes", []):
+                if getattr(route, "endpoint", None) is endpoint or getattr(route, "app", None) is endpoint:
+                    label = route.path
+                    break
+            self._routes[endpoint] = label
+        return label
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = {"code": 500}
+
+        async def counting_receive():
+            message = await receive()
+            if message["type"] == "http.request":
+                http_bytes.inc(len(message.get("body", b"")), direction="in")
+            return message
+
+        async def counting_send(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            elif message["type"] == "http.response.body":
+                http_bytes.inc(len(message.get("body", b"")), direction="out")
+            await send(message)
+
+        try:
+            await self.app(scope, counting_receive, counting_send)
+        finally:
+            route = self.route_label(scope)
+            method = scope["method"]
+            http_requests.inc(method=method, route=route, status=str(status["code"]))
+            http_latency.observe(time.perf_counter() - start, method=method, route=route)
@@ -0,0 +1,241 @@
+"""PDF 페이지 조작 엔진
+
+웹 서버 작업(pdf_worker.py)과 데스크톱 편집기(main.py)가 같은 인터페이스로 페이지를 고르고, 끼워 넣고, 저장한다.
+  pypdf   : 순수 파이썬이라 항상 사용할 수 있다. PyMuPDF가 없을 때 쓰며, 파싱한 PdfReader를 재사용한다.
+  pymupdf : MuPDF로 페이지 객체를 복사하므로 작은 문서에서도 pypdf보다 빠르다 (benchmarks/bench_engine.py).
+
+엔진 메서드는 문서 객체를 받아 결과 문서를 반환한다. 구현에 따라 받은 객체를 고치거나 새 객체를 만드므로
+항상 반환값을 이어서 사용한다. 라이브러리는 엔진을 만들 때 불러오므로 이 모듈을 import하는 비용은 거의 없다.
+"""
+import abc
+import importlib.util
+import os
+from typing import Callable, Optional
+
+# 사용할 엔진: "auto"(기본), "pypdf", "pymupdf"
+PDF_ENGINE = os.environ.get("PDF_ENGINE", "auto")
+# auto일 때 원본 파일 크기 합계가 이 값 이상이면 PyMuPDF 사용 (기본 0: PyMuPDF가 있으면 항상 사용)
+# PdfReader 캐시가 데워진 pypdf도 1페이지 문서부터 PyMuPDF보다 느리므로 기준을 두지 않는다.
+PDF_ENGINE_AUTO_BYTES = int(os.environ.get("PDF_ENGINE_AUTO_BYTES", 0))
+
+HAS_PYMUPDF = importlib.util.find_spec("fitz") is not None
+
+
+def page_runs(pages: list) -> list:
+    """[(원본, 페이지 인덱스)] 목록에서 같은 원본의 연속된 페이지를 묶은 [(원본, 시작, 끝)] 목록 (끝 포함)"""
+    runs = []
+    for source, page_idx in pages:
+        if runs and runs[-1][0] is source and runs[-1][2] + 1 == page_idx:
+            runs[-1][2] = page_idx
+        else:
+            runs.append([source, page_idx, page_idx])
+    return [tuple(run) for run in runs]
+
+
+class PdfEngine(abc.ABC):
+    """엔진 인터페이스 (페이지 번호는 0부터)"""
+
+    name = ""
+
+    @abc.abstractmethod
+    def open(self, path):
+        """원본 파일 열기"""
+
+    @abc.abstractmethod
+    def new(self):
+        """빈 문서"""
+
+    @abc.abstractmethod
+    def page_count(self, doc) -> int:
+        """페이지 수"""
+
+    @abc.abstractmethod
+    def select(self, doc, order: list):
+        """order 순서의 페이지만 남긴 문서 (같은 페이지를 여러 번 넣을 수 있음)"""
+
+    @abc.abstractmethod
+    def insert_range(self, doc, source, start: int, end: int, at: Optional[int] = None):
+        """source의 start~end(포함) 페이지를 at 앞에 끼운 문서 (at이 None이면 끝에 추가)"""
+
+    @abc.abstractmethod
+    def rotate(self, doc, index: int, degrees: int):
+        """페이지 회전 각도에 degrees를 더한 문서"""
+
+    def assemble(self, pages: list, progress: Optional[Callable] = None):
+        """[(원본 문서, 페이지 인덱스)] 순서대로 담은 새 문서
+
+        같은 원본에서 연속된 페이지는 insert_range 한 번으로 복사한다.
+        progress를 주면 중간중간 progress(복사한 페이지 수, 전체 페이지 수)를 호출한다.
+        """
+        doc = self.new()
+        done = 0
+        for source, start, end in page_runs(pages):
+            doc = self.insert_range(doc, source, start, end)
+            done += end - start + 1
+            if progress is not None:
+                progress(done, len(pages))
+        return doc
+
+    @abc.abstractmethod
+    def write(self, doc, path) -> int:
+        """path에 저장하고 파일 크기 반환"""
+
+    def close(self, doc):
+        """문서가 쥔 자원 해제"""
+
+
+class PypdfEngine(PdfEngine):
+    """pypdf 엔진
+
+    원본은 PdfReader, 편집 결과는 PdfWriter다. PdfReader의 페이지는 고치지 않으므로
+    open_reader로 캐시된 PdfReader를 넘겨도 된다.
+    """
+
+    name = "pypdf"
+
+    def __init__(self, open_reader: Optional[Callable] = None):
+        import pypdf
+        self._pypdf = pypdf
+        self._open_reader = open_reader or pypdf.PdfReader
+
+    def _writable(self, doc):
+        """PdfReader면 모든 페이지를 담은 PdfWriter로 바꿈"""
+        if isinstance(doc, self._pypdf.PdfWriter):
+            return doc
+        return self.select(doc, range(len(doc.pages)))
+
+    def open(self, path):
+        return self._open_reader(str(path))
+
+    def new(self):
+        return self._pypdf.PdfWriter()
+
+    def page_count(self, doc):
+        return len(doc.pages)
+
+    def select(self, doc, order):
+        writer = self._pypdf.PdfWriter()
+        for index in order:
+            writer.add_page(doc.pages[index])
+        return writer
+
+    def insert_range(self, doc, source, start, end, at=None):
+        doc = self._writable(doc)
+        for offset, index in enumerate(range(start, end + 1)):
+            if at is None:
+                doc.add_page(source.pages[index])
+            else:
+                doc.insert_page(source.pages[index], at + offset)
+        return doc
+
+    def rotate(self, doc, index, degrees):
+        doc = self._writable(doc)
+        doc.pages[index].rotate(degrees)
+        return doc
+
+    def write(self, doc, path):
+        self._writable(doc).write(str(path))
+        return os.path.getsize(path)
+
+    def close(self, doc):
+        if isinstance(doc, self._pypdf.PdfWriter):
+            doc.close()
+
+
+class PymupdfEngine(PdfEngine):
+    """PyMuPDF 엔진 (원본과 편집 결과 모두 fitz.Document)"""
+
+    name = "pymupdf"
+
+    def __init__(self):
+        import fitz
+        self._fitz = fitz
+
+    def open(self, path):
+        return self._fitz.open(str(path))
+
+    def new(self):
+        return self._fitz.open()
+
+    def page_count(self, doc):
+        return doc.page_count
+
+    def select(self, doc, order):
+        # select는 같은 페이지를 여러 번 넣으면 한 페이지 객체를 공유하게 하므로 (회전하면 함께 바뀜)
+        # 처음 나온 페이지만 고른 뒤 두 번째부터는 복제본을 끼운다
+        order = list(order)
+        first_positions = {}
+        for position, index in enumerate(order):
+            first_positions.setdefault(index, position)
+        doc.select(list(first_positions))
+        for position, index in enumerate(order):
+            if first_positions[index] != position:
+                doc.fullcopy_page(first_positions[index], -1 if position == doc.page_count else position)
+        return doc
+
+    def insert_range(self, doc, source, start, end, at=None):
+        # 같은 원본에서 여러 번 가져와도 글꼴, 이미지 등 공유 객체는 한 번만 복사된다
+        if at is not None and at >= doc.page_count:
+            at = None
+        doc.insert_pdf(source, from_page=start, to_page=end, start_at=-1 if at is None else at)
+        return doc
+
+    def assemble(self, pages, progress=None):
+        sources = {id(source): source for source, _ in pages}
+        if len(page_runs(pages)) <= len(sources):
+            return super().assemble(pages, progress)
+
+        # 여러 원본을 번갈아 쓰면 insert_pdf 호출마다 드는 비용이 쌓이므로
+        # 원본마다 쓰는 구간을 한 번만 복사한 뒤 select로 순서를 맞춘다 (안 쓰는 페이지는 저장할 때 빠짐)
+        doc = self.new()
+        offsets = {}
+        done = 0
+        for key, source in sources.items():
+            used = [page_idx for other, page_idx in pages if other is source]
+            first, last = min(used), max(used)
+            offsets[key] = doc.page_count - first
+            doc.insert_pdf(source, from_page=first, to_page=last)
+            done += len(used)
+            if progress is not None:
+                progress(done, len(pages))
+        return self.select(doc, [offsets[id(source)] + page_idx for source, page_idx in pages])
+
+    def rotate(self, doc, index, degrees):
+        page = doc[index]
+        page.set_rotation((page.rotation + degrees) % 360)
+        return doc
+
+    def write(self, doc, path):
+        # select로 빠진 페이지의 객체가 남지 않도록 참조되지 않는 객체 제거
+        doc.save(str(path), garbage=1)
+        return os.path.getsize(path)
+
+    def close(self, doc):
+        doc.close()
+
+
+def choose_engine(size: int = 0, kind: Optional[str] = None) -> str:
+    """설정과 문서 크기(바이트)로 엔진 이름 선택 (PyMuPDF가 없으면 항상 "pypdf")"""
+    kind = kind or PDF_ENGINE
+    if kind not in ("auto", "pypdf", "pymupdf"):
+        raise ValueError(f"Unknown PDF engine: {kind}")
+    if not HAS_PYMUPDF or kind == "pypdf":
+        return "pypdf"
+    if kind == "pymupdf" or size >= PDF_ENGINE_AUTO_BYTES:
+        return "pymupdf"
+    return "pypdf"
+
+
+def create_engine(kind: str, open_reader: Optional[Callable] = None) -> PdfEngine:
+    """엔진 이름으로 엔진 생성 (open_reader는 pypdf 엔진이 원본을 열 때 쓰는 함수)"""
+    if kind == "pypdf":
+        return PypdfEngine(open_reader)
+    if kind == "pymupdf":
+        return PymupdfEngine()
+    raise ValueError(f"Unknown PDF engine: {kind}")
+
+
+def engine_for(paths, kind: Optional[str] = None, open_reader: Optional[Callable] = None) -> PdfEngine:
+    """원본 파일 크기 합계로 고른 엔진"""
+    size = sum(os.path.getsize(path) for path in set(map(str, paths)))
+    return create_engine(choose_engine(size, kind), open_reader)
@@ -0,0 +1,584 @@
+"""CPU를 많이 쓰는 PDF 작업 모음 (작업 프로세스에서 실행)
+
+웹 서버(app.py)를 import하지 않으므로 작업 프로세스는 pypdf만 불러온다.
+pypdf는 쓰는 함수 안에서 불러오므로, 작업을 직접 실행하지 않는 웹 서버 프로세스는 pypdf를 불러오지 않는다.
+모든 함수는 경로와 참조 목록만 받고 결과를 반환하며 서버 상태를 건드리지 않는다.
+"""
+from collections import OrderedDict
+from contextlib import contextmanager
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+import unicodedata
+from typing import Optional
+
+import pdf_engine
+
+# 파싱된 PdfReader 캐시 최대 크기 (서버 전체 추정 바이트)
+# 캐시는 작업 프로세스(스레드 실행기면 스레드)마다 따로 두므로 각 캐시는 이 값을 작업자 수로 나눈 크기를 쓴다.
+READER_CACHE_BYTES = int(os.environ.get("READER_CACHE_BYTES", 256 * 1024 * 1024))
+reader_cache_bytes = READER_CACHE_BYTES
+# 백그라운드 작업 진행률 파일을 다시 쓰는 최소 간격 (초)
+PROGRESS_INTERVAL = 0.2
+
+# 검색 색인 단어 (유니코드 글자/숫자 연속)
+TOKEN_PATTERN = re.compile(r"\w+")
+
+class ReaderCache:
+    """파싱된 PdfReader와 페이지 메타데이터를 보관하는 LRU 캐시
+
+    파일 경로 + 수정 시각 + 크기를 키로 사용하므로 파일이 교체되면 자동으로 무효화되며,
+    추정 메모리 사용량 합계가 max_bytes를 넘으면 가장 오래 쓰지 않은 항목부터 버린다.
+    """
+
+    # 페이지 객체 등 파싱 결과가 파일 크기 외에 차지하는 대략적인 메모리
+    PAGE_OVERHEAD_BYTES = 2048
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()  # {경로: 캐시 항목}
+        self._lock = threading.Lock()
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.total_bytes -= entry["bytes"]
+
+    def get(self, path) -> dict:
+        """경로의 캐시 항목 반환 ({"reader", "page_count"}), 없으면 파싱해서 추가"""
+        key = str(path)
+        stat = os.stat(key)
+        signature = (stat.st_mtime_ns, stat.st_size)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry["signature"] == signature:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+            # 파일이 바뀌었으면 이전 항목 폐기
+            self._remove(key)
+            self.misses += 1
+        # 새로 파싱하는 김에 지워진 원본의 항목도 비움
+        self.prune()
+
+        import pypdf
+        reader = pypdf.PdfReader(key)
+        page_count = len(reader.pages)
+        entry = {
+            "reader": reader,
+            "page_count": page_count,
+            "signature": signature,
+            "bytes": stat.st_size + page_count * self.PAGE_OVERHEAD_BYTES,
+        }
+
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = entry
+            self.total_bytes += entry["bytes"]
+            # 최근 항목 하나는 크기와 상관없이 남김
+            while self.total_bytes > self.max_bytes and len(self._entries) > 1:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+        return entry
+
+    def reader(self, path) -> "pypdf.PdfReader":
+        """경로의 PdfReader 반환"""
+        return self.get(path)["reader"]
+
+    def invalidate(self, path):
+        """경로의 캐시 항목 폐기 (같은 프로세스에서 파일을 지우거나 교체할 때 호출)"""
+        with self._lock:
+            self._remove(str(path))
+
+    def prune(self) -> int:
+        """파일이 지워진 항목 폐기, 버린 항목 수 반환
+
+        원본은 웹 서버 프로세스가 지우므로 작업 프로세스의 캐시를 invalidate로 직접 비울 수 없다.
+        대신 캐시에 없는 파일을 파싱할 때마다 호출해 지워진 원본의 PdfReader를 붙잡고 있지 않게 한다.
+        """
+        with self._lock:
+            keys = list(self._entries)
+        deleted = [key for key in keys if not os.path.exists(key)]
+        with self._lock:
+            for key in deleted:
+                self._remove(key)
+        return len(deleted)
+
+    def stats(self) -> dict:
+        """캐시 사용 현황"""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self.total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+# 스레드마다 별도 캐시 사용 (PdfReader는 여러 스레드에서 동시에 읽으면 안전하지 않음)
+_local = threading.local()
+
+def reader_cache() -> ReaderCache:
+    """현재 스레드의 PdfReader 캐시"""
+    cache = getattr(_local, "reader_cache", None)
+    if cache is None:
+        cache = _local.reader_cache = ReaderCache(reader_cache_bytes)
+    return cache
+
+def warm_up(workers: int = 1):
+    """작업 프로세스 초기화 (pypdf를 미리 불러와 첫 작업이 import를 기다리지 않게 함)
+
+    workers는 실행기의 작업자 수이며, 캐시 합계가 READER_CACHE_BYTES를 넘지 않도록 캐시마다 그만큼 나눠 쓴다.
+    PyMuPDF는 썸네일, 최적화 등 일부 작업에서만 쓰고 불러오는 데 오래 걸리므로 미리 불러오지 않는다.
+    """
+    global reader_cache_bytes
+    reader_cache_bytes = READER_CACHE_BYTES // max(1, workers)
+    import pypdf
+
+@contextmanager
+def stage(name: str):
+    """with 블록 실행 시간을 현재 작업의 단계별 소요 시간에 추가 (run_job 밖에서는 무시)"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings = getattr(_local, "timings", None)
+        if timings is not None:
+            timings.append((name, time.perf_counter() - start))
+
+class JobCancelled(Exception):
+    """백그라운드 작업이 취소 요청으로 중단됨"""
+
+def report_progress(done: int, total: int):
+    """현재 작업의 진행률(처리한 페이지 수 / 전체) 기록 (run_job에 job을 주지 않았으면 무시)
+
+    진행률은 {job}.progress 파일에 {"step": 작업 함수 이름, "done", "total"} JSON으로 쓰고, {job}.cancel 파일이 있으면 JobCancelled를 발생시킨다.
+    파일을 쓰는 방식이라 서버가 여러 워커 프로세스로 실행되어도 어느 워커에서나 읽고 취소할 수 있다.
+    """
+    job = getattr(_local, "job", None)
+    if job is None:
+        return
+    if os.path.exists(job + ".cancel"):
+        raise JobCancelled()
+    now = time.perf_counter()
+    if done < total and now - _local.progress_time < PROGRESS_INTERVAL:
+        return
+    _local.progress_time = now
+    temp_path = f"{job}.progress.part"
+    with open(temp_path, "w") as f:
+        json.dump({"step": _local.job_step, "done": done, "total": total}, f)
+    os.replace(temp_path, job + ".progress")
+
+def run_job(func, *args, job: Optional[str] = None) -> tuple:
+    """작업을 실행하고 (결과, 작업 통계) 반환
+
+    작업 통계는 {"stages": [(단계 이름, 초)], "reader_hits", "reader_misses", "engine": PDF 엔진 이름 (쓰지 않았으면 None)}이며,
+    작업 프로세스의 지표는 서버 프로세스에서 볼 수 없으므로 결과와 함께 돌려준다.
+    job은 백그라운드 작업 파일 경로(확장자 제외)로, 주면 report_progress가 진행률을 기록한다.
+    """
+    cache = reader_cache()
+    hits, misses = cache.hits, cache.misses
+    _local.timings = []
+    _local.engine = None
+    _local.job = job
+    _local.job_step = func.__name__
+    _local.progress_time = 0.0
+    try:
+        result = func(*args)
+        return result, {
+            "stages": _local.timings,
+            "reader_hits": cache.hits - hits,
+            "reader_misses": cache.misses - misses,
+            "engine": _local.engine,
+        }
+    finally:
+        _local.timings = None
+        _local.job = None
+
+def read_page_manifest(path: str) -> dict:
+    """페이지별 크기, 회전, 이미지/글자 포함 여부 (화면 배치용 요약)
+
+    페이지마다 [폭, 높이, 회전 각도, 이미지 있음(0/1), 글자 있음(0/1)]이며, 폭과 높이는 회전 전 CropBox 크기(pt)다.
+    내용 스트림은 해석하지 않고 페이지 리소스에 이미지 XObject나 글꼴이 있는지만 본다.
+    {"page_count", "pages"}를 반환한다.
+    """
+    with stage("read"):
+        reader = reader_cache().reader(path)
+        pages = []
+        for page in reader.pages:
+            box = page.cropbox
+            resources = page.get("/Resources")
+            resources = resources.get_object() if resources is not None else {}
+            xobjects = resources.get("/XObject")
+            xobjects = xobjects.get_object() if xobjects is not None else {}
+            has_images = any(xobject.get_object().get("/Subtype") == "/Image" for xobject in xobjects.values())
+            fonts = resources.get("/Font")
+            has_text = fonts is not None and len(fonts.get_object()) > 0
+            pages.append([
+                round(float(box.width), 2),
+                round(float(box.height), 2),
+                page.rotation % 360,
+                int(has_images),
+                int(has_text),
+            ])
+    return {"page_count": len(pages), "pages": pages}
+
+def read_outline(path: str) -> list:
+    """책갈피 목록 [[단계(1부터), 제목, 페이지 인덱스]] (문서 순서, 페이지가 없는 책갈피는 제외)"""
+    with stage("read"):
+        try:
+            import fitz
+        except ImportError:
+            fitz = None
+
+        if fitz is not None:
+            with fitz.open(path) as doc:
+                return [[level, title, page - 1] for level, title, page in doc.get_toc(simple=True) if page > 0]
+
+        reader = reader_cache().reader(path)
+        entries = []
+
+        def walk(items: list, level: int):
+            # pypdf는 하위 책갈피를 부모 바로 뒤의 중첩 목록으로 표현
+            for item in items:
+                if isinstance(item, list):
+                    walk(item, level + 1)
+                    continue
+                page_idx = reader.get_destination_page_number(item)
+                if page_idx is not None and page_idx >= 0:
+                    entries.append([level, str(item.title), page_idx])
+
+        walk(reader.outline, 1)
+        return entries
+
+def normalize_text(text: str) -> str:
+    """검색용 정규화 (호환 문자 통일 + 대소문자 무시)"""
+    return unicodedata.normalize("NFKC", text).casefold()
+
+def build_text_index(path: str, output_path: str) -> dict:
+    """페이지별 글자를 뽑아 단어 → 위치 역색인을 만들어 JSON으로 저장
+
+    저장 형식은 {"pages": [페이지 글자], "tokens": [정렬된 단어], "postings": [[페이지, 글자 위치, ...]]}이며
+    postings[i]는 tokens[i]가 나오는 (페이지 인덱스, 페이지 글자 안의 위치) 쌍을 이어 붙인 목록이다.
+    단어를 정렬해 두므로 앞부분이 같은 단어(조사가 붙은 한국어 단어 등)를 이진 탐색으로 찾을 수 있다.
+    PyMuPDF가 있으면 PyMuPDF로, 없으면 pypdf로 글자를 뽑는다. {"page_count", "tokens", "size"}를 반환한다.
+    """
+    try:
+        import fitz
+    except ImportError:
+        fitz = None
+
+    texts = []
+    with stage("extract"):
+        if fitz is not None:
+            with fitz.open(path) as doc:
+                for page_idx, page in enumerate(doc):
+                    texts.append(page.get_text())
+                    report_progress(page_idx + 1, len(doc))
+        else:
+            reader = reader_cache().reader(path)
+            for page_idx, page in enumerate(reader.pages):
+                texts.append(page.extract_text() or "")
+                report_progress(page_idx + 1, len(reader.pages))
+
+    with stage("index"):
+        postings = {}
+        for page_idx, text in enumerate(texts):
+            # NFKC는 글자 수를 바꿀 수 있으므로 NFKC로 바꾼 글자를 저장하고 그 안의 위치를 기록
+            text = texts[page_idx] = unicodedata.normalize("NFKC", text)
+            for match in TOKEN_PATTERN.finditer(text):
+                postings.setdefault(match.group().casefold(), []).extend((page_idx, match.start()))
+        tokens = sorted(postings)
+        index = {"pages": texts, "tokens": tokens, "postings": [postings[token] for token in tokens]}
+
+    output_dir = os.path.dirname(output_path) or "."
+    temp_file = tempfile.NamedTemporaryFile("w", delete=False, suffix='.part', dir=output_dir, encoding="utf-8")
+    try:
+        with stage("write"):
+            json.dump(index, temp_file, ensure_ascii=False, separators=(",", ":"))
+            temp_file.close()
+        with stage("move"):
+            os.replace(temp_file.name, output_path)
+    except Exception:
+        temp_file.close()
+        if os.path.exists(temp_file.name):
+            os.unlink(temp_file.name)
+        raise
+
+    return {"page_count": len(texts), "tokens": len(tokens), "size": os.path.getsize(output_path)}
+
+def write_document(pages: list, output_path: str) -> int:
+    """[원본 경로, 페이지 인덱스, 회전 각도] 목록으로 PDF를 만들어 저장하고 파일 크기 반환
+
+    엔진은 pdf_engine 설정과 원본 크기 합계로 고른다 (pypdf 엔진은 PdfReader 캐시를 사용).
+    """
+    engine = pdf_engine.engine_for({path for path, _, _ in pages}, open_reader=reader_cache().reader)
+    _local.engine = engine.name
+    sources = {}
+    doc = None
+    try:
+        with stage("read"):
+            for path, _page_idx, _rotation in pages:
+                if path not in sources:
+                    sources[path] = engine.open(path)
+            doc = engine.assemble([(sources[path], page_idx) for path, page_idx, _ in pages], report_progress)
+            for index, (_path, _page_idx, rotation) in enumerate(pages):
+                if rotation:
+                    doc = engine.rotate(doc, index, rotation)
+
+        # 임시 파일에 저장 후 교체 (다른 요청이 쓰다 만 파일을 읽지 않도록)
+        output_dir = os.path.dirname(output_path) or "."
+        fd, temp_path = tempfile.mkstemp(suffix='.pdf', dir=output_dir)
+        os.close(fd)
+        try:
+            with stage("write"):
+                engine.write(doc, temp_path)
+            with stage("move"):
+                os.replace(temp_path, output_path)
+        except Exception:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            raise
+    finally:
+        if doc is not None:
+            engine.close(doc)
+        if engine.name != "pypdf":
+            # pypdf 원본은 캐시가 관리
+            for source in sources.values():
+                engine.close(source)
+
+    return os.path.getsize(output_path)
+
+def render_thumbnail(path: str, page_idx: int, rotation: int, width: int, image_format: str, output_path: str) -> int:
+    """PyMuPDF로 페이지를 지정한 폭의 이미지로 렌더링해 저장하고 파일 크기 반환"""
+    import fitz  # 썸네일을 쓸 때만 불러옴
+
+    with stage("render"), fitz.open(path) as doc:
+        page = doc[page_idx]
+        # 추가 회전이 90/270도면 가로 세로가 바뀜
+        page_width = page.rect.height if rotation % 180 else page.rect.width
+        zoom = width / page_width
+        matrix = fitz.Matrix(zoom, zoom).prerotate(rotation)
+        pixmap = page.get_pixmap(matrix=matrix, alpha=False)
+        data = pixmap.tobytes(output=image_format)
+
+    output_dir = os.path.dirname(output_path) or "."
+    with stage("write"):
+        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.part', dir=output_dir)
+        temp_file.write(data)
+        temp_file.close()
+    with stage("move"):
+        os.replace(temp_file.name, output_path)
+    return len(data)
+
+def optimize_pdf(input_path: str, output_path: str) -> dict:
+    """같은 객체 합치기, 참조되지 않는 객체 제거, 객체 스트림 압축으로 크기를 줄여 저장
+
+    PyMuPDF가 있으면 garbage=4(중복 객체/스트림 합치기)와 객체 스트림을 사용하고,
+    없으면 pypdf로 중복 객체와 고아 객체만 정리한다. 결과가 더 크면 입력을 그대로 복사한다.
+    {"before", "after", "seconds", "engine"}을 반환한다.
+    """
+    start = time.perf_counter()
+    output_dir = os.path.dirname(output_path) or "."
+    temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.part', dir=output_dir)
+    temp_file.close()
+    try:
+        with stage("optimize"):
+            try:
+                import fitz
+            except ImportError:
+                fitz = None
+
+            # 객체 정리는 파일 전체를 한 번에 처리하므로 시작과 끝에만 진행률 기록
+            if fitz is not None:
+                engine = "pymupdf"
+                with fitz.open(input_path) as doc:
+                    page_count = len(doc)
+                    report_progress(0, page_count)
+                    doc.save(temp_file.name, garbage=4, deflate=True, use_objstms=1)
+            else:
+                import pypdf
+                engine = "pypdf"
+                pdf_writer = pypdf.PdfWriter(clone_from=reader_cache().reader(input_path))
+                page_count = len(pdf_writer.pages)
+                report_progress(0, page_count)
+                if pdf_writer._info is None:
+                    # 정보 사전이 없는 파일은 compress_identical_objects가 실패하므로 빈 사전 추가
+                    pdf_writer._info = pypdf.generic.DictionaryObject()
+                pdf_writer.compress_identical_objects(remove_identicals=True, remove_orphans=True)
+                with open(temp_file.name, "wb") as f:
+                    pdf_writer.write(f)
+
+        before = os.path.getsize(input_path)
+        after = os.path.getsize(temp_file.name)
+        if after >= before:
+            # 줄어들지 않았으면 원본 유지
+            shutil.copyfile(input_path, temp_file.name)
+            after = before
+
+        report_progress(page_count, page_count)
+        with stage("move"):
+            os.replace(temp_file.name, output_path)
+    except Exception:
+        if os.path.exists(temp_file.name):
+            os.unlink(temp_file.name)
+        raise
+
+    return {
+        "before": before,
+        "after": after,
+        "seconds": round(time.perf_counter() - start, 4),
+        "engine": engine,
+    }
+
+def save_incremental(base_path: str, base_pages: list, pages: list, output_path: str, max_revisions: int,
+                     in_place: bool = False) -> dict:
+    """이전 버전 PDF에 바뀐 객체와 새 xref만 덧붙여(incremental update) 새 버전을 저장
+
+    base_pages는 base_path의 페이지 구성, pages는 새 구성이며 둘 다 [원본 경로, 페이지 인덱스, 회전 각도] 목록이다.
+    in_place면 base_path 파일을 output_path 쪽 임시 이름으로 옮겨 그 끝에 덧붙인 뒤 output_path로 옮긴다
+    (성공하면 base_path는 남지 않는다). 아니면 base_path를 복사한 파일에 덧붙이므로 파일 전체를 쓴다.
+    base_path에 다른 하드 링크(작업 결과)가 있으면 in_place여도 복사한다.
+    PyMuPDF가 없거나, 암호화되었거나, 수정 기록이 max_revisions개 이상 쌓였거나,
+    같은 페이지가 두 번 이상 들어가면 write_document로 전체를 다시 쓴다.
+    {"mode": "incremental", "copy" 또는 "full", "reason", "bytes_written", "size", "revisions", "seconds"}를 반환한다.
+    """
+    start = time.perf_counter()
+
+    def full_rewrite(reason: str) -> dict:
+        size = write_document(pages, output_path)
+        return {
+            "mode": "full",
+            "reason": reason,
+            "bytes_written": size,
+            "size": size,
+            "revisions": 1,
+            "seconds": round(time.perf_counter() - start, 4),
+        }
+
+    def restore_base():
+        """덧붙이기 전 상태로 되돌림 (옮겨 온 이전 버전은 덧붙인 부분을 잘라 원래 이름으로 돌려놓음)"""
+        if not os.path.exists(temp_file.name):
+            return
+        if in_place:
+            if base_size is not None:
+                os.truncate(temp_file.name, base_size)
+            os.replace(temp_file.name, base_path)
+        else:
+            os.unlink(temp_file.name)
+
+    try:
+        import fitz
+    except ImportError:
+        return full_rewrite("pymupdf unavailable")
+
+    # 새 구성의 각 페이지가 이전 버전의 몇 번째 페이지인지 (없으면 원본에서 가져옴)
+    positions = {}
+    for position, (path, page_idx, _) in enumerate(base_pages):
+        positions.setdefault((path, page_idx), position)
+    if len(positions) != len(base_pages):
+        return full_rewrite("duplicate pages in base")
+    used = [(path, page_idx) for path, page_idx, _ in pages]
+    if len(set(used)) != len(used):
+        return full_rewrite("duplicate pages")
+    # 이전 버전 페이지 대부분을 버렸으면 덧붙이는 쪽이 오히려 파일이 커짐
+    kept = sum(1 for key in used if key in positions)
+    if kept * 2 < len(base_pages):
+        return full_rewrite("most base pages removed")
+
+    output_dir = os.path.dirname(output_path) or "."
+    temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.part', dir=output_dir)
+    temp_file.close()
+    if in_place:
+        # 이전 버전 파일을 옮겨 다른 저장 요청이 같은 파일에 덧붙이지 못하게 함
+        try:
+            os.replace(base_path, temp_file.name)
+        except FileNotFoundError:
+            os.unlink(temp_file.name)
+            return full_rewrite("base file taken by another save")
+        if os.stat(temp_file.name).st_nlink > 1:
+            # 끝난 작업의 결과가 하드 링크로 같은 파일을 쓰고 있으므로 되돌려 놓고 복사본에 덧붙임
+            os.replace(temp_file.name, base_path)
+            in_place = False
+        else:
+            # 옮겨도 수정 시각은 그대로라 오래된 임시 파일로 보고 지우지 않도록 갱신
+            os.utime(temp_file.name)
+    base_size = None
+    try:
+        if not in_place:
+            # 원본 파일은 여러 문서가 함께 쓰므로 복사본에 덧붙임
+            with stage("copy"):
+                shutil.copyfile(base_path, temp_file.name)
+        base_size = os.path.getsize(temp_file.name)
+
+        with fitz.open(temp_file.name) as doc:
+            if doc.is_encrypted or doc.needs_pass:
+                reason = "encrypted"
+            elif doc.version_count >= max_revisions:
+                reason = "revision chain too long"
+            elif not doc.can_save_incrementally():
+                reason = "incremental save not supported"
+            else:
+                reason = None
+
+            if reason is None:
+                with stage("read"):
+                    order = []
+                    appended = len(doc)
+                    sources = {}
+                    for done, (path, page_idx, _) in enumerate(pages, 1):
+                        position = positions.get((path, page_idx))
+                        if position is None:
+                            # 이전 버전에 없던 페이지는 원본에서 끝에 추가
+                            if path not in sources:
+                                sources[path] = fitz.open(path)
+                            doc.insert_pdf(sources[path], from_page=page_idx, to_page=page_idx)
+                            position = appended
+                            appended += 1
+                        order.append(position)
+                        report_progress(done, len(pages))
+                    for source in sources.values():
+                        source.close()
+
+                    base_rotations = [rotation for _, _, rotation in base_pages]
+                    doc.select(order)
+                    for page, position, (_, _, rotation) in zip(doc, order, pages):
+                        # 이전 버전에서 더했던 회전을 빼고 새 회전을 더함
+                        extra = rotation - (base_rotations[position] if position < len(base_rotations) else 0)
+                        if extra % 360:
+                            page.set_rotation((page.rotation + extra) % 360)
+
+                with stage("write"):
+                    doc.save(temp_file.name, incremental=True, encryption=fitz.PDF_ENCRYPT_KEEP)
+                revisions = doc.version_count + 1
+
+        if reason is not None:
+            restore_base()
+            return full_rewrite(reason)
+
+        size = os.path.getsize(temp_file.name)
+        with stage("move"):
+            os.replace(temp_file.name, output_path)
+    except Exception:
+        restore_base()
+        raise
+
+    return {
+        "mode": "incremental" if in_place else "copy",
+        "reason": None,
+        "bytes_written": size - base_size if in_place else size,
+        "size": size,
+        "revisions": revisions,
+        "seconds": round(time.perf_counter() - start, 4),
+    }
@@ -0,0 +1,359 @@
+"""문서 세션 상태 저장소
+
+여러 uvicorn 워커가 같은 문서를 다룰 수 있도록 문서와 원본 정보를 프로세스 밖에 둔다.
+문서는 JSON으로 저장하며, 저장할 때 버전을 비교해 다른 워커의 변경을 덮어쓰지 않는다.
+Undo/Redo 기록은 페이지 목록과 따로 저장해 편집할 때만 읽는다.
+"""
+from pathlib import Path
+import abc
+import json
+import sqlite3
+import threading
+from typing import Optional
+
+# 편집 기록 키 (페이지 목록과 따로 저장)
+HISTORY_KEYS = ("undo", "redo")
+
+
+class SessionStore(abc.ABC):
+    """세션 저장소 인터페이스
+
+    문서 레코드는 {"version", "accessed", "pages", ...} 형태의 dict이며 호출하는 쪽이 자유롭게 고쳐도
+    저장소 내용은 바뀌지 않는다 (항상 복사본을 돌려준다).
+    편집 기록("undo", "redo")은 get_document(history=True)로 읽을 때만 들어 있다.
+    """
+
+    @abc.abstractmethod
+    def get_document(self, file_id: str, history: bool = False) -> Optional[dict]:
+        """문서 레코드 (없으면 None, history면 편집 기록까지)"""
+
+    @abc.abstractmethod
+    def get_version(self, file_id: str) -> Optional[int]:
+        """문서 버전만 (없으면 None)"""
+
+    @abc.abstractmethod
+    def create_document(self, file_id: str, document: dict):
+        """새 문서 저장 (편집 기록이 없으면 빈 기록)"""
+
+    @abc.abstractmethod
+    def save_document(self, file_id: str, document: dict, expected_version: int) -> bool:
+        """저장된 버전이 expected_version일 때만 문서를 교체 (다른 워커가 먼저 바꿨으면 False)
+
+        document에 편집 기록이 없으면 저장된 편집 기록은 그대로 둔다.
+        """
+
+    @abc.abstractmethod
+    def touch_document(self, file_id: str, accessed: float):
+        """마지막 접근 시각만 갱신 (버전은 그대로)"""
+
+    @abc.abstractmethod
+    def delete_document(self, file_id: str) -> Optional[dict]:
+        """문서를 지우고 지운 레코드 반환 (없으면 None, 편집 기록은 빠짐)"""
+
+    @abc.abstractmethod
+    def list_documents(self) -> list:
+        """[(file_id, 마지막 접근 시각)] 목록"""
+
+    @abc.abstractmethod
+    def get_blob(self, digest: str) -> Optional[dict]:
+        """원본 정보 {"size", "page_count", "refcount", ...} (없으면 None)"""
+
+    @abc.abstractmethod
+    def add_blob(self, digest: str, info: dict, refcount: int = 0) -> bool:
+        """원본 정보를 refcount와 함께 등록 (이미 있으면 그대로 두고 False)"""
+
+    @abc.abstractmethod
+    def adjust_refcount(self, digest: str, delta: int) -> Optional[int]:
+        """원본 refcount를 delta만큼 바꾸고 새 값 반환 (원본이 없으면 None)"""
+
+    @abc.abstractmethod
+    def delete_blob(self, digest: str, only_unused: bool = True) -> Optional[dict]:
+        """원본 정보 삭제 후 반환 (only_unused면 refcount가 0 이하일 때만)"""
+
+    @abc.abstractmethod
+    def count(self) -> dict:
+        """{"documents": 문서 수, "blobs": 원본 수}"""
+
+
+class MemoryStore(SessionStore):
+    """프로세스 안에서만 쓰는 저장소 (워커 하나로 실행하거나 테스트할 때)"""
+
+    def __init__(self):
+        self._documents = {}
+        self._blobs = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _copy(value: dict) -> dict:
+        # SQLite 저장소와 같은 동작이 되도록 JSON으로 왕복해 복사
+        return json.loads(json.dumps(value))
+
+    @staticmethod
+    def _without_history(document: dict) -> dict:
+        return {key: value for key, value in document.items() if key not in HISTORY_KEYS}
+
+    def get_document(self, file_id, history=False):
+        with self._lock:
+            document = self._documents.get(file_id)
+            if document is None:
+                return None
+            return self._copy(document if history else self._without_history(document))
+
+    def get_version(self, file_id):
+        with self._lock:
+            document = self._documents.get(file_id)
+            return None if document is None else document["version"]
+
+    def create_document(self, file_id, document):
+        with self._lock:
+            self._documents[file_id] = {"undo": [], "redo": [], **self._copy(document)}
+
+    def save_document(self, file_id, document, expected_version):
+        with self._lock:
+            current = self._documents.get(file_id)
+            if current is None or current["version"] != expected_version:
+                return False
+            document = self._copy(document)
+            if "undo" not in document:
+                document.update({key: current[key] for key in HISTORY_KEYS})
+            self._documents[file_id] = document
+            return True
+
+    def touch_document(self, file_id, accessed):
+        with self._lock:
+            document = self._documents.get(file_id)
+            if document is not None:
+                document["accessed"] = accessed
+
+    def delete_document(self, file_id):
+        with self._lock:
+            document = self._documents.pop(file_id, None)
+            return None if document is None else self._without_history(document)
+
+    def list_documents(self):
+        with self._lock:
+            return [(file_id, document["accessed"]) for file_id, document in self._documents.items()]
+
+    def get_blob(self, digest):
+        with self._lock:
+            blob = self._blobs.get(digest)
+            return None if blob is None else dict(blob)
+
+    def add_blob(self, digest, info, refcount=0):
+        with self._lock:
+            if digest in self._blobs:
+                return False
+            self._blobs[digest] = {**info, "refcount": refcount}
+            return True
+
+    def adjust_refcount(self, digest, delta):
+        with self._lock:
+            blob = self._blobs.get(digest)
+            if blob is None:
+                return None
+            blob["refcount"] += delta
+            return blob["refcount"]
+
+    def delete_blob(self, digest, only_unused=True):
+        with self._lock:
+            blob = self._blobs.get(digest)
+            if blob is None or (only_unused and blob["refcount"] > 0):
+                return None
+            return self._blobs.pop(digest)
+
+    def count(self):
+        with self._lock:
+            return {"documents": len(self._documents), "blobs": len(self._blobs)}
+
+
+class SqliteStore(SessionStore):
+    """SQLite(WAL 모드) 저장소, 같은 파일을 여러 워커 프로세스가 함께 사용"""
+
+    # data: 페이지 목록과 편집 기록을 뺀 나머지 (파일 이름, 참조하는 원본 등)
+    # pages: 페이지 참조 목록, history: {"undo", "redo"} 편집 기록
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS documents (
+            file_id TEXT PRIMARY KEY,
+            version INTEGER NOT NULL,
+            accessed REAL NOT NULL,
+            data TEXT NOT NULL,
+            pages TEXT NOT NULL DEFAULT '[]',
+            history TEXT NOT NULL DEFAULT '{"undo": [], "redo": []}'
+        );
+        CREATE TABLE IF NOT EXISTS blobs (
+            digest TEXT PRIMARY KEY,
+            refcount INTEGER NOT NULL DEFAULT 0,
+            data TEXT NOT NULL
+        );
+    """
+
+    def __init__(self, path):
+        self.path = str(path)
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(self.SCHEMA)
+        self._migrate(conn)
+
+    def _conn(self) -> sqlite3.Connection:
+        """현재 스레드의 연결 (스레드마다 하나씩)"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # isolation_level=None: 자동 커밋, 필요한 곳에서만 BEGIN IMMEDIATE 사용
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _migrate(conn: sqlite3.Connection):
+        """문서 전체를 data 열 하나에 담던 이전 스키마를 pages, history 열로 나눔
+
+        이전 형식의 편집 기록은 옮기지 않는다 (참조하던 원본은 다음 저장 때 놓아준다).
+        """
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(documents)")}
+            if "pages" not in columns:
+                conn.execute("ALTER TABLE documents ADD COLUMN pages TEXT NOT NULL DEFAULT '[]'")
+                conn.execute("""ALTER TABLE documents ADD COLUMN history TEXT NOT NULL DEFAULT '{"undo": [], "redo": []}'""")
+                for file_id, data in conn.execute("SELECT file_id, data FROM documents").fetchall():
+                    document = json.loads(data)
+                    pages = document.pop("pages", [])
+                    for key in HISTORY_KEYS:
+                        document.pop(key, None)
+                    conn.execute(
+                        "UPDATE documents SET data = ?, pages = ? WHERE file_id = ?",
+                        (json.dumps(document), json.dumps(pages), file_id),
+                    )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    @staticmethod
+    def _document(row) -> dict:
+        version, accessed, data, pages, *history = row
+        document = json.loads(data)
+        document["version"] = version
+        document["accessed"] = accessed
+        document["pages"] = json.loads(pages)
+        if history:
+            document.update(json.loads(history[0]))
+        return document
+
+    @staticmethod
+    def _data(document: dict) -> str:
+        skip = ("version", "accessed", "pages") + HISTORY_KEYS
+        return json.dumps({key: value for key, value in document.items() if key not in skip})
+
+    @staticmethod
+    def _history(document: dict) -> str:
+        return json.dumps({key: document.get(key, []) for key in HISTORY_KEYS})
+
+    def get_document(self, file_id, history=False):
+        columns = "version, accessed, data, pages" + (", history" if history else "")
+        row = self._conn().execute(
+            f"SELECT {columns} FROM documents WHERE file_id = ?", (file_id,)
+        ).fetchone()
+        return None if row is None else self._document(row)
+
+    def get_version(self, file_id):
+        row = self._conn().execute("SELECT version FROM documents WHERE file_id = ?", (file_id,)).fetchone()
+        return None if row is None else row[0]
+
+    def create_document(self, file_id, document):
+        self._conn().execute(
+            "INSERT INTO documents (file_id, version, accessed, data, pages, history) VALUES (?, ?, ?, ?, ?, ?)",
+            (file_id, document["version"], document["accessed"], self._data(document),
+             json.dumps(document["pages"]), self._history(document)),
+        )
+
+    def save_document(self, file_id, document, expected_version):
+        values = [document["version"], document["accessed"], self._data(document), json.dumps(document["pages"])]
+        assignments = "version = ?, accessed = ?, data = ?, pages = ?"
+        if "undo" in document:
+            assignments += ", history = ?"
+            values.append(self._history(document))
+        cursor = self._conn().execute(
+            f"UPDATE documents SET {assignments} WHERE file_id = ? AND version = ?",
+            (*values, file_id, expected_version),
+        )
+        return cursor.rowcount == 1
+
+    def touch_document(self, file_id, accessed):
+        self._conn().execute("UPDATE documents SET accessed = ? WHERE file_id = ?", (accessed, file_id))
+
+    def delete_document(self, file_id):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT version, accessed, data, pages FROM documents WHERE file_id = ?", (file_id,)
+            ).fetchone()
+            if row is not None:
+                conn.execute("DELETE FROM documents WHERE file_id = ?", (file_id,))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return None if row is None else self._document(row)
+
+    def list_documents(self):
+        return self._conn().execute("SELECT file_id, accessed FROM documents").fetchall()
+
+    def get_blob(self, digest):
+        row = self._conn().execute("SELECT refcount, data FROM blobs WHERE digest = ?", (digest,)).fetchone()
+        if row is None:
+            return None
+        return {**json.loads(row[1]), "refcount": row[0]}
+
+    def add_blob(self, digest, info, refcount=0):
+        data = json.dumps({key: value for key, value in info.items() if key != "refcount"})
+        cursor = self._conn().execute(
+            "INSERT OR IGNORE INTO blobs (digest, refcount, data) VALUES (?, ?, ?)", (digest, refcount, data)
+        )
+        return cursor.rowcount == 1
+
+    def adjust_refcount(self, digest, delta):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("UPDATE blobs SET refcount = refcount + ? WHERE digest = ?", (delta, digest))
+            row = conn.execute("SELECT refcount FROM blobs WHERE digest = ?", (digest,)).fetchone()
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return None if row is None else row[0]
+
+    def delete_blob(self, digest, only_unused=True):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            blob = self.get_blob(digest)
+            if blob is None or (only_unused and blob["refcount"] > 0):
+                blob = None
+            else:
+                conn.execute("DELETE FROM blobs WHERE digest = ?", (digest,))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return blob
+
+    def count(self):
+        conn = self._conn()
+        documents = conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+        blob_count = conn.execute("SELECT COUNT(*) FROM blobs").fetchone()[0]
+        return {"documents": documents, "blobs": blob_count}
+
+
+def create_store(kind: str, path=None) -> SessionStore:
+    """설정 이름으로 저장소 생성 ("sqlite" 또는 "memory")"""
+    if kind == "memory":
+        return MemoryStore()
+    if kind == "sqlite":
+        return SqliteStore(path)
+    raise ValueError(f"Unknown session store: {kind}")
@@ -152,6 +152,7 @@ document.getElementById('btn-open').addEventListener('click', () => fileInput.cl
 fileInput.addEventListener('change', handleFileUpload);
 document.getElementById('btn-merge').addEventListener('click', handleMergeClick);
 document.getElementById('btn-undo').addEventListener('click', undoLastAction);
+document.getElementById('btn-redo').addEventListener('click', redoLastAction);
 document.getElementById('btn-save').addEventListener('click', savePdf);
 document.getElementById('btn-save-as').addEventListener('click', savePdfAs);
 document.getElementById('btn-zoom-in').addEventListener('click', () => zoom(1.2));
@@ -255,6 +256,8 @@ async function switchTab(tabId) {
         tabElement.classList.add('active');
     }
     
+    subscribeDocument(tabId);
+    
     // PDF 로드 및 표시
     if (!tabs[tabId].pdf) {
         await loadPdf(tabId);
@@ -282,6 +285,10 @@ function closeTab(tabId, event) {
         return;
     }
     
+    if (tabs[tabId].events) {
+        tabs[tabId].events.close();
+    }
+    releaseFile(tabs[tabId].fileId);
     delete tabs[tabId];
     document.querySelector(`[data-tab-id="${tabId}"]`).remove();
     
@@ -299,21 +306,57 @@ function closeTab(tabId, event) {
     }
 }
 
+// 서버 문서 닫기 (더 이상 쓰지 않는 원본 정리)
+function releaseFile(fileId) {
+    fetch(`/api/pdf/${fileId}`, { method: 'DELETE' }).catch(() => {});
+}
+
+// 문서 변경 알림 구독 (편집할 때마다 서버가 버전, 페이지 수, Undo/Redo 상태를 보내 줌)
+function subscribeDocument(tabId) {
+    const tab = tabs[tabId];
+    if (!tab || tab.events) return;
+
+    // 브라우저의 호스트당 연결 수 제한이 있으므로 현재 탭 문서만 구독 (다시 구독하면 state 이벤트로 동기화)
+    Object.values(tabs).forEach(other => {
+        if (other !== tab && other.events) {
+            other.events.close();
+            other.events = null;
+        }
+    });
+
+    const events = new EventSource(`/api/pdf/${tab.fileId}/events`);
+    const applyState = (event) => {
+        if (!tabs[tabId]) return;
+        const state = JSON.parse(event.data);
+        tab.version = state.version;
+        tab.pageCount = state.page_count;
+        tab.history = { canUndo: state.undo_count > 0, canRedo: state.redo_count > 0 };
+        tab.currentPage = Math.min(tab.currentPage, tab.pageCount);
+        if (tabId === currentTabId) {
+            updateUndoButton();
+        }
+    };
+    events.addEventListener('state', applyState);
+    events.addEventListener('change', applyState);
+    events.addEventListener('closed', () => events.close());
+    tab.events = events;
+}
+
 // PDF 로드
 async function loadPdf(tabId) {
     if (!tabs[tabId]) return;
 
+    subscribeDocument(tabId);
     try {
-        const response = await fetch(`/api/pdf/${tabs[tabId].fileId}`);
-        if (!response.ok) {
-            throw new Error(`HTTP error! status: ${response.status}`);
-        }
-        const arrayBuffer = await response.arrayBuffer();
+        // URL로 열면 pdf.js가 범위 요청으로 필요한 부분만 받아온다
+        const loadingTask = pdfjsLib.getDocument({ url: `/api/pdf/${tabs[tabId].fileId}` });
+        tabs[tabId].pdf = null;
+        tabs[tabId].pdfLoading = loadingTask.promise;
         
-        const loadingTask = pdfjsLib.getDocument({ data: arrayBuffer });
+        // PDF를 받는 동안 페이지 요약으로 페이지 자리부터 배치
+        const rendering = renderAllPages(tabId);
         tabs[tabId].pdf = await loadingTask.promise;
-        
-        await renderAllPages(tabId);
+        await rendering;
     } catch (error) {
         console.error('Error loading PDF:', error);
         // 에러가 발생해도 합치기는 완료되었을 수 있으므로 조용히 처리
@@ -321,42 +364,81 @@ async function loadPdf(tabId) {
     }
 }
 
-// 모든 페이지 렌더링 (성능 최적화)
+// 페이지 요약 가져오기: [폭, 높이, 회전 각도, 이미지 있음, 글자 있음] 목록
+async function fetchManifest(tabId) {
+    const response = await fetch(`/api/pdf/${tabs[tabId].fileId}/manifest`);
+    if (!response.ok) {
+        throw new Error('페이지 정보를 가져오지 못했습니다.');
+    }
+    return (await response.json()).pages;
+}
+
+// 화면 근처에 온 페이지만 렌더링하는 observer
+let renderObserver = null;
+
+// 모든 페이지 자리를 만들고 화면 근처에 온 페이지만 렌더링 (성능 최적화)
 async function renderAllPages(tabId) {
-    if (!tabs[tabId] || !tabs[tabId].pdf) return;
+    if (!tabs[tabId]) return;
+
+    const tab = tabs[tabId];
+    const manifest = await fetchManifest(tabId);
+    // 탭이 변경되었는지 확인
+    if (tabId !== currentTabId || !tabs[tabId]) return;
 
     const container = pdfContainer;
     container.innerHTML = '';
-    
-    const tab = tabs[tabId];
-    const pageCanvases = [];
+    tab.pageCount = manifest.length;
 
-    // 순차 렌더링으로 초기 로딩 속도 개선
-    // 첫 몇 페이지만 먼저 렌더링하고 나머지는 지연 로딩
-    const initialPages = Math.min(3, tab.pageCount);
-    
-    for (let pageNum = 1; pageNum <= initialPages; pageNum++) {
-        // 탭이 변경되었는지 확인
-        if (tabId !== currentTabId || !tabs[tabId]) return;
-        await renderPage(tabId, pageNum, container, pageCanvases);
+    if (renderObserver) {
+        renderObserver.disconnect();
     }
-    
-    // 나머지 페이지는 백그라운드에서 렌더링
-    if (tab.pageCount > initialPages) {
-        setTimeout(async () => {
-            // 탭이 변경되었는지 확인
-            if (tabId !== currentTabId || !tabs[tabId]) return;
-            
-            for (let pageNum = initialPages + 1; pageNum <= tab.pageCount; pageNum++) {
-                if (tabId !== currentTabId || !tabs[tabId]) return;
-                await renderPage(tabId, pageNum, container, pageCanvases);
-            }
-            // 렌더링 완료 후 observer 재설정 (현재 탭인지 확인)
-            if (tabId === currentTabId && tabs[tabId]) {
-                setupScrollObserver(tabId);
+    renderObserver = new IntersectionObserver((entries, observer) => {
+        entries.forEach(entry => {
+            if (!entry.isIntersecting) return;
+            observer.unobserve(entry.target);
+            renderPage(tabId, entry.target).catch(error => console.error('Error rendering page:', error));
+        });
+    }, {
+        root: container,
+        rootMargin: '100% 0px' // 화면 위아래 한 화면 거리까지 미리 렌더링
+    });
+
+    manifest.forEach(([width, height, rotation], i) => {
+        // 90/270도 회전한 페이지는 가로세로가 바뀜
+        const pageWidth = rotation % 180 === 0 ? width : height;
+        const pageHeight = rotation % 180 === 0 ? height : width;
+        
+        // 모바일에서 스케일 조정
+        let scale = tab.scale;
+        if (isMobileDevice) {
+            // 모바일에서는 기본 스케일을 화면 크기에 맞게 조정
+            const maxWidth = window.innerWidth - 20;
+            if (pageWidth > maxWidth) {
+                scale = (maxWidth / pageWidth) * tab.scale;
             }
-        }, 100);
-    }
+        }
+
+        const pageCanvas = document.createElement('canvas');
+        pageCanvas.width = Math.floor(pageWidth * scale);
+        pageCanvas.height = Math.floor(pageHeight * scale);
+        pageCanvas.style.display = 'block';
+        pageCanvas.style.margin = '10px auto';
+        pageCanvas.style.border = '1px solid #ccc';
+        pageCanvas.style.boxShadow = '0 2px 4px rgba(0,0,0,0.1)';
+        pageCanvas.style.background = 'white';
+        pageCanvas.className = 'pdf-page-canvas';
+        pageCanvas.dataset.pageNum = i + 1;
+        pageCanvas.dataset.scale = scale;
+        
+        // 모바일에서 캔버스 크기 조정
+        if (isMobileDevice) {
+            pageCanvas.style.maxWidth = '100%';
+            pageCanvas.style.height = 'auto';
+        }
+
+        container.appendChild(pageCanvas);
+        renderObserver.observe(pageCanvas);
+    });
 
     // 페이지 클릭 이벤트 (이벤트 위임으로 최적화 - 한 번만 등록)
     if (!container.dataset.clickListenerAdded) {
@@ -378,49 +460,24 @@ async function renderAllPages(tabId) {
     }
 }
 
-// 개별 페이지 렌더링 (성능 최적화)
-async function renderPage(tabId, pageNum, container, pageCanvases) {
+// 자리만 잡아 둔 캔버스에 페이지 렌더링
+async function renderPage(tabId, pageCanvas) {
     const tab = tabs[tabId];
-    const page = await tab.pdf.getPage(pageNum);
-    
-    // 모바일에서 스케일 조정
-    let scale = tab.scale;
-    if (isMobileDevice) {
-        // 모바일에서는 기본 스케일을 화면 크기에 맞게 조정
-        const baseViewport = page.getViewport({ scale: 1.0 });
-        const maxWidth = window.innerWidth - 20;
-        if (baseViewport.width > maxWidth) {
-            scale = (maxWidth / baseViewport.width) * tab.scale;
-        }
-    }
-    
-    const viewport = page.getViewport({ scale: scale });
+    const pdf = tab.pdf || await tab.pdfLoading;
+    // 기다리는 동안 탭이 바뀌었거나 다시 배치되었으면 중단
+    if (tabId !== currentTabId || !pageCanvas.isConnected) return;
 
-    const pageCanvas = document.createElement('canvas');
-    const pageCtx = pageCanvas.getContext('2d');
-    pageCanvas.height = viewport.height;
+    const page = await pdf.getPage(parseInt(pageCanvas.dataset.pageNum));
+    const viewport = page.getViewport({ scale: parseFloat(pageCanvas.dataset.scale) });
     pageCanvas.width = viewport.width;
-    pageCanvas.style.display = 'block';
-    pageCanvas.style.margin = '10px auto';
-    pageCanvas.style.border = '1px solid #ccc';
-    pageCanvas.style.boxShadow = '0 2px 4px rgba(0,0,0,0.1)';
-    pageCanvas.className = 'pdf-page-canvas';
-    pageCanvas.dataset.pageNum = pageNum;
-    
-    // 모바일에서 캔버스 크기 조정
-    if (isMobileDevice) {
-        pageCanvas.style.maxWidth = '100%';
-        pageCanvas.style.height = 'auto';
-    }
+    pageCanvas.height = viewport.height;
 
     const renderContext = {
-        canvasContext: pageCtx,
+        canvasContext: pageCanvas.getContext('2d'),
         viewport: viewport
     };
 
     await page.render(renderContext).promise;
-    container.appendChild(pageCanvas);
-    pageCanvases.push(pageCanvas);
 }
 
 // 스크롤 감지 및 현재 페이지 업데이트 (성능 최적화)
@@ -654,6 +711,7 @@ async function handleAddPages(event) {
                 insert_position: position - 1 // 0-based index
             })
         });
+        releaseFile(sourceFileId);
 
         if (addResponse.ok) {
             const result = await addResponse.json();
@@ -762,6 +820,12 @@ async function handleMergeFiles(event) {
     }
 
     try {
+        // 선택한 파일을 한 번의 요청으로 보내 서버에서 한 번에 합침
+        const formData = new FormData();
+        for (const file of files) {
+            formData.append('files', file);
+        }
+        
         if (mergeOption && currentTabId) {
             // 열려있는 파일과 합치기
             const activeTabId = currentTabId; // 현재 탭 ID 저장
@@ -773,46 +837,22 @@ async function handleMergeFiles(event) {
                 return;
             }
             
-            for (const file of files) {
-                // 탭이 변경되었는지 확인
-                if (currentTabId !== activeTabId || !tabs[activeTabId]) {
-                    alert('탭이 변경되어 합치기가 취소되었습니다.');
-                    mergeFileInput.value = '';
-                    return;
-                }
-                
-                const formData = new FormData();
-                formData.append('file', file);
-                
-                const uploadResponse = await fetch('/api/upload', {
-                    method: 'POST',
-                    body: formData
-                });
-                
-                const uploadData = await uploadResponse.json();
-                const sourceFileId = uploadData.file_id;
-                const sourcePageCount = uploadData.page_count;
-                
-                // 모든 페이지 추가
-                const pages = Array.from({ length: sourcePageCount }, (_, i) => i);
-                
-                const addResponse = await fetch(`/api/pdf/${tab.fileId}/pages/add-range`, {
-                    method: 'POST',
-                    headers: { 'Content-Type': 'application/json' },
-                    body: JSON.stringify({
-                        source_file_id: sourceFileId,
-                        pages: pages,
-                        insert_position: insertPosition - 1
-                    })
-                });
-                
-                if (addResponse.ok) {
-                    const result = await addResponse.json();
-                    tab.pageCount = result.page_count;
-                    insertPosition += sourcePageCount; // 다음 파일은 그 뒤에 추가
-                }
+            formData.append('file_id', tab.fileId);
+            formData.append('insert_position', insertPosition - 1);
+            
+            const mergeResponse = await fetch('/api/merge', {
+                method: 'POST',
+                body: formData
+            });
+            
+            if (!mergeResponse.ok) {
+                const error = await mergeResponse.json();
+                throw new Error(error.detail || '서버 오류');
             }
             
+            const result = await mergeResponse.json();
+            tab.pageCount = result.page_count;
+            
             // 현재 탭이 여전히 활성인지 확인
             if (currentTabId !== activeTabId || !tabs[activeTabId] || tabs[activeTabId].fileId !== tab.fileId) {
                 alert('탭이 변경되어 업데이트가 취소되었습니다.');
@@ -821,9 +861,7 @@ async function handleMergeFiles(event) {
             }
             
             // PDF 다시 로드 (파일이 업데이트되었으므로)
-            const response = await fetch(`/api/pdf/${tab.fileId}`);
-            const arrayBuffer = await response.arrayBuffer();
-            const loadingTask = pdfjsLib.getDocument({ data: arrayBuffer });
+            const loadingTask = pdfjsLib.getDocument({ url: `/api/pdf/${tab.fileId}` });
             tab.pdf = await loadingTask.promise;
             
             // 현재 탭 확인 후 렌더링
@@ -838,57 +876,28 @@ async function handleMergeFiles(event) {
             }
         } else {
             // 선택한 파일들만 합치기 (새 탭 생성)
-            const formData = new FormData();
-            formData.append('file', files[0]);
+            formData.append('filename', mergedFilename || 'merged.pdf');
             
-            const firstResponse = await fetch('/api/upload', {
+            const mergeResponse = await fetch('/api/merge', {
                 method: 'POST',
                 body: formData
             });
             
-            const firstData = await firstResponse.json();
-            let currentFileId = firstData.file_id;
-            let currentPageCount = firstData.page_count;
-            
-            // 나머지 파일들 추가
-            for (let i = 1; i < files.length; i++) {
-                const fileFormData = new FormData();
-                fileFormData.append('file', files[i]);
-                
-                const uploadResponse = await fetch('/api/upload', {
-                    method: 'POST',
-                    body: fileFormData
-                });
-                
-                const uploadData = await uploadResponse.json();
-                const sourceFileId = uploadData.file_id;
-                const sourcePageCount = uploadData.page_count;
-                const pages = Array.from({ length: sourcePageCount }, (_, i) => i);
-                
-                const addResponse = await fetch(`/api/pdf/${currentFileId}/pages/add-range`, {
-                    method: 'POST',
-                    headers: { 'Content-Type': 'application/json' },
-                    body: JSON.stringify({
-                        source_file_id: sourceFileId,
-                        pages: pages,
-                        insert_position: currentPageCount
-                    })
-                });
-                
-                if (addResponse.ok) {
-                    const result = await addResponse.json();
-                    currentPageCount = result.page_count;
-                }
+            if (!mergeResponse.ok) {
+                const error = await mergeResponse.json();
+                throw new Error(error.detail || '서버 오류');
             }
             
+            const result = await mergeResponse.json();
+            
             // 새 탭 생성
             const tabId = `tab_${tabCounter++}`;
             tabs[tabId] = {
-                fileId: currentFileId,
-                pageCount: currentPageCount,
+                fileId: result.file_id,
+                pageCount: result.page_count,
                 currentPage: 1,
                 scale: 1.0,
-                filename: mergedFilename || 'merged.pdf',
+                filename: result.filename,
                 pdf: null
             };
             
@@ -1010,25 +1019,72 @@ async function deletePage() {
     }
 }
 
+// 백그라운드 작업 등록 후 끝날 때까지 진행률 전달 (긴 작업이 한 요청에 묶여 시간 초과되지 않도록)
+async function runJob(payload, onProgress) {
+    const response = await fetch('/api/jobs', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify(payload)
+    });
+    if (!response.ok) {
+        const error = await response.json();
+        throw new Error(error.detail || '서버 오류');
+    }
+    const { job_id: jobId } = await response.json();
+
+    return new Promise((resolve, reject) => {
+        const events = new EventSource(`/api/jobs/${jobId}/events`);
+        events.addEventListener('progress', (event) => {
+            if (onProgress) onProgress(JSON.parse(event.data));
+        });
+        events.addEventListener('done', (event) => {
+            events.close();
+            resolve(JSON.parse(event.data));
+        });
+        events.addEventListener('failed', (event) => {
+            events.close();
+            reject(new Error(JSON.parse(event.data).error || '작업 실패'));
+        });
+        events.addEventListener('cancelled', () => {
+            events.close();
+            reject(new Error('작업이 취소되었습니다.'));
+        });
+        // 연결이 끊기면 EventSource가 자동으로 다시 연결함
+    });
+}
+
+// 현재 문서를 백그라운드 작업으로 만들어 다운로드
+async function downloadPdf(filename) {
+    const tab = tabs[currentTabId];
+    const saveButtons = [document.getElementById('btn-save'), document.getElementById('btn-save-as')];
+    const labels = saveButtons.map(button => button.textContent);
+    saveButtons.forEach(button => button.disabled = true);
+
+    try {
+        const job = await runJob({ kind: 'export', file_id: tab.fileId }, (job) => {
+            if (job.total) {
+                saveButtons[0].textContent = `저장 중 ${Math.floor(job.done * 100 / job.total)}%`;
+            }
+        });
+        const a = document.createElement('a');
+        a.href = `/api/jobs/${job.job_id}/result`;
+        a.download = filename;
+        a.click();
+    } finally {
+        saveButtons.forEach((button, i) => {
+            button.textContent = labels[i];
+            button.disabled = false;
+        });
+    }
+}
+
 // 저장
 async function savePdf() {
     if (!currentTabId || !tabs[currentTabId]) return;
 
     try {
-        const tab = tabs[currentTabId];
-        const response = await fetch(`/api/pdf/${tab.fileId}/download`);
-        if (response.ok) {
-            const blob = await response.blob();
-            const url = window.URL.createObjectURL(blob);
-            const a = document.createElement('a');
-            a.href = url;
-            a.download = tab.filename;
-            a.click();
-            window.URL.revokeObjectURL(url);
-            alert('저장 완료');
-        } else {
-            alert('저장 실패');
-        }
+        await downloadPdf(tabs[currentTabId].filename);
+        alert('저장 완료');
     } catch (error) {
         console.error('Error saving PDF:', error);
         alert('저장 실패');
@@ -1042,20 +1098,8 @@ async function savePdfAs() {
     if (!filename) return;
 
     try {
-        const tab = tabs[currentTabId];
-        const response = await fetch(`/api/pdf/${tab.fileId}/download`);
-        if (response.ok) {
-            const blob = await response.blob();
-            const url = window.URL.createObjectURL(blob);
-            const a = document.createElement('a');
-            a.href = url;
-            a.download = filename;
-            a.click();
-            window.URL.revokeObjectURL(url);
-            alert('저장 완료');
-        } else {
-            alert('저장 실패');
-        }
+        await downloadPdf(filename);
+        alert('저장 완료');
     } catch (error) {
         console.error('Error saving PDF:', error);
         alert('저장 실패');
@@ -1088,9 +1132,44 @@ async function undoLastAction() {
     }
 }
 
+// Redo 기능
+async function redoLastAction() {
+    if (!currentTabId || !tabs[currentTabId]) return;
+
+    try {
+        const tab = tabs[currentTabId];
+        const response = await fetch(`/api/pdf/${tab.fileId}/redo`, {
+            method: 'POST'
+        });
+
+        if (response.ok) {
+            const data = await response.json();
+            tab.pageCount = data.page_count;
+            await loadPdf(currentTabId);
+            updatePageList(currentTabId);
+            updateUndoButton();
+        } else {
+            const error = await response.json();
+            alert(error.detail || 'Redo 실패');
+        }
+    } catch (error) {
+        console.error('Error redoing action:', error);
+        alert('Redo 실패');
+    }
+}
+
 async function updateUndoButton() {
     if (!currentTabId || !tabs[currentTabId]) {
         document.getElementById('btn-undo').disabled = true;
+        document.getElementById('btn-redo').disabled = true;
+        return;
+    }
+
+    // 변경 알림으로 받은 상태가 있으면 서버에 다시 묻지 않음
+    const history = tabs[currentTabId].history;
+    if (history) {
+        document.getElementById('btn-undo').disabled = !history.canUndo;
+        document.getElementById('btn-redo').disabled = !history.canRedo;
         return;
     }
 
@@ -1100,9 +1179,11 @@ async function updateUndoButton() {
         if (response.ok) {
             const data = await response.json();
             document.getElementById('btn-undo').disabled = !data.can_undo;
+            document.getElementById('btn-redo').disabled = !data.can_redo;
         }
     } catch (error) {
         document.getElementById('btn-undo').disabled = true;
+        document.getElementById('btn-redo').disabled = true;
     }
 }
 
@@ -0,0 +1,178 @@
+"""app 편집 기록, 작업 적용, 범위 요청 테스트 (저장소 루트에서 python -m pytest tests)"""
+import pytest
+
+
+@pytest.fixture(scope="module")
+def web_app(tmp_path_factory):
+    # app은 import할 때 현재 디렉터리에 temp/를 만들고 static/을 찾으므로 임시 디렉터리에서 불러온다
+    with pytest.MonkeyPatch.context() as mp:
+        work = tmp_path_factory.mktemp("app")
+        (work / "static").mkdir()
+        mp.chdir(work)
+        mp.setenv("SESSION_STORE", "memory")
+        import app
+        yield app
+
+
+def refs(*labels):
+    return [["d1", label, 0] for label in labels]
+
+
+def make_document(pages):
+    return {"pages": pages, "undo": [], "redo": []}
+
+
+def edit(web_app, document, operations):
+    before = document["pages"]
+    pages, _ = web_app.apply_operations(before, operations)
+    web_app.save_undo_state(document, before, pages)
+    document["pages"] = pages
+
+
+@pytest.mark.parametrize("before, after", [
+    (refs(0, 1, 2, 3), refs(0, 1, 2, 3)),
+    (refs(0, 1, 2, 3), refs(0, 2, 3)),
+    (refs(0, 1, 2, 3), refs(0, 1, 9, 2, 3)),
+    (refs(0, 1, 2, 3), refs(3, 2, 1, 0)),
+    (refs(0, 1, 2, 3), refs(0, 3, 1, 2)),
+    (refs(0, 1, 0, 1), refs(1, 0, 1, 0)),
+    (refs(0, 1), []),
+    ([], refs(0, 1)),
+])
+def test_history_delta_round_trip(web_app, before, after):
+    document = make_document(before)
+    web_app.save_undo_state(document, before, after)
+    document["pages"] = after
+
+    web_app.undo_document(document)
+    assert document["pages"] == before
+    web_app.redo_document(document)
+    assert document["pages"] == after
+
+
+def test_history_delta_stores_only_changed_span(web_app):
+    before = refs(*range(100))
+    after = before[:50] + [before[51], before[50]] + before[52:]
+    assert web_app.history_delta(before, after) == {"start": 50, "removed": refs(50, 51), "added": [1, 0]}
+
+    after = before[:10] + before[11:]
+    assert web_app.history_delta(before, after) == {"start": 10, "removed": refs(10), "added": []}
+
+    rotated = [list(ref) for ref in before]
+    rotated[7][2] = 90
+    assert web_app.history_delta(before, rotated) == {"start": 7, "removed": refs(7), "added": [["d1", 7, 90]]}
+
+
+def test_undo_redo_past_max_undo(web_app):
+    document = make_document(refs(*range(6)))
+    states = [document["pages"]]
+    for step in range(web_app.MAX_UNDO + 3):
+        edit(web_app, document, [{"op": "move", "from": step % 6, "to": (step * 5 + 1) % 6},
+                                 {"op": "rotate", "page": step % 6}])
+        states.append(document["pages"])
+    assert len(document["undo"]) == web_app.MAX_UNDO
+
+    # 오래된 기록은 버려지므로 MAX_UNDO번까지만 되돌린다
+    for state in reversed(states[-web_app.MAX_UNDO - 1:-1]):
+        web_app.undo_document(document)
+        assert document["pages"] == state
+    with pytest.raises(web_app.HTTPException) as excinfo:
+        web_app.undo_document(document)
+    assert excinfo.value.status_code == 400
+
+    for state in states[-web_app.MAX_UNDO:]:
+        web_app.redo_document(document)
+        assert document["pages"] == state
+    with pytest.raises(web_app.HTTPException):
+        web_app.redo_document(document)
+
+
+def test_new_edit_clears_redo(web_app):
+    document = make_document(refs(0, 1, 2))
+    edit(web_app, document, [{"op": "delete", "page": 0}])
+    web_app.undo_document(document)
+    edit(web_app, document, [{"op": "swap", "from": 0, "to": 2}])
+    assert document["redo"] == []
+    assert document["pages"] == refs(2, 1, 0)
+
+
+def test_apply_operations_index_map(web_app):
+    pages = refs(0, 1, 2, 3, 4)
+    assert web_app.apply_operations(pages, [{"op": "move", "from": 0, "to": 3}]) == (
+        refs(1, 2, 3, 0, 4), [3, 0, 1, 2, 4])
+    assert web_app.apply_operations(pages, [{"op": "swap", "from": 1, "to": 4}]) == (
+        refs(0, 4, 2, 3, 1), [0, 4, 2, 3, 1])
+    assert web_app.apply_operations(pages, [{"op": "permute", "order": [4, 3, 2, 1, 0]}]) == (
+        refs(4, 3, 2, 1, 0), [4, 3, 2, 1, 0])
+    assert web_app.apply_operations(pages, [{"op": "move_pages", "pages": [3, 1], "before": 0}]) == (
+        refs(1, 3, 0, 2, 4), [2, 0, 3, 1, 4])
+    assert web_app.apply_operations(pages, [{"op": "delete", "page": 2}, {"op": "delete", "page": 0}]) == (
+        refs(1, 3, 4), [None, 0, None, 1, 2])
+
+    rotated, index_map = web_app.apply_operations(pages, [{"op": "rotate", "page": 1, "angle": -90}])
+    assert rotated[1] == ["d1", 1, 270]
+    assert index_map == [0, 1, 2, 3, 4]
+    # 입력 목록은 바꾸지 않음
+    assert pages == refs(0, 1, 2, 3, 4)
+
+
+def test_apply_operations_insert(web_app):
+    web_app.store.create_document("test-source", {"pages": [["d2", 0, 0], ["d2", 1, 90]], "undo": [], "redo": []})
+    pages, index_map = web_app.apply_operations(refs(0, 1, 2), [
+        {"op": "insert", "source_file_id": "test-source", "pages": [1, 0], "position": 1},
+        {"op": "insert", "source_file_id": "test-source", "pages": [0]},
+    ])
+    assert pages == [["d1", 0, 0], ["d2", 1, 90], ["d2", 0, 0], ["d1", 1, 0], ["d1", 2, 0], ["d2", 0, 0]]
+    assert index_map == [0, 3, 4]
+
+
+@pytest.mark.parametrize("operation", [
+    {"op": "move", "from": True, "to": 0},
+    {"op": "delete", "page": 3},
+    {"op": "delete", "page": -1},
+    {"op": "rotate", "page": 0, "angle": 45},
+    {"op": "permute", "order": [0, 0, 1]},
+    {"op": "move_pages", "pages": [0, 0], "before": 1},
+    {"op": "insert", "source_file_id": "missing", "pages": [0]},
+    {"op": "flip"},
+])
+def test_apply_operations_rejects_invalid(web_app, operation):
+    with pytest.raises(ValueError):
+        web_app.apply_operations(refs(0, 1, 2), [operation])
+
+
+@pytest.mark.parametrize("position", [True, -1, 4, 1.0, "1"])
+def test_apply_operations_rejects_invalid_insert_position(web_app, position):
+    web_app.store.create_document("test-source", {"pages": refs(0), "undo": [], "redo": []})
+    with pytest.raises(ValueError):
+        web_app.apply_operations(refs(0, 1, 2), [
+            {"op": "insert", "source_file_id": "test-source", "pages": [0], "position": position}])
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("bytes=0-99", (0, 99)),
+    ("bytes=10-", (10, 99)),
+    ("bytes=50-500", (50, 99)),
+    ("bytes=99-99", (99, 99)),
+    ("bytes=-10", (90, 99)),
+    ("bytes=-500", (0, 99)),
+    (" Bytes = 5-6", (5, 6)),
+    # 처리하지 않는 범위는 전체 응답
+    ("items=0-10", None),
+    ("bytes=0-1,5-6", None),
+])
+def test_parse_range(web_app, header, expected):
+    assert web_app.parse_range(header, 100) == expected
+
+
+@pytest.mark.parametrize("header, size", [
+    ("bytes=100-", 100),
+    ("bytes=20-10", 100),
+    ("bytes=-0", 100),
+    ("bytes=a-b", 100),
+    ("bytes=-", 100),
+    ("bytes=0-", 0),
+])
+def test_parse_range_rejects(web_app, header, size):
+    with pytest.raises(ValueError):
+        web_app.parse_range(header, size)
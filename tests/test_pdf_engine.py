@@ -0,0 +1,65 @@
+"""pdf_engine 엔진 테스트 (저장소 루트에서 python -m pytest tests)"""
+import pytest
+
+import pdf_engine
+
+pytestmark = pytest.mark.skipif(not pdf_engine.HAS_PYMUPDF, reason="PyMuPDF not installed")
+
+
+def write_pdf(path, pages):
+    """페이지마다 "P0", "P1", ... 글자를 쓴 PDF"""
+    import fitz
+    doc = fitz.open()
+    for index in range(pages):
+        doc.new_page(width=200, height=200).insert_text((50, 100), f"P{index}")
+    doc.save(str(path))
+    doc.close()
+    return path
+
+
+def page_labels(path):
+    import fitz
+    with fitz.open(str(path)) as doc:
+        return [(page.get_text().strip(), page.rotation) for page in doc]
+
+
+@pytest.fixture
+def engine():
+    return pdf_engine.PymupdfEngine()
+
+
+def test_select_keeps_order_with_duplicate_pages(engine, tmp_path):
+    doc = engine.open(write_pdf(tmp_path / "a.pdf", 3))
+    doc = engine.select(doc, [2, 0, 2, 1, 0])
+    assert engine.page_count(doc) == 5
+    engine.write(doc, tmp_path / "out.pdf")
+    engine.close(doc)
+    assert page_labels(tmp_path / "out.pdf") == [("P2", 0), ("P0", 0), ("P2", 0), ("P1", 0), ("P0", 0)]
+
+
+def test_select_duplicates_rotate_independently(engine, tmp_path):
+    doc = engine.open(write_pdf(tmp_path / "a.pdf", 2))
+    doc = engine.select(doc, [1, 1, 0, 1])
+    doc = engine.rotate(doc, 0, 90)
+    doc = engine.rotate(doc, 3, 180)
+    engine.write(doc, tmp_path / "out.pdf")
+    engine.close(doc)
+    assert page_labels(tmp_path / "out.pdf") == [("P1", 90), ("P1", 0), ("P0", 0), ("P1", 180)]
+
+
+def test_select_can_drop_pages(engine, tmp_path):
+    doc = engine.open(write_pdf(tmp_path / "a.pdf", 4))
+    doc = engine.select(doc, [3, 1])
+    engine.write(doc, tmp_path / "out.pdf")
+    engine.close(doc)
+    assert page_labels(tmp_path / "out.pdf") == [("P3", 0), ("P1", 0)]
+
+
+def test_assemble_interleaved_sources(engine, tmp_path):
+    a = engine.open(write_pdf(tmp_path / "a.pdf", 3))
+    b = engine.open(write_pdf(tmp_path / "b.pdf", 2))
+    doc = engine.assemble([(a, 0), (b, 1), (a, 2), (b, 1), (a, 0)])
+    engine.write(doc, tmp_path / "out.pdf")
+    for opened in (doc, a, b):
+        engine.close(opened)
+    assert [label for label, _ in page_labels(tmp_path / "out.pdf")] == ["P0", "P1", "P2", "P1", "P0"]
@@ -0,0 +1,61 @@
+"""pdf_worker 작업 함수 테스트 (저장소 루트에서 python -m pytest tests)"""
+import pypdf
+import pytest
+
+import pdf_worker
+
+
+def write_pdf(path, pages):
+    writer = pypdf.PdfWriter()
+    for _ in range(pages):
+        writer.add_blank_page(width=200, height=200)
+    with open(path, "wb") as f:
+        writer.write(f)
+    return path
+
+
+@pytest.fixture
+def restore_cache_size():
+    yield
+    pdf_worker.reader_cache_bytes = pdf_worker.READER_CACHE_BYTES
+
+
+def test_reader_cache_hits_until_file_changes(tmp_path):
+    cache = pdf_worker.ReaderCache(10 * 1024 * 1024)
+    path = write_pdf(tmp_path / "a.pdf", 2)
+    assert cache.get(path)["page_count"] == 2
+    assert cache.get(path)["page_count"] == 2
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    write_pdf(path, 3)
+    assert cache.get(path)["page_count"] == 3
+    assert cache.misses == 2
+
+
+def test_reader_cache_drops_deleted_files_on_next_miss(tmp_path):
+    cache = pdf_worker.ReaderCache(10 * 1024 * 1024)
+    deleted = write_pdf(tmp_path / "a.pdf", 2)
+    cache.get(deleted)
+    deleted.unlink()
+
+    cache.get(write_pdf(tmp_path / "b.pdf", 1))
+    stats = cache.stats()
+    assert stats["entries"] == 1
+    assert stats["bytes"] == cache.get(tmp_path / "b.pdf")["bytes"]
+
+
+def test_reader_cache_evicts_least_recently_used(tmp_path):
+    paths = [write_pdf(tmp_path / f"{i}.pdf", 1) for i in range(3)]
+    cache = pdf_worker.ReaderCache(1)
+    for path in paths:
+        cache.get(path)
+    # 최근 항목 하나는 크기와 상관없이 남김
+    assert cache.stats()["entries"] == 1
+    assert cache.evictions == 2
+
+
+def test_warm_up_splits_budget_between_workers(restore_cache_size):
+    pdf_worker.warm_up(4)
+    assert pdf_worker.reader_cache_bytes == pdf_worker.READER_CACHE_BYTES // 4
+    pdf_worker.warm_up(0)
+    assert pdf_worker.reader_cache_bytes == pdf_worker.READER_CACHE_BYTES
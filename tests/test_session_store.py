@@ -0,0 +1,156 @@
+"""session_store 저장소 테스트 (저장소 루트에서 python -m pytest tests)"""
+import json
+import sqlite3
+
+import pytest
+
+from session_store import MemoryStore, SqliteStore, create_store
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    return create_store(request.param, tmp_path / "sessions.db")
+
+
+def make_document(pages=None, version=0):
+    return {
+        "filename": "a.pdf",
+        "pages": pages if pages is not None else [["d1", 0, 0], ["d1", 1, 0]],
+        "version": version,
+        "modified": 1.0,
+        "accessed": 1.0,
+        "blobs": ["d1"],
+        "undo": [],
+        "redo": [],
+    }
+
+
+def test_save_document_compares_version(store):
+    store.create_document("f", make_document())
+
+    first = store.get_document("f", history=True)
+    second = store.get_document("f", history=True)
+    first["version"] += 1
+    first["pages"] = first["pages"][:1]
+    assert store.save_document("f", first, expected_version=0)
+
+    # 같은 버전을 읽은 다른 요청은 덮어쓰지 못함
+    second["version"] += 1
+    second["pages"] = []
+    assert not store.save_document("f", second, expected_version=0)
+
+    saved = store.get_document("f")
+    assert saved["version"] == 1
+    assert saved["pages"] == [["d1", 0, 0]]
+    assert store.get_version("f") == 1
+    assert not store.save_document("missing", first, expected_version=1)
+
+
+def test_returned_document_is_a_copy(store):
+    store.create_document("f", make_document())
+    document = store.get_document("f")
+    document["pages"].append(["d2", 0, 0])
+    assert len(store.get_document("f")["pages"]) == 2
+
+
+def test_history_is_loaded_only_when_requested(store):
+    store.create_document("f", make_document())
+    document = store.get_document("f", history=True)
+    document["undo"].append({"start": 1, "removed": [["d1", 1, 0]], "added": []})
+    document["pages"] = document["pages"][:1]
+    document["version"] += 1
+    assert store.save_document("f", document, expected_version=0)
+
+    assert "undo" not in store.get_document("f")
+    # 편집 기록 없이 읽은 문서를 저장해도 기록은 남음
+    document = store.get_document("f")
+    document["version"] += 1
+    assert store.save_document("f", document, expected_version=1)
+    history = store.get_document("f", history=True)
+    assert len(history["undo"]) == 1
+    assert history["redo"] == []
+
+
+def test_touch_document_keeps_version(store):
+    store.create_document("f", make_document())
+    store.touch_document("f", 5.0)
+    document = store.get_document("f")
+    assert document["accessed"] == 5.0
+    assert document["version"] == 0
+    assert store.list_documents() == [("f", 5.0)]
+
+
+def test_delete_document(store):
+    store.create_document("f", make_document())
+    deleted = store.delete_document("f")
+    assert deleted["blobs"] == ["d1"]
+    assert store.get_document("f") is None
+    assert store.get_version("f") is None
+    assert store.delete_document("f") is None
+
+
+def test_blob_refcount(store):
+    assert store.add_blob("d1", {"size": 10, "page_count": 2})
+    assert not store.add_blob("d1", {"size": 99, "page_count": 9})
+    assert store.get_blob("d1") == {"size": 10, "page_count": 2, "refcount": 0}
+
+    assert store.adjust_refcount("d1", 1) == 1
+    assert store.adjust_refcount("d1", 1) == 2
+    # 참조하는 문서가 있으면 지우지 않음
+    assert store.delete_blob("d1") is None
+    assert store.adjust_refcount("d1", -1) == 1
+    assert store.delete_blob("d1") is None
+    assert store.adjust_refcount("d1", -1) == 0
+
+    assert store.delete_blob("d1") == {"size": 10, "page_count": 2, "refcount": 0}
+    assert store.get_blob("d1") is None
+    assert store.adjust_refcount("d1", 1) is None
+
+
+def test_add_blob_with_reference(store):
+    # 등록하는 요청이 잡는 임시 참조
+    assert store.add_blob("d1", {"size": 10, "page_count": 2}, refcount=1)
+    assert store.delete_blob("d1") is None
+    assert store.adjust_refcount("d1", -1) == 0
+    assert store.delete_blob("d1")["size"] == 10
+
+
+def test_delete_blob_in_use_when_forced(store):
+    store.add_blob("d1", {"size": 10, "page_count": 2})
+    store.adjust_refcount("d1", 1)
+    assert store.delete_blob("d1", only_unused=False)["refcount"] == 1
+
+
+def test_count(store):
+    store.create_document("f", make_document())
+    store.add_blob("d1", {"size": 10, "page_count": 2})
+    assert store.count() == {"documents": 1, "blobs": 1}
+
+
+def test_sqlite_migrates_single_column_schema(tmp_path):
+    path = tmp_path / "sessions.db"
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE documents (file_id TEXT PRIMARY KEY, version INTEGER NOT NULL, "
+                 "accessed REAL NOT NULL, data TEXT NOT NULL)")
+    old = make_document()
+    old["undo"] = [{"operations": [], "before": [], "after": []}]
+    data = {key: value for key, value in old.items() if key not in ("version", "accessed")}
+    conn.execute("INSERT INTO documents VALUES (?, ?, ?, ?)", ("f", 3, 2.0, json.dumps(data)))
+    conn.commit()
+    conn.close()
+
+    store = SqliteStore(path)
+    document = store.get_document("f", history=True)
+    assert document["pages"] == old["pages"]
+    assert document["version"] == 3
+    assert document["blobs"] == ["d1"]
+    assert document["undo"] == [] and document["redo"] == []
+    # 다시 열어도 그대로
+    assert SqliteStore(path).get_document("f") == store.get_document("f")
+
+
+def test_store_interface_is_abstract():
+    from session_store import SessionStore
+    with pytest.raises(TypeError):
+        SessionStore()
+    assert isinstance(MemoryStore(), SessionStore)